@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Columnar (Parquet / Arrow IPC) exports of orders and commissions for analytics tools.
+
+Rows are read from an unbuffered cursor in batches and written one record batch
+at a time with explicit column types (DECIMAL -> decimal128, DATETIME -> timestamp),
+so the files can be queried directly by DuckDB, pandas, Spark, etc.
+
+    python analytics_export.py orders orders.parquet
+    python analytics_export.py commissions commissions.arrow --format arrow --start-date 2025-01-01
+"""
+
+import argparse
+import os
+import sys
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency; the export endpoint answers 501 without it
+    pa = None
+    pq = None
+
+ANALYTICS_BATCH_SIZE = int(os.getenv('ANALYTICS_BATCH_SIZE', '50000'))
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# (select expression, column name, arrow type name)
+ORDER_COLUMNS = [
+    ('o.id', 'order_id', 'int64'),
+    ('o.created_at', 'created_at', 'timestamp'),
+    ('o.updated_at', 'updated_at', 'timestamp'),
+    ('o.status', 'status', 'string'),
+    ('o.payment_status', 'payment_status', 'string'),
+    ('o.payment_method', 'payment_method', 'string'),
+    ('o.payment_timestamp', 'payment_timestamp', 'timestamp'),
+    ('o.currency', 'currency', 'string'),
+    ('o.quantity', 'quantity', 'int64'),
+    ('o.unit_price', 'unit_price', 'money'),
+    ('o.total_amount', 'total_amount', 'money'),
+    ('o.commission_amount', 'commission_amount', 'money'),
+    ('o.producer_amount', 'producer_amount', 'money'),
+    ('o.buyer_id', 'buyer_id', 'int64'),
+    ('b.company_name', 'buyer_company', 'string'),
+    ('b.country', 'buyer_country', 'string'),
+    ('o.product_id', 'product_id', 'int64'),
+    ('p.name', 'product_name', 'string'),
+    ('p.category', 'product_category', 'string'),
+    ('p.origin', 'product_origin', 'string'),
+    ('p.producer_id', 'producer_id', 'int64'),
+    ('u.company_name', 'producer_company', 'string'),
+    ('u.country', 'producer_country', 'string'),
+]
+
+COMMISSION_COLUMNS = [
+    ('c.id', 'commission_id', 'int64'),
+    ('c.created_at', 'created_at', 'timestamp'),
+    ('c.updated_at', 'updated_at', 'timestamp'),
+    ('c.status', 'status', 'string'),
+    ('c.payment_reference', 'payment_reference', 'string'),
+    ('c.order_amount', 'order_amount', 'money'),
+    ('c.commission_amount', 'commission_amount', 'money'),
+    ('c.producer_amount', 'producer_amount', 'money'),
+    ('c.commission_percentage', 'commission_percentage', 'percentage'),
+    ('o.currency', 'currency', 'string'),
+    ('c.order_id', 'order_id', 'int64'),
+    ('o.status', 'order_status', 'string'),
+    ('o.payment_status', 'order_payment_status', 'string'),
+    ('o.product_id', 'product_id', 'int64'),
+    ('p.name', 'product_name', 'string'),
+    ('p.category', 'product_category', 'string'),
+    ('c.producer_id', 'producer_id', 'int64'),
+    ('u.company_name', 'producer_company', 'string'),
+    ('u.country', 'producer_country', 'string'),
+]
+
+DATASETS = {
+    'orders': {
+        'columns': ORDER_COLUMNS,
+        'from': '''FROM orders o
+                   JOIN products p ON o.product_id = p.id
+                   JOIN users u ON p.producer_id = u.id
+                   JOIN users b ON o.buyer_id = b.id''',
+        'date_column': 'o.created_at',
+        'order_by': 'o.id',
+    },
+    'commissions': {
+        'columns': COMMISSION_COLUMNS,
+        'from': '''FROM commissions c
+                   JOIN orders o ON c.order_id = o.id
+                   JOIN products p ON o.product_id = p.id
+                   JOIN users u ON c.producer_id = u.id''',
+        'date_column': 'c.created_at',
+        'order_by': 'c.id',
+    },
+}
+
+
+def _arrow_type(name):
+    return {
+        'int64': pa.int64(),
+        'string': pa.string(),
+        'timestamp': pa.timestamp('s'),
+        'money': pa.decimal128(10, 2),  # DECIMAL(10,2)
+        'percentage': pa.decimal128(5, 2),  # DECIMAL(5,2)
+    }[name]
+
+
+def dataset_schema(dataset):
+    return pa.schema([(name, _arrow_type(type_name)) for _, name, type_name in DATASETS[dataset]['columns']])
+
+
+def dataset_query(dataset, start_date=None, end_date=None):
+    spec = DATASETS[dataset]
+    select = ', '.join(f'{expr} AS {name}' for expr, name, _ in spec['columns'])
+    query = f"SELECT {select} {spec['from']} WHERE 1=1"
+    params = []
+    if start_date:
+        query += f" AND {spec['date_column']} >= %s"
+        params.append(start_date)
+    if end_date:
+        query += f" AND {spec['date_column']} <= %s"
+        params.append(end_date)
+    return query + f" ORDER BY {spec['order_by']}", params
+
+
+def _record_batch(rows, schema):
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+
+def write_dataset(conn, dataset, path, fmt='parquet', start_date=None, end_date=None):
+    """Write `dataset` to `path` as Parquet or Arrow IPC; returns the number of rows written"""
+    if pa is None:
+        raise RuntimeError('pyarrow is not installed')
+    schema = dataset_schema(dataset)
+    query, params = dataset_query(dataset, start_date, end_date)
+    cursor = conn.cursor(buffered=False)
+    cursor.execute(query, tuple(params))
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(path, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(path, schema)
+    rows_written = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(ANALYTICS_BATCH_SIZE)
+            if not rows:
+                break
+            batch = _record_batch(rows, schema)
+            if fmt == 'parquet':
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+            rows_written += len(rows)
+    finally:
+        writer.close()
+        cursor.close()
+    return rows_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export orders or commissions as Parquet / Arrow IPC')
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='parquet')
+    parser.add_argument('--start-date')
+    parser.add_argument('--end-date')
+    args = parser.parse_args()
+
+    if pa is None:
+        print("pyarrow is not installed (pip install pyarrow)")
+        sys.exit(1)
+
+    from db import get_db_connection
+    conn = get_db_connection()
+    try:
+        rows = write_dataset(conn, args.dataset, args.path, args.format, args.start_date, args.end_date)
+    finally:
+        conn.close()
+    size = os.path.getsize(args.path)
+    print(f"Wrote {rows} {args.dataset} rows to {args.path} ({size / 1024:.1f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
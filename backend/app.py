@@ -1,6 +1,6 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from db import get_db_connection
+import db
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -13,10 +13,13 @@ from websocket_service import init_socketio, socketio
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Total-Count', 'X-Has-More', 'Idempotent-Replayed'])
 
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
 
+# Request-scoped database connection (released on teardown)
+db.init_app(app)
+
 # Initialize SocketIO
 init_socketio(app)
 
@@ -0,0 +1,130 @@
+import os
+import time
+from functools import wraps
+import jwt
+from flask import request, jsonify, g
+from db import get_db
+from cache import TTLCache
+
+SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
+# Upper bound on how long other workers keep serving a user record after it changes:
+# invalidate_user() only clears this process's cache, so a deactivated user or a role
+# change can take up to AUTH_CACHE_TTL seconds to reach every worker
+AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', '60'))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000'))
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '10000'))
+
+USER_FIELDS = 'id, username, email, user_type, first_name, last_name, company_name, is_active'
+
+# token -> decoded payload
+_token_cache = TTLCache(AUTH_TOKEN_CACHE_SIZE, AUTH_CACHE_TTL)
+# user_id -> user record (role, active state and display fields)
+_user_cache = TTLCache(AUTH_USER_CACHE_SIZE, AUTH_CACHE_TTL)
+
+
+def get_token_from_request():
+    """Return the bearer token from the Authorization header, if any"""
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) == 2:
+        return parts[1]
+    return None
+
+
+def decode_token(token):
+    """Verify a JWT, caching the decoded payload. Raises jwt.InvalidTokenError."""
+    payload = _token_cache.get(token)
+    if payload is not None:
+        return payload
+    payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+    ttl = AUTH_CACHE_TTL
+    if 'exp' in payload:
+        # Never serve a cached token past its expiry
+        ttl = min(ttl, payload['exp'] - time.time())
+    if ttl > 0:
+        _token_cache.set(token, payload, ttl)
+    return payload
+
+
+def get_user(user_id):
+    """Return the cached user record for user_id, loading it on a miss"""
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+    return load_users([user_id]).get(user_id)
+
+
+def load_users(user_ids):
+    """Return {user_id: record} for user_ids, fetching all cache misses in one query"""
+    users = {}
+    missing = []
+    for user_id in set(user_ids):
+        user = _user_cache.get(user_id)
+        if user is None:
+            missing.append(user_id)
+        else:
+            users[user_id] = user
+    if missing:
+        conn = get_db()
+        cursor = conn.cursor(dictionary=True)
+        placeholders = ', '.join(['%s'] * len(missing))
+        cursor.execute(f'SELECT {USER_FIELDS} FROM users WHERE id IN ({placeholders})', tuple(missing))
+        for row in cursor.fetchall():
+            row = dict(row)
+            _user_cache.set(row['id'], row)
+            users[row['id']] = row
+        cursor.close()
+    return users
+
+
+def invalidate_user(user_id):
+    """Drop a user's cached record after their role, status or credentials change.
+
+    Only this process's cache is cleared; other workers pick the change up
+    when their copy expires (AUTH_CACHE_TTL).
+    """
+    _user_cache.pop(user_id, None)
+
+
+def _access_denied_message(roles):
+    if list(roles) == ['admin']:
+        return 'Admin access required'
+    return f"{' or '.join(role.title() for role in roles)} access required"
+
+
+def auth_required(roles=None):
+    """Require a valid token (and optionally one of `roles`).
+
+    Sets g.user_id and g.current_user for the wrapped handler.
+    """
+    if isinstance(roles, str):
+        roles = [roles]
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            token = get_token_from_request()
+            if not token:
+                return jsonify({'error': 'Token is missing!'}), 401
+            # Only a bad token is a 401; database errors from get_user() surface as a 5xx
+            try:
+                user_id = decode_token(token)['user_id']
+            except (jwt.InvalidTokenError, KeyError):
+                return jsonify({'error': 'Token is invalid!'}), 401
+            if not isinstance(user_id, int) or isinstance(user_id, bool):
+                return jsonify({'error': 'Token is invalid!'}), 401
+            user = get_user(user_id)
+            if not user:
+                return jsonify({'error': 'Token is invalid!'}), 401
+            if user['is_active'] == 0:
+                return jsonify({'error': 'Account is deactivated'}), 403
+            if roles and user['user_type'] not in roles:
+                return jsonify({'error': _access_denied_message(roles)}), 403
+            g.user_id = user['id']
+            g.current_user = user
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+def auth_cache_stats():
+    return {'tokens': _token_cache.stats(), 'users': _user_cache.stats()}
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark: many concurrent buyers reserving stock of one hot product.
+
+Compares three ways of taking stock:
+  naive        SELECT quantity, then UPDATE to the computed value (no lock; oversells)
+  locked       SELECT ... FOR UPDATE, then UPDATE (correct, two round trips under the row lock)
+  conditional  inventory.decrement: one UPDATE ... WHERE quantity >= n (correct, one round trip)
+
+Seeds a throwaway producer and product (committed, so every buyer connection
+sees them) and deletes them afterwards. Each buyer uses its own pooled
+connection, so raise MYSQL_POOL_SIZE / MYSQL_POOL_MAX_OVERFLOW for more buyers.
+
+    python bench_inventory_contention.py [--buyers 16] [--stock 500] [--attempts 100]
+"""
+
+import argparse
+import threading
+import time
+from datetime import datetime
+from db import get_db_connection
+import inventory
+
+
+def take_naive(conn, product_id, quantity):
+    cursor = conn.cursor()
+    cursor.execute('SELECT quantity FROM products WHERE id = %s', (product_id,))
+    available = cursor.fetchone()[0]
+    if available < quantity:
+        cursor.close()
+        return False
+    cursor.execute('UPDATE products SET quantity = %s WHERE id = %s', (available - quantity, product_id))
+    cursor.close()
+    return True
+
+
+def take_locked(conn, product_id, quantity):
+    cursor = conn.cursor()
+    cursor.execute('SELECT quantity FROM products WHERE id = %s FOR UPDATE', (product_id,))
+    available = cursor.fetchone()[0]
+    if available < quantity:
+        cursor.close()
+        return False
+    cursor.execute('UPDATE products SET quantity = quantity - %s WHERE id = %s', (quantity, product_id))
+    cursor.close()
+    return True
+
+
+def take_conditional(conn, product_id, quantity):
+    try:
+        inventory.decrement(conn, {product_id: quantity})
+        return True
+    except inventory.OutOfStock:
+        return False
+
+
+STRATEGIES = {'naive': take_naive, 'locked': take_locked, 'conditional': take_conditional}
+
+
+def seed(stock):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        now = datetime.utcnow()
+        cursor.execute('''INSERT INTO users (username, email, password_hash, user_type, first_name, last_name, created_at, updated_at)
+                          VALUES (%s, %s, %s, %s, %s, %s, %s, %s)''',
+                       (f'bench_{now.timestamp()}', f'bench_{now.timestamp()}@example.com', '-', 'producer', 'Bench', 'Producer', now, now))
+        producer_id = cursor.lastrowid
+        cursor.execute('''INSERT INTO products (name, price, quantity, producer_id, product_status, created_at, updated_at)
+                          VALUES (%s, %s, %s, %s, %s, %s, %s)''', ('Bench hot product', 10, stock, producer_id, 'active', now, now))
+        product_id = cursor.lastrowid
+        conn.commit()
+        cursor.close()
+        return producer_id, product_id
+    finally:
+        conn.close()
+
+
+def cleanup(producer_id, product_id):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM products WHERE id = %s', (product_id,))
+        cursor.execute('DELETE FROM users WHERE id = %s', (producer_id,))
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def reset_stock(product_id, stock):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE products SET quantity = %s WHERE id = %s', (stock, product_id))
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def final_stock(product_id):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT quantity FROM products WHERE id = %s', (product_id,))
+        quantity = cursor.fetchone()[0]
+        cursor.close()
+        return quantity
+    finally:
+        conn.close()
+
+
+def buyer(take, product_id, attempts, start, results):
+    conn = get_db_connection()
+    latencies, sold, errors = [], 0, 0
+    try:
+        start.wait()
+        for _ in range(attempts):
+            started = time.perf_counter()
+            try:
+                if take(conn, product_id, 1):
+                    sold += 1
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        conn.close()
+        results.append((latencies, sold, errors))
+
+
+def run_strategy(name, product_id, stock, buyers, attempts):
+    reset_stock(product_id, stock)
+    start = threading.Barrier(buyers + 1)
+    results = []
+    threads = [threading.Thread(target=buyer, args=(STRATEGIES[name], product_id, attempts, start, results))
+               for _ in range(buyers)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(ms for result in results for ms in result[0])
+    sold = sum(result[1] for result in results)
+    errors = sum(result[2] for result in results)
+    remaining = final_stock(product_id)
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0
+    print(f'{name:>11} | {sold:>5} | {remaining:>9} | {sold - (stock - remaining):>8} | {errors:>6} | '
+          f'{len(latencies) / elapsed:>10.0f} | {p50:>7.2f} | {p99:>7.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent stock reservation benchmark against one hot product')
+    parser.add_argument('--buyers', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=500)
+    parser.add_argument('--attempts', type=int, default=100, help='reservation attempts per buyer')
+    parser.add_argument('--strategies', nargs='+', choices=list(STRATEGIES), default=list(STRATEGIES))
+    args = parser.parse_args()
+
+    producer_id, product_id = seed(args.stock)
+    print(f'{args.buyers} buyers x {args.attempts} attempts of 1 unit, stock {args.stock}')
+    print(f"{'strategy':>11} | {'sold':>5} | {'remaining':>9} | {'oversold':>8} | {'errors':>6} | "
+          f"{'attempts/s':>10} | {'p50 ms':>7} | {'p99 ms':>7}")
+    print('-' * 84)
+    try:
+        for name in args.strategies:
+            run_strategy(name, product_id, args.stock, args.buyers, args.attempts)
+    finally:
+        cleanup(producer_id, product_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-product image queries (N+1) vs the batched product loader.
+
+Seeds synthetic products inside a transaction that is rolled back at the end,
+so it can be pointed at a development database without leaving data behind.
+
+    python bench_product_loader.py [sizes...]     e.g. python bench_product_loader.py 100 500 2000
+"""
+
+import sys
+import time
+from datetime import datetime
+from db import get_db_connection
+from models import attach_product_details
+
+IMAGES_PER_PRODUCT = 3
+
+
+class CountingCursor:
+    """Cursor wrapper that counts executed statements"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.queries = 0
+
+    def execute(self, *args, **kwargs):
+        self.queries += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def seed(cursor, count):
+    """Insert `count` products with images for a throwaway producer; returns the producer id"""
+    now = datetime.utcnow()
+    cursor.execute('''INSERT INTO users (username, email, password_hash, user_type, first_name, last_name, created_at, updated_at)
+                      VALUES (%s, %s, %s, %s, %s, %s, %s, %s)''',
+                   (f'bench_{now.timestamp()}', f'bench_{now.timestamp()}@example.com', '-', 'producer', 'Bench', 'Producer', now, now))
+    producer_id = cursor.lastrowid
+    cursor.executemany('''INSERT INTO products (name, price, quantity, producer_id, product_status, created_at, updated_at)
+                          VALUES (%s, %s, %s, %s, %s, %s, %s)''',
+                       [(f'Bench product {i}', 10, 100, producer_id, 'active', now, now) for i in range(count)])
+    cursor.execute('SELECT id FROM products WHERE producer_id = %s', (producer_id,))
+    ids = [row['id'] for row in cursor.fetchall()]
+    cursor.executemany('INSERT INTO product_images (product_id, image_url, is_primary, created_at) VALUES (%s, %s, %s, %s)',
+                       [(pid, f'/uploads/bench_{pid}_{n}.jpg', n == 0, now) for pid in ids for n in range(IMAGES_PER_PRODUCT)])
+    return producer_id
+
+
+def load_naive(cursor, producer_id):
+    cursor.execute('SELECT * FROM products WHERE producer_id = %s ORDER BY created_at DESC', (producer_id,))
+    products = cursor.fetchall()
+    for i, product in enumerate(products):
+        product = dict(product)
+        cursor.execute('SELECT image_url FROM product_images WHERE product_id = %s', (product['id'],))
+        product['images'] = [row['image_url'] for row in cursor.fetchall()]
+        products[i] = product
+    return products
+
+
+def load_batched(cursor, producer_id):
+    cursor.execute('SELECT * FROM products WHERE producer_id = %s ORDER BY created_at DESC', (producer_id,))
+    return attach_product_details(cursor, cursor.fetchall())
+
+
+def measure(loader, conn, producer_id):
+    cursor = CountingCursor(conn.cursor(dictionary=True))
+    started = time.perf_counter()
+    products = loader(cursor, producer_id)
+    elapsed = (time.perf_counter() - started) * 1000
+    cursor.close()
+    return len(products), cursor.queries, elapsed
+
+
+def run(sizes):
+    conn = get_db_connection()
+    print(f"{'products':>9} | {'naive queries':>13} | {'naive ms':>9} | {'batched queries':>15} | {'batched ms':>10}")
+    print('-' * 70)
+    try:
+        for size in sizes:
+            cursor = conn.cursor(dictionary=True)
+            producer_id = seed(cursor, size)
+            cursor.close()
+            count, naive_queries, naive_ms = measure(load_naive, conn, producer_id)
+            _, batched_queries, batched_ms = measure(load_batched, conn, producer_id)
+            print(f'{count:>9} | {naive_queries:>13} | {naive_ms:>9.1f} | {batched_queries:>15} | {batched_ms:>10.1f}')
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [100, 500, 2000])
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Capacity test: many concurrent Socket.IO connections against a running server.
+
+Opens --connections authenticated websocket clients (all joined to one
+conversation room), then reports:
+  connections  how many connected and were confirmed by the server
+  memory       server RSS growth per connection (needs --server-pid on the same host)
+  latency      fan-out time of a 'typing' event from one probe client to every
+               other client in the room (p50 / p99 / max over --rounds rounds)
+
+Clients run on asyncio (pip install "python-socketio[asyncio_client]" aiohttp).
+One client process comfortably drives about 10k sockets; for more, run
+several copies with different --room values and raise `ulimit -n` on both
+sides. Latency includes client-side event loop delay, so compare runs made
+with the same client setup.
+
+    python bench_socket_capacity.py --url http://localhost:5000 --user-id 1 --connections 5000 --server-pid 12345
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import jwt
+import socketio
+
+SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
+
+
+def server_rss_kb(pid):
+    if not pid:
+        return None
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return None
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.token = args.token or jwt.encode({'user_id': args.user_id, 'username': 'bench'}, SECRET_KEY, algorithm='HS256')
+        self.clients = []
+        self.confirmed = 0
+        self.arrivals = []
+        self.expected = 0
+        self.round_done = None
+
+    async def open_client(self, semaphore, listen=True):
+        client = socketio.AsyncClient(reconnection=False)
+        confirmed = asyncio.Event()
+
+        @client.on('connection_confirmed')
+        async def on_confirmed(data):
+            confirmed.set()
+
+        if listen:
+            @client.on('user_typing')
+            async def on_typing(data):
+                self.arrivals.append(time.perf_counter())
+                if self.round_done and len(self.arrivals) >= self.expected:
+                    self.round_done.set()
+
+        async with semaphore:
+            try:
+                await client.connect(self.args.url, auth={'token': self.token}, transports=['websocket'],
+                                     wait_timeout=self.args.timeout)
+                await asyncio.wait_for(confirmed.wait(), self.args.timeout)
+                await client.emit('join_conversation', {'conversation_id': self.args.room})
+            except Exception:
+                await client.disconnect()
+                return None
+        self.confirmed += 1
+        return client
+
+    async def connect_all(self):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self.open_client(semaphore) for _ in range(self.args.connections)))
+        self.clients = [client for client in results if client]
+        return time.perf_counter() - started
+
+    async def measure_latency(self, probe):
+        # Let the last join_conversation events land before probing
+        await asyncio.sleep(1)
+        latencies, delivered = [], []
+        for round_number in range(self.args.rounds):
+            self.arrivals = []
+            self.expected = len(self.clients)
+            self.round_done = asyncio.Event()
+            sent = time.perf_counter()
+            await probe.emit('typing', {'inquiry_id': self.args.room, 'is_typing': round_number % 2 == 0})
+            try:
+                await asyncio.wait_for(self.round_done.wait(), self.args.timeout)
+            except asyncio.TimeoutError:
+                pass
+            delivered.append(len(self.arrivals))
+            latencies.extend((arrival - sent) * 1000 for arrival in self.arrivals)
+            await asyncio.sleep(self.args.interval)
+        return sorted(latencies), delivered
+
+    async def run(self):
+        args = self.args
+        rss_before = server_rss_kb(args.server_pid)
+        elapsed = await self.connect_all()
+        await asyncio.sleep(2)
+        rss_after = server_rss_kb(args.server_pid)
+
+        print(f'connections: {self.confirmed}/{args.connections} confirmed in {elapsed:.1f}s')
+        if rss_before is not None and rss_after is not None and self.confirmed:
+            print(f'server RSS:  {rss_before / 1024:.1f} MB -> {rss_after / 1024:.1f} MB '
+                  f'({(rss_after - rss_before) / self.confirmed:.1f} KB per connection)')
+        else:
+            print('server RSS:  n/a (pass --server-pid when running on the server host)')
+
+        probe = await self.open_client(asyncio.Semaphore(1), listen=False)
+        if probe is None:
+            print('latency:     probe client could not connect')
+        else:
+            latencies, delivered = await self.measure_latency(probe)
+            print(f'fan-out:     {sum(delivered)}/{len(self.clients) * args.rounds} deliveries over {args.rounds} rounds')
+            print(f'latency ms:  p50 {percentile(latencies, 0.5):.1f} | p99 {percentile(latencies, 0.99):.1f} | '
+                  f'max {latencies[-1] if latencies else 0:.1f}')
+            await probe.disconnect()
+
+        await asyncio.gather(*(client.disconnect() for client in self.clients), return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Socket.IO connection capacity and fan-out latency test')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=200, help='connection attempts in flight at once')
+    parser.add_argument('--user-id', type=int, default=1, help='user to sign a token for (uses SECRET_KEY)')
+    parser.add_argument('--token', help='existing JWT to connect with instead of --user-id')
+    parser.add_argument('--room', type=int, default=999999, help='conversation room all clients join')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between latency rounds')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--server-pid', type=int, help='server process id, for RSS per connection')
+    asyncio.run(Bench(parser.parse_args()).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import os
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+import inventory
+import rollups
+from platform_settings import platform_settings
+
+CENT = Decimal('0.01')
+
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+# Attempts at a checkout that loses a deadlock or a lock wait, and the backoff step between them
+CHECKOUT_RETRIES = int(os.getenv('CHECKOUT_RETRIES', '3'))
+CHECKOUT_RETRY_DELAY = float(os.getenv('CHECKOUT_RETRY_DELAY', '0.05'))
+
+ORDER_DETAIL_FIELDS = ('shipping_address', 'shipping_method', 'payment_method', 'special_instructions')
+
+
+class CheckoutError(Exception):
+    """Raised when a cart cannot be checked out; `details` lists the offending cart lines"""
+
+    def __init__(self, message, details=None, status_code=None):
+        super().__init__(message)
+        self.details = details or []
+        self.status_code = status_code or (409 if self.details else 400)
+
+
+def _lock_cart(conn, buyer_id, cart_ids=None):
+    """Cart lines with their current product price, locked until the transaction ends.
+
+    The buyer's cart rows are locked first, then their products in id order,
+    the same order inventory.decrement() takes them in, so two checkouts of
+    the same products cannot lock them in opposite orders.
+    """
+    query = 'SELECT id as cart_id, product_id, quantity FROM cart WHERE buyer_id = %s'
+    params = [buyer_id]
+    if cart_ids:
+        query += f" AND id IN ({', '.join(['%s'] * len(cart_ids))})"
+        params.extend(cart_ids)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(query + ' ORDER BY id FOR UPDATE', tuple(params))
+    lines = cursor.fetchall()
+    if not lines:
+        cursor.close()
+        return lines
+    product_ids = sorted({line['product_id'] for line in lines})
+    cursor.execute(f'''SELECT id as product_id, price, currency, producer_id, category, product_status,
+                              min_order_quantity, name as product_name
+                       FROM products WHERE id IN ({', '.join(['%s'] * len(product_ids))})
+                       ORDER BY id FOR UPDATE''', tuple(product_ids))
+    products = {row['product_id']: row for row in cursor.fetchall()}
+    cursor.close()
+    return [dict(line, **products[line['product_id']]) for line in lines if line['product_id'] in products]
+
+
+def _validate(lines, expected_prices):
+    problems = []
+    for line in lines:
+        expected = expected_prices.get(line['cart_id'])
+        if line['product_status'] != 'active':
+            problems.append({'cart_id': line['cart_id'], 'product_id': line['product_id'], 'error': 'Product is not available'})
+        elif not line['quantity'] or line['quantity'] < (line['min_order_quantity'] or 1):
+            problems.append({'cart_id': line['cart_id'], 'product_id': line['product_id'],
+                             'error': f"Minimum order quantity is {line['min_order_quantity']}"})
+        elif expected is not None and Decimal(str(expected)).quantize(CENT) != line['price']:
+            problems.append({'cart_id': line['cart_id'], 'product_id': line['product_id'], 'error': 'Price has changed',
+                             'expected_price': float(expected), 'current_price': float(line['price'])})
+    return problems
+
+
+def checkout_cart(conn, buyer_id, details, expected_prices=None, cart_ids=None):
+    """Turn the buyer's cart into orders and pending commissions in one transaction.
+
+    Prices come from products.price, read and locked together with the cart
+    lines; `expected_prices` ({cart_id: unit_price} as shown to the buyer) is
+    checked against them. Orders and commissions are written with one
+    multi-row INSERT each and share a checkout_id, the checked-out cart lines
+    are deleted, stock is reserved and everything commits together. A
+    transaction picked as a deadlock victim or timing out on a row lock is
+    rolled back and run again, up to CHECKOUT_RETRIES times. Returns
+    (checkout_id, orders) where orders are dicts with id, producer_id,
+    product_id, currency and amounts.
+    """
+    for attempt in range(1, CHECKOUT_RETRIES + 1):
+        try:
+            return _checkout(conn, buyer_id, details, expected_prices, cart_ids)
+        except Exception as e:
+            if getattr(e, 'errno', None) not in (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT):
+                raise
+            conn.rollback()
+        if attempt < CHECKOUT_RETRIES:
+            time.sleep(CHECKOUT_RETRY_DELAY * attempt)
+    raise CheckoutError('Checkout is busy, please retry', status_code=409)
+
+
+def _checkout(conn, buyer_id, details, expected_prices, cart_ids):
+    lines = _lock_cart(conn, buyer_id, cart_ids)
+    if not lines:
+        conn.rollback()
+        raise CheckoutError('Cart is empty')
+    problems = _validate(lines, expected_prices or {})
+    if problems:
+        conn.rollback()
+        raise CheckoutError('Cart cannot be checked out', problems)
+    admin_id = platform_settings.payout_admin_id(conn)
+    if admin_id is None:
+        conn.rollback()
+        raise CheckoutError('Admin user not found')
+
+    checkout_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    orders = []
+    for line in lines:
+        total_amount = (line['price'] * line['quantity']).quantize(CENT)
+        commission_percentage = platform_settings.commission_percentage(conn, line['producer_id'], line['category'])
+        commission_amount = (total_amount * commission_percentage / 100).quantize(CENT)
+        orders.append({'cart_id': line['cart_id'], 'product_id': line['product_id'], 'producer_id': line['producer_id'],
+                       'quantity': line['quantity'], 'unit_price': line['price'], 'total_amount': total_amount,
+                       'currency': line['currency'] or 'NGN', 'commission_percentage': commission_percentage,
+                       'commission_amount': commission_amount,
+                       'producer_amount': total_amount - commission_amount})
+
+    cursor = conn.cursor()
+    order_columns = ('checkout_id, buyer_id, producer_id, product_id, quantity, unit_price, total_amount, currency, '
+                     'shipping_address, shipping_method, payment_method, special_instructions, status, payment_status, '
+                     'commission_amount, producer_amount, created_at, updated_at')
+    cursor.execute(f'''INSERT INTO orders ({order_columns}) VALUES '''
+                   + ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(orders)),
+                   tuple(value for order in orders for value in (
+                       checkout_id, buyer_id, order['producer_id'], order['product_id'], order['quantity'], order['unit_price'],
+                       order['total_amount'], order['currency'], *(details.get(field) for field in ORDER_DETAIL_FIELDS),
+                       'pending', 'pending', order['commission_amount'], order['producer_amount'], now, now)))
+
+    # Auto-increment ids of a multi-row insert are not guaranteed to be
+    # consecutive, so read them back in insert order
+    cursor.execute('SELECT id FROM orders WHERE checkout_id = %s ORDER BY id', (checkout_id,))
+    for order, (order_id,) in zip(orders, cursor.fetchall()):
+        order['id'] = order_id
+
+    cursor.execute('''INSERT INTO commissions (order_id, producer_id, admin_id, order_amount, commission_amount, producer_amount,
+                      commission_percentage, status, created_at, updated_at) VALUES '''
+                   + ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(orders)),
+                   tuple(value for order in orders for value in (
+                       order['id'], order['producer_id'], admin_id, order['total_amount'], order['commission_amount'],
+                       order['producer_amount'], order['commission_percentage'], 'pending', now, now)))
+    cursor.execute('''SELECT c.id FROM commissions c JOIN orders o ON c.order_id = o.id
+                      WHERE o.checkout_id = %s''', (checkout_id,))
+    commission_ids = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute(f"DELETE FROM cart WHERE buyer_id = %s AND id IN ({', '.join(['%s'] * len(lines))})",
+                   (buyer_id, *(line['cart_id'] for line in lines)))
+    cursor.close()
+
+    try:
+        inventory.reserve(conn, orders)
+    except inventory.OutOfStock as e:
+        conn.rollback()
+        raise CheckoutError('Insufficient stock', [
+            {'cart_id': order['cart_id'], 'product_id': e.product_id, 'error': 'Insufficient stock', 'available': e.available}
+            for order in orders if order['product_id'] == e.product_id])
+
+    rollups.orders_created(conn, [order['id'] for order in orders])
+    rollups.commissions_created(conn, commission_ids)
+    conn.commit()
+    return checkout_id, orders
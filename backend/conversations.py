@@ -0,0 +1,133 @@
+from datetime import datetime
+from auth import load_users
+
+# Characters of the last message kept in the summary for the inbox preview
+PREVIEW_LENGTH = 500
+
+
+def conversation_created(conn, inquiry_id, buyer_id, producer_id, created_at=None):
+    """Add the inbox rows for a new inquiry: one for the buyer and one for the producer"""
+    created_at = created_at or datetime.utcnow()
+    rows = [(buyer_id, inquiry_id, producer_id, 'buyer', created_at)]
+    if producer_id is not None:
+        rows.append((producer_id, inquiry_id, buyer_id, 'producer', created_at))
+    cursor = conn.cursor()
+    cursor.executemany('''INSERT IGNORE INTO conversation_summaries (user_id, inquiry_id, other_user_id, role, last_activity_at)
+                          VALUES (%s, %s, %s, %s, %s)''', rows)
+    cursor.close()
+
+
+def message_sent(conn, inquiry_id, sender_id, message_id, message, created_at):
+    """Record a new message on every participant's summary row.
+
+    The other participants' unread counters go up by one; replying moves the
+    sender's read watermark to the new message and clears their counter.
+    Runs in the caller's transaction, before commit.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''UPDATE conversation_summaries
+                      SET last_message_id = %s, last_message = %s, last_message_at = %s, last_sender_id = %s,
+                          last_activity_at = %s, unread_count = IF(user_id = %s, 0, unread_count + 1),
+                          last_read_message_id = IF(user_id = %s, %s, last_read_message_id)
+                      WHERE inquiry_id = %s''',
+                   (message_id, message[:PREVIEW_LENGTH], created_at, sender_id, created_at, sender_id,
+                    sender_id, message_id, inquiry_id))
+    cursor.close()
+
+
+def mark_read(conn, inquiry_id, user_id, message_id=None):
+    """Move the user's read watermark for an inquiry; returns the new last_read_message_id.
+
+    Without `message_id` everything up to the conversation's last message is
+    read. A watermark never moves backwards. Reading only part of the thread
+    recounts the remaining unread messages from the watermark on the
+    (inquiry_id, id) index, so no message rows are written either way.
+    """
+    cursor = conn.cursor()
+    if message_id is None:
+        cursor.execute('''UPDATE conversation_summaries
+                          SET last_read_message_id = GREATEST(last_read_message_id, COALESCE(last_message_id, 0)), unread_count = 0
+                          WHERE user_id = %s AND inquiry_id = %s''', (user_id, inquiry_id))
+    else:
+        cursor.execute('''UPDATE conversation_summaries s
+                          SET s.last_read_message_id = GREATEST(s.last_read_message_id, %s),
+                              s.unread_count = (SELECT COUNT(*) FROM messages m
+                                                WHERE m.inquiry_id = s.inquiry_id AND m.id > GREATEST(s.last_read_message_id, %s)
+                                                AND m.sender_id != s.user_id)
+                          WHERE s.user_id = %s AND s.inquiry_id = %s''', (message_id, message_id, user_id, inquiry_id))
+    cursor.execute('SELECT last_read_message_id FROM conversation_summaries WHERE user_id = %s AND inquiry_id = %s',
+                   (user_id, inquiry_id))
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row else None
+
+
+def read_watermarks(conn, inquiry_id):
+    """{user_id: last_read_message_id} for the participants of an inquiry"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT user_id, last_read_message_id FROM conversation_summaries WHERE inquiry_id = %s', (inquiry_id,))
+    watermarks = dict(cursor.fetchall())
+    cursor.close()
+    return watermarks
+
+
+def apply_read_state(messages, watermarks):
+    """Set each message's is_read from the watermarks: read once any other participant has read past it"""
+    return [dict(message, is_read=any(last_read >= message['id'] for user_id, last_read in watermarks.items()
+                                      if user_id != message['sender_id']))
+            for message in messages]
+
+
+def conversation_deleted(conn, inquiry_id):
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM conversation_summaries WHERE inquiry_id = %s', (inquiry_id,))
+    cursor.close()
+
+
+def unread_total(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute('SELECT CAST(COALESCE(SUM(unread_count), 0) AS SIGNED) FROM conversation_summaries WHERE user_id = %s',
+                   (user_id,))
+    total = cursor.fetchone()[0]
+    cursor.close()
+    return total
+
+
+def message_page(conn, inquiry_id, limit, before=None, after=None):
+    """One page of an inquiry's messages in ascending id order, plus whether more exist in that direction.
+
+    `before` pages back from a message id (or from the newest message when
+    neither bound is given); `after` returns what arrived since a message id,
+    e.g. after a reconnect. Both walk the (inquiry_id, id) index. A `limit` of
+    None returns the whole thread. Sender profiles come from the auth user
+    cache instead of a join per row.
+    """
+    query, params = 'SELECT * FROM messages WHERE inquiry_id = %s', [inquiry_id]
+    if after is not None:
+        query += ' AND id > %s'
+        params.append(after)
+    elif before is not None:
+        query += ' AND id < %s'
+        params.append(before)
+    # Paging back reads newest first so the LIMIT keeps the latest messages
+    descending = after is None and limit is not None
+    query += ' ORDER BY id DESC' if descending else ' ORDER BY id ASC'
+    if limit is not None:
+        query += ' LIMIT %s'
+        params.append(limit + 1)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(query, tuple(params))
+    rows = cursor.fetchall()
+    cursor.close()
+
+    has_more = limit is not None and len(rows) > limit
+    rows = rows[:limit]
+    if descending:
+        rows.reverse()
+    senders = load_users([row['sender_id'] for row in rows])
+    messages = []
+    for row in rows:
+        sender = senders.get(row['sender_id'], {})
+        messages.append(dict(row, username=sender.get('username'), first_name=sender.get('first_name'),
+                             last_name=sender.get('last_name'), user_type=sender.get('user_type')))
+    return messages, has_more
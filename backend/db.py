@@ -1,6 +1,11 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+from collections import deque
 import mysql.connector
 from dotenv import load_dotenv
+from flask import g, has_app_context
 
 load_dotenv()
 
@@ -9,10 +14,375 @@ MYSQL_USER = os.getenv('MYSQL_USER', 'root')
 MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', '')
 MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'tradelink')
 
-def get_db_connection():
+# Connection pool settings
+MYSQL_POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', '10'))
+MYSQL_POOL_MAX_OVERFLOW = int(os.getenv('MYSQL_POOL_MAX_OVERFLOW', '10'))
+MYSQL_POOL_TIMEOUT = float(os.getenv('MYSQL_POOL_TIMEOUT', '30'))
+MYSQL_POOL_RECYCLE = float(os.getenv('MYSQL_POOL_RECYCLE', '3600'))
+MYSQL_POOL_PRE_PING = os.getenv('MYSQL_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+# The C extension blocks the whole process under eventlet/gevent; the pure-Python
+# driver uses the (monkey-patched) socket module and yields while waiting on MySQL
+GREEN_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading') in ('eventlet', 'gevent')
+MYSQL_USE_PURE = os.getenv('MYSQL_USE_PURE', 'true' if GREEN_ASYNC_MODE else 'false').lower() in ('1', 'true', 'yes')
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+def _connect():
     return mysql.connector.connect(
         host=MYSQL_HOST,
         user=MYSQL_USER,
         password=MYSQL_PASSWORD,
-        database=MYSQL_DATABASE
-    ) 
\ No newline at end of file
+        database=MYSQL_DATABASE,
+        use_pure=MYSQL_USE_PURE
+    )
+
+
+class PooledConnection:
+    """Wrapper around a pooled MySQL connection.
+
+    Behaves like the underlying connection, except that close() hands the
+    connection back to the pool instead of tearing down the socket.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            try:
+                self._raw.rollback()
+            except Exception:
+                pass
+        self.close()
+
+    @property
+    def age(self):
+        return time.monotonic() - self._created_at
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._raw, self._created_at)
+
+    def abandon(self):
+        """Drop the connection instead of returning it, e.g. when a result set was left half read.
+
+        Closes the socket without draining pending rows or sending QUIT, which
+        also makes the server abort the statement still streaming them.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._abandon(self._raw)
+
+
+class ConnectionPool:
+    """Thread-safe MySQL connection pool with overflow, timeouts and recycling"""
+
+    def __init__(self, connect=_connect, size=MYSQL_POOL_SIZE, max_overflow=MYSQL_POOL_MAX_OVERFLOW,
+                 timeout=MYSQL_POOL_TIMEOUT, recycle=MYSQL_POOL_RECYCLE, pre_ping=MYSQL_POOL_PRE_PING):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self._idle = deque()  # (raw connection, created_at)
+        self._lock = threading.Condition()
+        self._open = 0  # connections created and not yet discarded
+        self._checked_out = 0
+        self._stats = {
+            'checkouts': 0,
+            'connects': 0,
+            'recycled': 0,
+            'ping_failures': 0,
+            'timeouts': 0,
+            'abandoned': 0,
+            'wait_time_total': 0.0,
+        }
+
+    def get_connection(self, timeout=None):
+        """Check out a connection, waiting up to `timeout` seconds for one to free up"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._lock:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    self._checked_out += 1
+                    break
+                if self._open < self.size + self.max_overflow:
+                    raw, created_at = None, None
+                    self._open += 1
+                    self._checked_out += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f'Timed out after {timeout}s waiting for a database connection '
+                        f'(size={self.size}, overflow={self.max_overflow})')
+                self._lock.wait(remaining)
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total'] += time.monotonic() - started
+
+        try:
+            if raw is not None:
+                raw, created_at = self._validate(raw, created_at)
+            if raw is None:
+                raw, created_at = self._new_connection()
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._checked_out -= 1
+                self._lock.notify()
+            raise
+        return PooledConnection(self, raw, created_at)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager yielding a pooled connection; rolls back on error"""
+        conn = self.get_connection(timeout)
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+
+    def _new_connection(self):
+        raw = self._connect()
+        with self._lock:
+            self._stats['connects'] += 1
+        return raw, time.monotonic()
+
+    def _validate(self, raw, created_at):
+        """Return (raw, created_at) if usable, or (None, None) after discarding a stale connection"""
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            self._discard(raw)
+            with self._lock:
+                self._stats['recycled'] += 1
+            return None, None
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                self._discard(raw)
+                with self._lock:
+                    self._stats['ping_failures'] += 1
+                return None, None
+        return raw, created_at
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _release(self, raw, created_at):
+        # Never hand an open transaction to the next borrower
+        try:
+            if raw.unread_result:
+                raw.consume_results()
+            if raw.in_transaction:
+                raw.rollback()
+            reusable = raw.is_connected()
+        except Exception:
+            reusable = False
+
+        with self._lock:
+            self._checked_out -= 1
+            if reusable and len(self._idle) < self.size:
+                self._idle.append((raw, created_at))
+                raw = None
+            else:
+                self._open -= 1
+            self._lock.notify()
+        if raw is not None:
+            self._discard(raw)
+
+    def _abandon(self, raw):
+        try:
+            raw.shutdown()
+        except Exception:
+            pass
+        with self._lock:
+            self._checked_out -= 1
+            self._open -= 1
+            self._stats['abandoned'] += 1
+            self._lock.notify()
+
+    def dispose(self):
+        """Close all idle connections (e.g. after fork or on shutdown)"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+            self._lock.notify_all()
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        """Snapshot of pool usage for monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'timeout': self.timeout,
+                'recycle': self.recycle,
+                'open': self._open,
+                'idle': len(self._idle),
+                'checked_out': self._checked_out,
+                'overflow': max(0, self._open - self.size),
+            })
+        checkouts = stats['checkouts']
+        stats['avg_wait_ms'] = round(stats.pop('wait_time_total') / checkouts * 1000, 3) if checkouts else 0.0
+        return stats
+
+
+pool = ConnectionPool()
+
+
+def get_db_connection():
+    """Check out a pooled connection; calling close() returns it to the pool"""
+    return pool.get_connection()
+
+
+@contextmanager
+def db_connection(timeout=None):
+    """with db_connection() as conn: ... -- returns the connection to the pool on exit"""
+    with pool.connection(timeout) as conn:
+        yield conn
+
+
+def get_pool_stats():
+    return pool.stats()
+
+
+class _SharedCursor:
+    """Cursor handed out by a UnitOfWork; close() is deferred until teardown"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        pass
+
+
+class UnitOfWork:
+    """One connection (and its cursors) shared by everything in a request or socket event.
+
+    The connection is checked out lazily on first use and returned to the pool
+    on app-context teardown. Writes must be committed explicitly with commit();
+    anything left uncommitted at teardown is rolled back.
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._cursors = {}
+
+    @property
+    def connection(self):
+        if self._conn is None:
+            self._conn = pool.get_connection()
+        return self._conn
+
+    def cursor(self, dictionary=False, buffered=True):
+        """Return a shared buffered cursor, or a fresh one for unbuffered (streaming) reads"""
+        if not buffered:
+            return self.connection.cursor(dictionary=dictionary, buffered=False)
+        key = bool(dictionary)
+        if key not in self._cursors:
+            self._cursors[key] = _SharedCursor(self.connection.cursor(dictionary=dictionary, buffered=True))
+        return self._cursors[key]
+
+    def commit(self):
+        if self._conn is not None:
+            self._conn.commit()
+
+    def rollback(self):
+        if self._conn is not None:
+            self._conn.rollback()
+
+    @contextmanager
+    def transaction(self):
+        """Commit on success, roll back if the block raises"""
+        try:
+            yield self
+        except Exception:
+            self.rollback()
+            raise
+        else:
+            self.commit()
+
+    def close(self):
+        # Handlers may still call conn.close(); the connection is released at teardown
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def release(self, exc=None):
+        """Close cursors and return the connection to the pool"""
+        if self._conn is None:
+            return
+        for cursor in self._cursors.values():
+            try:
+                cursor._cursor.close()
+            except Exception:
+                pass
+        self._cursors.clear()
+        try:
+            self._conn.rollback()
+        except Exception:
+            pass
+        self._conn.close()
+        self._conn = None
+
+
+def get_db():
+    """Return the unit of work for the current request / socket event.
+
+    Outside of an app context (scripts, background jobs) a plain pooled
+    connection is returned and the caller is responsible for closing it.
+    """
+    if not has_app_context():
+        return get_db_connection()
+    if 'db' not in g:
+        g.db = UnitOfWork()
+    return g.db
+
+
+def close_db(exc=None):
+    uow = g.pop('db', None)
+    if uow is not None:
+        uow.release(exc)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
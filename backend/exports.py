@@ -0,0 +1,84 @@
+import csv
+import os
+import zlib
+from io import StringIO
+from flask import Response, request
+from db import get_db_connection
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '2000'))
+
+
+class _RowBuffer:
+    """Write target for csv.writer that is drained after every batch"""
+
+    def __init__(self):
+        self._buffer = StringIO()
+
+    def write(self, data):
+        return self._buffer.write(data)
+
+    def drain(self):
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate(0)
+        return data.encode('utf-8')
+
+
+def stream_query_csv(query, params=(), compress=False, session_sql=()):
+    """Yield CSV chunks for `query`, reading rows in batches from an unbuffered cursor.
+
+    Uses its own pooled connection because the generator keeps running after the
+    request context (and its unit of work) has been torn down. Memory use is
+    bounded by EXPORT_BATCH_SIZE rows regardless of the result size. If the
+    stream stops early (the client went away, or an error), the connection is
+    abandoned rather than returned to the pool, which would first have to read
+    the rest of the result set.
+    """
+    conn = get_db_connection()
+    finished = False
+    try:
+        setup = conn.cursor()
+        # Give slow clients time to drain a long result set
+        setup.execute('SET SESSION net_write_timeout = 600')
+        for statement in session_sql:
+            setup.execute(statement)
+        setup.close()
+
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(query, tuple(params))
+        buffer = _RowBuffer()
+        writer = csv.writer(buffer)
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+        writer.writerow(cursor.column_names)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if rows:
+                writer.writerows(rows)
+            chunk = buffer.drain()
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+            if not rows:
+                break
+        cursor.close()
+        finished = True
+        if compressor:
+            yield compressor.flush()
+    finally:
+        if finished:
+            conn.close()
+        else:
+            conn.abandon()
+
+
+def csv_export_response(query, params, filename, session_sql=()):
+    """Chunked CSV download; ?compress=gzip gzips the stream on the fly"""
+    compress = request.args.get('compress') == 'gzip'
+    if compress:
+        filename += '.gz'
+    response = Response(stream_query_csv(query, params, compress, session_sql),
+                        mimetype='application/gzip' if compress else 'text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
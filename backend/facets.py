@@ -0,0 +1,300 @@
+import os
+import threading
+import time
+
+FACETS_MAX_AGE = float(os.getenv('FACETS_MAX_AGE', '300'))
+
+FACET_FIELDS = ['category', 'origin', 'currency', 'producer_country', 'price_range']
+
+# (label, min inclusive, max exclusive)
+PRICE_BUCKETS = [
+    ('0-1000', 0, 1000),
+    ('1000-10000', 1000, 10000),
+    ('10000-100000', 10000, 100000),
+    ('100000+', 100000, None),
+]
+
+# SQL expression for each facet, used when counts have to come from the database
+FACET_COLUMNS = {
+    'category': 'p.category',
+    'origin': 'p.origin',
+    'currency': 'p.currency',
+    'producer_country': 'u.country',
+    'price_range': 'CASE ' + ' '.join(
+        f"WHEN p.price >= {low}" + (f" AND p.price < {high}" if high is not None else '') + f" THEN '{label}'"
+        for label, low, high in PRICE_BUCKETS) + ' END',
+}
+
+FACET_QUERY = '''SELECT p.id, p.producer_id, p.category, p.origin, p.currency, p.price, u.country as producer_country
+                 FROM products p JOIN users u ON p.producer_id = u.id
+                 WHERE p.product_status = 'active' '''
+
+
+def price_bucket(price):
+    if price is None:
+        return None
+    price = float(price)
+    for label, low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return label
+    return None
+
+
+def price_bucket_range(label):
+    """(min, max) for a price bucket label, or None if unknown"""
+    for bucket, low, high in PRICE_BUCKETS:
+        if bucket == label:
+            return low, high
+    return None
+
+
+def _facet_values(row):
+    return {
+        'category': row['category'] or None,
+        'origin': row['origin'] or None,
+        'currency': row['currency'] or None,
+        'producer_country': row['producer_country'] or None,
+        'price_range': price_bucket(row['price']),
+    }
+
+
+class FacetIndex:
+    """In-memory facet counts for the active catalog.
+
+    Keeps a posting set of product ids per facet value so that counts for any
+    combination of facet filters can be answered without touching MySQL. The
+    index is built lazily, updated incrementally by the product write paths, and
+    rebuilt after FACETS_MAX_AGE seconds to pick up writes made by other workers.
+    A rebuild scans into fresh structures without holding the lock and swaps
+    them in at the end; meanwhile other requests keep using the old index.
+    """
+
+    def __init__(self, max_age=FACETS_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()  # one catalog scan at a time
+        self._pending = None  # changes made while a scan runs, replayed after the swap
+        self._built_at = None
+        self._products = {}  # product_id -> {facet: value}
+        self._owners = {}  # product_id -> producer_id
+        self._producers = {}  # producer_id -> product ids
+        self._postings = {facet: {} for facet in FACET_FIELDS}
+
+    # --- maintenance ---
+
+    def _fresh(self):
+        with self._lock:
+            return self._built_at is not None and time.monotonic() - self._built_at < self.max_age
+
+    def _ensure_built(self, conn):
+        if self._fresh():
+            return
+        with self._lock:
+            built = self._built_at is not None
+        # Only the first build makes callers wait; a stale index keeps serving while one request rebuilds it
+        if not self._build_lock.acquire(blocking=not built):
+            return
+        try:
+            if not self._fresh():
+                self._rebuild(conn)
+        finally:
+            self._build_lock.release()
+
+    def rebuild(self, conn):
+        with self._build_lock:
+            self._rebuild(conn)
+
+    def _rebuild(self, conn):
+        with self._lock:
+            self._pending = []
+        products, owners, producers = {}, {}, {}
+        postings = {facet: {} for facet in FACET_FIELDS}
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            cursor.execute(FACET_QUERY)
+            while True:
+                rows = cursor.fetchmany(5000)
+                if not rows:
+                    break
+                for row in rows:
+                    values = _facet_values(row)
+                    products[row['id']] = values
+                    owners[row['id']] = row['producer_id']
+                    producers.setdefault(row['producer_id'], set()).add(row['id'])
+                    for facet, value in values.items():
+                        if value is not None:
+                            postings[facet].setdefault(value, set()).add(row['id'])
+            cursor.close()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self._products, self._owners, self._producers, self._postings = products, owners, producers, postings
+            # Writes that landed during the scan may be missing from it
+            for change, args in pending:
+                change(*args)
+            self._built_at = time.monotonic()
+
+    def _apply(self, change, *args):
+        """Apply a change to the index now and, while a scan runs, again after the swap (lock held)"""
+        change(*args)
+        if self._pending is not None:
+            self._pending.append((change, args))
+
+    def _remove(self, product_id):
+        values = self._products.pop(product_id, None)
+        if values is None:
+            return
+        for facet, value in values.items():
+            ids = self._postings[facet].get(value)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._postings[facet][value]
+        producer_id = self._owners.pop(product_id, None)
+        if producer_id in self._producers:
+            self._producers[producer_id].discard(product_id)
+
+    def _add(self, row):
+        values = _facet_values(row)
+        self._products[row['id']] = values
+        self._owners[row['id']] = row['producer_id']
+        self._producers.setdefault(row['producer_id'], set()).add(row['id'])
+        for facet, value in values.items():
+            if value is not None:
+                self._postings[facet].setdefault(value, set()).add(row['id'])
+
+    def _replace(self, product_id, row):
+        self._remove(product_id)
+        if row:
+            self._add(row)
+
+    def _set_producer_country(self, producer_id, country):
+        postings = self._postings['producer_country']
+        for product_id in self._producers.get(producer_id, ()):
+            values = self._products[product_id]
+            old = values['producer_country']
+            if old is not None and old in postings:
+                postings[old].discard(product_id)
+                if not postings[old]:
+                    del postings[old]
+            values['producer_country'] = country or None
+            if country:
+                postings.setdefault(country, set()).add(product_id)
+
+    def product_changed(self, conn, product_id):
+        """Re-read one product after create/update and refresh its facet values"""
+        with self._lock:
+            if self._built_at is None and self._pending is None:
+                return
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(FACET_QUERY + ' AND p.id = %s', (product_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        with self._lock:
+            self._apply(self._replace, product_id, row)
+
+    def product_deleted(self, product_id):
+        with self._lock:
+            self._apply(self._remove, product_id)
+
+    def producer_country_changed(self, producer_id, country):
+        with self._lock:
+            self._apply(self._set_producer_country, producer_id, country)
+
+    # --- queries ---
+
+    def _matching(self, filters, exclude=None):
+        """Ids matching every filter except `exclude`, or None when unfiltered"""
+        result = None
+        for facet, value in filters.items():
+            if facet == exclude:
+                continue
+            ids = self._postings[facet].get(value, set())
+            result = set(ids) if result is None else result & ids
+            if not result:
+                return set()
+        return result
+
+    def counts(self, conn, filters):
+        """Total and per-value counts for `filters` ({facet: value}).
+
+        Each facet is counted against the other facets' filters only, so the
+        client can offer alternatives within a facet that is already selected.
+        """
+        self._ensure_built(conn)
+        with self._lock:
+            matching = self._matching(filters)
+            total = len(self._products) if matching is None else len(matching)
+            facets = {}
+            for facet in FACET_FIELDS:
+                candidates = self._matching(filters, exclude=facet)
+                values = []
+                for value, ids in self._postings[facet].items():
+                    count = len(ids) if candidates is None else len(ids & candidates)
+                    if count:
+                        values.append({'value': value, 'count': count})
+                values.sort(key=lambda item: (-item['count'], str(item['value'])))
+                facets[facet] = values
+        return {'total': total, 'facets': facets}
+
+    def values(self, conn, facet):
+        self._ensure_built(conn)
+        with self._lock:
+            return sorted(self._postings[facet])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'products': len(self._products),
+                'age': None if self._built_at is None else round(time.monotonic() - self._built_at, 1),
+                'values': {facet: len(values) for facet, values in self._postings.items()},
+            }
+
+
+def sql_facet_counts(conn, filters, min_price=None, max_price=None):
+    """Facet counts straight from MySQL, for filters the in-memory index can't answer (arbitrary price ranges)"""
+    def where(exclude=None):
+        clauses, params = ["p.product_status = 'active'"], []
+        for facet, value in filters.items():
+            if facet == exclude:
+                continue
+            if facet == 'price_range':
+                low, high = price_bucket_range(value) or (None, None)
+                if low is not None:
+                    clauses.append('p.price >= %s')
+                    params.append(low)
+                if high is not None:
+                    clauses.append('p.price < %s')
+                    params.append(high)
+            else:
+                clauses.append(f'{FACET_COLUMNS[facet]} = %s')
+                params.append(value)
+        if min_price is not None:
+            clauses.append('p.price >= %s')
+            params.append(min_price)
+        if max_price is not None:
+            clauses.append('p.price <= %s')
+            params.append(max_price)
+        return ' AND '.join(clauses), params
+
+    cursor = conn.cursor(dictionary=True)
+    clause, params = where()
+    cursor.execute(f'SELECT COUNT(*) as total FROM products p JOIN users u ON p.producer_id = u.id WHERE {clause}', tuple(params))
+    total = cursor.fetchone()['total']
+    facets = {}
+    for facet in FACET_FIELDS:
+        clause, params = where(exclude=facet)
+        column = FACET_COLUMNS[facet]
+        cursor.execute(f'''SELECT {column} as value, COUNT(*) as count FROM products p JOIN users u ON p.producer_id = u.id
+                           WHERE {clause} GROUP BY value''', tuple(params))
+        values = [{'value': row['value'], 'count': row['count']} for row in cursor.fetchall() if row['value']]
+        values.sort(key=lambda item: (-item['count'], str(item['value'])))
+        facets[facet] = values
+    cursor.close()
+    return {'total': total, 'facets': facets}
+
+
+facet_index = FacetIndex()
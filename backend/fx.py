@@ -0,0 +1,158 @@
+import bisect
+import os
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+# Rates are stored as the value of one unit of a currency in FX_BASE_CURRENCY
+FX_BASE_CURRENCY = os.getenv('FX_BASE_CURRENCY', 'NGN')
+FX_REPORTING_CURRENCY = os.getenv('FX_REPORTING_CURRENCY', FX_BASE_CURRENCY)
+FX_CACHE_TTL = float(os.getenv('FX_CACHE_TTL', '300'))
+
+CENT = Decimal('0.01')
+
+
+class FxRates:
+    """In-memory copy of fx_rates, answering "rate for currency X on day D" without a query.
+
+    For each currency the rate dates are kept sorted, so a lookup is a bisect
+    for the latest rate on or before the day (falling back to the earliest
+    known rate for days before the first entry). Reloaded after FX_CACHE_TTL
+    seconds or when this process writes rates.
+    """
+
+    def __init__(self, ttl=FX_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._dates = {}  # currency -> sorted [date]
+        self._rates = {}  # currency -> [Decimal] parallel to _dates
+        self._by_day = {}  # (currency, date) -> Decimal, memoised lookups
+
+    def _ensure_loaded(self, conn):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+        cursor = conn.cursor()
+        cursor.execute('SELECT currency, rate_date, rate FROM fx_rates ORDER BY currency, rate_date')
+        dates, rates = {}, {}
+        for currency, rate_date, rate in cursor.fetchall():
+            dates.setdefault(currency, []).append(rate_date)
+            rates.setdefault(currency, []).append(Decimal(rate))
+        cursor.close()
+        with self._lock:
+            self._dates, self._rates, self._by_day = dates, rates, {}
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def rate(self, conn, currency, day):
+        """Value of one unit of `currency` in FX_BASE_CURRENCY on `day`, or None if unknown"""
+        if currency == FX_BASE_CURRENCY:
+            return Decimal(1)
+        self._ensure_loaded(conn)
+        if isinstance(day, datetime):
+            day = day.date()
+        with self._lock:
+            key = (currency, day)
+            if key in self._by_day:
+                return self._by_day[key]
+            dates = self._dates.get(currency)
+            if not dates:
+                rate = None
+            else:
+                index = bisect.bisect_right(dates, day) - 1
+                rate = self._rates[currency][max(index, 0)]
+            self._by_day[key] = rate
+            return rate
+
+    def convert(self, conn, amount, currency, target, day):
+        """Convert `amount` from `currency` to `target` at the rates for `day`; None if either rate is missing"""
+        if currency == target:
+            return Decimal(amount)
+        source_rate = self.rate(conn, currency, day)
+        target_rate = self.rate(conn, target, day)
+        if source_rate is None or target_rate is None:
+            return None
+        return Decimal(amount) * source_rate / target_rate
+
+    def currencies(self, conn):
+        """Currencies with at least one stored rate, plus the base currency"""
+        self._ensure_loaded(conn)
+        with self._lock:
+            return set(self._dates) | {FX_BASE_CURRENCY}
+
+    def rates_on(self, conn, day):
+        self._ensure_loaded(conn)
+        with self._lock:
+            currencies = list(self._dates)
+        rates = {currency: self.rate(conn, currency, day) for currency in currencies}
+        rates[FX_BASE_CURRENCY] = Decimal(1)
+        return rates
+
+    def stats(self):
+        with self._lock:
+            return {'currencies': len(self._dates), 'rates': sum(len(d) for d in self._dates.values()),
+                    'cached_lookups': len(self._by_day)}
+
+
+fx_rates = FxRates()
+
+
+def upsert_rates(conn, rate_date, rates):
+    """Store {currency: rate} for `rate_date` (one unit of currency in FX_BASE_CURRENCY)"""
+    cursor = conn.cursor()
+    now = datetime.utcnow()
+    cursor.executemany('''INSERT INTO fx_rates (currency, rate_date, rate, created_at, updated_at)
+                          VALUES (%s, %s, %s, %s, %s)
+                          ON DUPLICATE KEY UPDATE rate = VALUES(rate), updated_at = VALUES(updated_at)''',
+                       [(currency, rate_date, rate, now, now) for currency, rate in rates.items()])
+    conn.commit()
+    cursor.close()
+    fx_rates.invalidate()
+
+
+def aggregate_by_currency(conn, rows, amount_keys, count_keys=(), reporting_currency=FX_REPORTING_CURRENCY):
+    """Combine pre-grouped (bucket, currency) rows into per-currency totals and one converted total.
+
+    `rows` are dicts with 'bucket' and 'currency' plus the amount/count keys,
+    typically one row per day and currency from the rollup tables, so each
+    day's amounts are converted at that day's rate. Currencies without a
+    usable rate are listed in 'unconverted' and left out of the converted totals.
+    """
+    by_currency = {}
+    converted = {key: Decimal(0) for key in amount_keys}
+    unconverted = set()
+    for row in rows:
+        currency = row['currency'] or FX_BASE_CURRENCY
+        totals = by_currency.setdefault(currency, dict({key: Decimal(0) for key in amount_keys},
+                                                       **{key: 0 for key in count_keys}))
+        for key in count_keys:
+            totals[key] += int(row[key] or 0)
+        for key in amount_keys:
+            amount = Decimal(row[key] or 0)
+            totals[key] += amount
+            if not amount:
+                continue
+            value = fx_rates.convert(conn, amount, currency, reporting_currency, row['bucket'])
+            if value is None:
+                unconverted.add(currency)
+            else:
+                converted[key] += value
+    return {
+        'reporting_currency': reporting_currency,
+        'totals': {key: float(value.quantize(CENT)) for key, value in converted.items()},
+        'by_currency': [
+            dict({'currency': currency}, **{key: float(value) if isinstance(value, Decimal) else value
+                                            for key, value in totals.items()})
+            for currency, totals in sorted(by_currency.items())
+        ],
+        'unconverted': sorted(unconverted),
+    }
+
+
+def parse_rate_date(value):
+    return date.fromisoformat(value) if value else datetime.utcnow().date()
@@ -0,0 +1,161 @@
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from flask import current_app, request
+from cache import TTLCache
+
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', '86400'))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+ER_DUP_ENTRY = 1062
+
+# (user_id, scope, key) -> (request_hash, status_code, response_text), completed requests only
+_responses = TTLCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL)
+
+
+class IdempotencyError(Exception):
+    """Raised when a key is reused for a different request, or is malformed"""
+
+    def __init__(self, message, status_code=422):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def request_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyKey:
+    """A client-supplied key making one user's create operation safe to retry.
+
+    The key row is inserted in the same transaction as the writes it guards,
+    so a retry that arrives while the first attempt is still running blocks
+    on the primary key and, once that commits, finds the stored response;
+    if the first attempt rolls back the key goes with it. Completed responses
+    are also kept in a bounded in-memory cache so most replays skip the
+    database entirely.
+    """
+
+    def __init__(self, user_id, scope, key, payload):
+        if len(key) > MAX_KEY_LENGTH:
+            raise IdempotencyError(f'{IDEMPOTENCY_KEY_HEADER} must be at most {MAX_KEY_LENGTH} characters', 400)
+        self.user_id = user_id
+        self.scope = scope
+        self.key = key
+        self.request_hash = request_hash(payload)
+        self._response = None
+
+    def _check(self, stored_hash, status_code, response):
+        if stored_hash != self.request_hash:
+            raise IdempotencyError(f'{IDEMPOTENCY_KEY_HEADER} was already used for a different request')
+        return status_code, response
+
+    def cached(self):
+        """(status_code, response_text) from the in-memory cache, or None"""
+        entry = _responses.get((self.user_id, self.scope, self.key))
+        return self._check(*entry) if entry else None
+
+    def claim(self, conn):
+        """Claim the key in conn's transaction.
+
+        Returns None when this request should run, or the stored
+        (status_code, response_text) when it was already processed.
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=IDEMPOTENCY_TTL)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''INSERT INTO idempotency_keys (user_id, scope, idempotency_key, request_hash, created_at, expires_at)
+                              VALUES (%s, %s, %s, %s, %s, %s)''',
+                           (self.user_id, self.scope, self.key, self.request_hash, now, expires_at))
+            return None
+        except Exception as e:
+            if getattr(e, 'errno', None) != ER_DUP_ENTRY:
+                raise
+        finally:
+            cursor.close()
+
+        # Locking read: sees the committed row even if this transaction already has a snapshot
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute('''SELECT request_hash, status_code, response, expires_at FROM idempotency_keys
+                          WHERE user_id = %s AND scope = %s AND idempotency_key = %s FOR UPDATE''',
+                       (self.user_id, self.scope, self.key))
+        row = cursor.fetchone()
+        if row is None or row['expires_at'] < now:
+            cursor.execute('''REPLACE INTO idempotency_keys (user_id, scope, idempotency_key, request_hash, created_at, expires_at)
+                              VALUES (%s, %s, %s, %s, %s, %s)''',
+                           (self.user_id, self.scope, self.key, self.request_hash, now, expires_at))
+            cursor.close()
+            return None
+        cursor.close()
+        if row['status_code'] is None:
+            raise IdempotencyError('A request with this key did not complete; retry with a new key', 409)
+        stored = self._check(row['request_hash'], row['status_code'], row['response'])
+        _responses.set((self.user_id, self.scope, self.key), (row['request_hash'], *stored))
+        return stored
+
+    def save(self, conn, status_code, body):
+        """Store the response alongside the request's writes; call before committing"""
+        text = current_app.json.dumps(body)
+        cursor = conn.cursor()
+        cursor.execute('''UPDATE idempotency_keys SET status_code = %s, response = %s
+                          WHERE user_id = %s AND scope = %s AND idempotency_key = %s''',
+                       (status_code, text, self.user_id, self.scope, self.key))
+        cursor.close()
+        self._response = (status_code, text)
+
+    def remember(self):
+        """Cache the saved response in memory; call after the transaction committed"""
+        if self._response:
+            _responses.set((self.user_id, self.scope, self.key), (self.request_hash, *self._response))
+
+
+def from_request(scope, user_id, payload):
+    """IdempotencyKey for the current request's Idempotency-Key header, or None if it has none"""
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER, '').strip()
+    return IdempotencyKey(user_id, scope, key, payload) if key else None
+
+
+def replay_response(stored):
+    status_code, text = stored
+    return current_app.response_class(text, status=status_code, mimetype='application/json',
+                                      headers={'Idempotent-Replayed': 'true'})
+
+
+def purge_expired(conn, batch_size=1000):
+    """Delete expired keys in small batches; returns the number of rows removed"""
+    removed = 0
+    cursor = conn.cursor()
+    while True:
+        cursor.execute('DELETE FROM idempotency_keys WHERE expires_at < %s LIMIT %s', (datetime.utcnow(), batch_size))
+        conn.commit()
+        removed += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            break
+    cursor.close()
+    return removed
+
+
+def stats():
+    return _responses.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the idempotency key store')
+    parser.add_argument('command', choices=['purge'])
+    args = parser.parse_args()
+
+    from db import get_db_connection
+    conn = get_db_connection()
+    try:
+        print(f"Removed {purge_expired(conn)} expired idempotency keys")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
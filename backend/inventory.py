@@ -0,0 +1,212 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+import rollups
+
+# How long a pending, unpaid order keeps its stock before release_expired() cancels it
+INVENTORY_HOLD_TTL = float(os.getenv('INVENTORY_HOLD_TTL', '86400'))
+
+CANCELLED_STATUS = 'cancelled'
+# Order / payment statuses after which a hold no longer expires
+FULFILMENT_STATUSES = ('processing', 'shipped', 'delivered', 'completed')
+PAID_STATUSES = ('completed', 'paid')
+
+
+class OutOfStock(Exception):
+    """Raised when a product does not have enough stock left for a reservation"""
+
+    def __init__(self, product_id, requested, available):
+        super().__init__(f'Insufficient stock for product {product_id}')
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+
+def decrement(conn, quantities):
+    """Take {product_id: quantity} out of products.quantity.
+
+    Each product is a single conditional UPDATE on its primary key, so the
+    stock check and the decrement happen under one row lock instead of a
+    SELECT followed by an UPDATE. Products are updated in id order so
+    concurrent multi-product reservations cannot deadlock. Raises OutOfStock
+    on the first product that cannot be covered; the caller rolls back.
+    """
+    cursor = conn.cursor()
+    try:
+        for product_id, quantity in sorted(quantities.items()):
+            cursor.execute('UPDATE products SET quantity = quantity - %s WHERE id = %s AND quantity >= %s',
+                           (quantity, product_id, quantity))
+            if cursor.rowcount == 0:
+                cursor.execute('SELECT quantity FROM products WHERE id = %s', (product_id,))
+                row = cursor.fetchone()
+                raise OutOfStock(product_id, quantity, row[0] if row else 0)
+    finally:
+        cursor.close()
+
+
+def reserve(conn, lines):
+    """Reserve stock for new orders in the caller's transaction.
+
+    `lines` are dicts with order_id, product_id and quantity. Stock is taken
+    with decrement() and a 'held' inventory_reservations row is written per
+    order, expiring after INVENTORY_HOLD_TTL. Call it as late as possible
+    before commit: the product rows stay locked until the transaction ends.
+    """
+    quantities = {}
+    for line in lines:
+        quantities[line['product_id']] = quantities.get(line['product_id'], 0) + int(line['quantity'])
+    decrement(conn, quantities)
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=INVENTORY_HOLD_TTL)
+    cursor = conn.cursor()
+    cursor.executemany('''INSERT INTO inventory_reservations (order_id, product_id, quantity, status, expires_at, created_at, updated_at)
+                          VALUES (%s, %s, %s, %s, %s, %s, %s)''',
+                       [(line['order_id'], line['product_id'], int(line['quantity']), 'held', expires_at, now, now) for line in lines])
+    cursor.close()
+
+
+def _outstanding(conn, order_ids):
+    """Held or committed reservations of `order_ids`: their stock is still out of products.quantity"""
+    cursor = conn.cursor(dictionary=True)
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    cursor.execute(f'''SELECT id, order_id, product_id, quantity FROM inventory_reservations
+                       WHERE order_id IN ({placeholders}) AND status IN ('held', 'committed') FOR UPDATE''',
+                   tuple(order_ids))
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def release(conn, order_ids):
+    """Return the stock of cancelled or deleted orders; returns the number of reservations released.
+
+    Committed reservations (paid or fulfilled orders) are released too: the
+    stock was taken out when the order was placed and only comes back here.
+    """
+    if not order_ids:
+        return 0
+    held = _outstanding(conn, order_ids)
+    if not held:
+        return 0
+    quantities = {}
+    for row in held:
+        quantities[row['product_id']] = quantities.get(row['product_id'], 0) + row['quantity']
+    now = datetime.utcnow()
+    cursor = conn.cursor()
+    cursor.executemany('UPDATE products SET quantity = quantity + %s WHERE id = %s',
+                       [(quantity, product_id) for product_id, quantity in sorted(quantities.items())])
+    cursor.executemany('UPDATE inventory_reservations SET status = %s, updated_at = %s WHERE id = %s',
+                       [('released', now, row['id']) for row in held])
+    cursor.close()
+    return len(held)
+
+
+def confirm(conn, order_ids):
+    """Keep the stock of orders that are paid or being fulfilled; their holds no longer expire"""
+    if not order_ids:
+        return
+    cursor = conn.cursor()
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    cursor.execute(f'''UPDATE inventory_reservations SET status = 'committed', updated_at = %s
+                       WHERE order_id IN ({placeholders}) AND status = 'held' ''', (datetime.utcnow(), *order_ids))
+    cursor.close()
+
+
+def _resize(conn, reservation, quantity):
+    """Take or return the difference when an order's quantity changes"""
+    delta = quantity - reservation['quantity']
+    if delta > 0:
+        decrement(conn, {reservation['product_id']: delta})
+    elif delta < 0:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE products SET quantity = quantity + %s WHERE id = %s', (-delta, reservation['product_id']))
+        cursor.close()
+    cursor = conn.cursor()
+    cursor.execute('UPDATE inventory_reservations SET quantity = %s, updated_at = %s WHERE id = %s',
+                   (quantity, datetime.utcnow(), reservation['id']))
+    cursor.close()
+
+
+def order_updated(conn, order_id):
+    """Bring an order's reservation in line with the order row after an edit, in the caller's transaction.
+
+    Cancelling returns the order's stock, held or committed. Changing the quantity takes or returns the
+    difference, and un-cancelling takes the stock again under a new hold,
+    both with decrement(), so either can raise OutOfStock. Paid or fulfilled
+    orders have their hold confirmed. Orders placed before reservations
+    existed have none and are left alone. Returns the ids of the products
+    whose stock changed.
+    """
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute('SELECT product_id, quantity, status, payment_status FROM orders WHERE id = %s', (order_id,))
+    order = cursor.fetchone()
+    cursor.execute('''SELECT id, product_id, quantity, status FROM inventory_reservations WHERE order_id = %s
+                      ORDER BY id DESC LIMIT 1 FOR UPDATE''', (order_id,))
+    reservation = cursor.fetchone()
+    cursor.close()
+    if order is None or reservation is None:
+        return []
+    if order['status'] == CANCELLED_STATUS:
+        return [reservation['product_id']] if release(conn, [order_id]) else []
+    changed = []
+    quantity = int(order['quantity'])
+    if reservation['status'] == 'released':
+        reserve(conn, [{'order_id': order_id, 'product_id': order['product_id'], 'quantity': quantity}])
+        changed.append(order['product_id'])
+    elif quantity != reservation['quantity']:
+        _resize(conn, reservation, quantity)
+        changed.append(reservation['product_id'])
+    if order['status'] in FULFILMENT_STATUSES or order['payment_status'] in PAID_STATUSES:
+        confirm(conn, [order_id])
+    return changed
+
+
+def release_expired(conn, batch_size=500):
+    """Cancel pending, unpaid orders whose hold has expired and return their stock.
+
+    Works in batches, one transaction each; returns the number of orders cancelled.
+    Run from the command line, this cannot reach the workers' response caches:
+    product pages show the returned stock once their entries expire. Stock
+    only goes up here, so a stale page never offers stock that is gone.
+    """
+    cancelled = 0
+    while True:
+        cursor = conn.cursor()
+        cursor.execute('''SELECT r.order_id FROM inventory_reservations r JOIN orders o ON r.order_id = o.id
+                          WHERE r.status = 'held' AND r.expires_at < %s AND o.status = 'pending'
+                          AND o.payment_status = 'pending'
+                          ORDER BY r.expires_at LIMIT %s FOR UPDATE''', (datetime.utcnow(), batch_size))
+        order_ids = sorted({row[0] for row in cursor.fetchall()})
+        cursor.close()
+        if not order_ids:
+            conn.rollback()
+            return cancelled
+        with rollups.track_orders(conn, order_ids):
+            cursor = conn.cursor()
+            cursor.executemany('UPDATE orders SET status = %s, updated_at = %s WHERE id = %s',
+                               [(CANCELLED_STATUS, datetime.utcnow(), order_id) for order_id in order_ids])
+            cursor.close()
+        release(conn, order_ids)
+        conn.commit()
+        cancelled += len(order_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain inventory reservations')
+    parser.add_argument('command', choices=['release-expired'])
+    args = parser.parse_args()
+
+    from db import get_db_connection
+    conn = get_db_connection()
+    try:
+        print(f"Cancelled {release_expired(conn)} expired pending orders")
+    except Exception as e:
+        conn.rollback()
+        print(f"Releasing expired reservations failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
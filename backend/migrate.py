@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations.
+
+Migrations live in backend/migrations/ as NNNN_description.py files, each with an
+upgrade(m) function that receives a Migrator. Applied versions are recorded in the
+schema_version table; long-running backfills record their progress in
+migration_progress so an interrupted run resumes where it stopped.
+
+    python migrate.py status
+    python migrate.py up [--target N] [--allow-blocking-ddl]
+    python migrate.py baseline [--target N]     # record versions as applied without running them
+
+Schema changes are issued as online DDL (ALGORITHM=INSTANT / INPLACE, LOCK=NONE)
+with a short lock_wait_timeout, so they never queue behind (and block) live traffic
+for long; statements MySQL can only run with a table lock are refused unless
+--allow-blocking-ddl is given.
+"""
+
+import argparse
+import glob
+import hashlib
+import importlib.util
+import os
+import sys
+import time
+from datetime import datetime
+from db import get_db_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', '5000'))
+MIGRATION_BATCH_SLEEP = float(os.getenv('MIGRATION_BATCH_SLEEP', '0.05'))
+MIGRATION_LOCK_WAIT_TIMEOUT = int(os.getenv('MIGRATION_LOCK_WAIT_TIMEOUT', '5'))
+MIGRATION_DDL_RETRIES = int(os.getenv('MIGRATION_DDL_RETRIES', '5'))
+
+# MySQL errors for "this ALGORITHM/LOCK is not supported" (1800: unknown ALGORITHM, e.g. INSTANT on 5.7)
+ER_ALTER_OPERATION_NOT_SUPPORTED = (1800, 1845, 1846)
+ER_LOCK_WAIT_TIMEOUT = 1205
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migrator:
+    """Helpers handed to each migration's upgrade() function.
+
+    The schema helpers check information_schema first, so a migration can be run
+    against a database where some of its changes were already applied by hand.
+    """
+
+    def __init__(self, conn, version, allow_blocking_ddl=False):
+        self.conn = conn
+        self.version = version
+        self.allow_blocking_ddl = allow_blocking_ddl
+        self.database = self.scalar('SELECT DATABASE()')
+
+    def scalar(self, query, params=()):
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] if row else None
+
+    def execute(self, statement, params=()):
+        cursor = self.conn.cursor()
+        cursor.execute(statement, params)
+        rowcount = cursor.rowcount
+        self.conn.commit()
+        cursor.close()
+        return rowcount
+
+    # --- introspection ---
+
+    def table_exists(self, table):
+        return bool(self.scalar('SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = %s AND table_name = %s',
+                                (self.database, table)))
+
+    def column_exists(self, table, column):
+        return bool(self.scalar('''SELECT COUNT(*) FROM information_schema.columns
+                                   WHERE table_schema = %s AND table_name = %s AND column_name = %s''',
+                                (self.database, table, column)))
+
+    def index_exists(self, table, index):
+        return bool(self.scalar('''SELECT COUNT(*) FROM information_schema.statistics
+                                   WHERE table_schema = %s AND table_name = %s AND index_name = %s''',
+                                (self.database, table, index)))
+
+    # --- online DDL ---
+
+    def _run_ddl(self, statement):
+        """Run DDL, retrying when the metadata lock can't be taken within lock_wait_timeout"""
+        for attempt in range(1, MIGRATION_DDL_RETRIES + 1):
+            try:
+                self.execute(statement)
+                return
+            except Exception as e:
+                if getattr(e, 'errno', None) != ER_LOCK_WAIT_TIMEOUT or attempt == MIGRATION_DDL_RETRIES:
+                    raise
+                print(f"  metadata lock busy, retrying ({attempt}/{MIGRATION_DDL_RETRIES})")
+                time.sleep(attempt)
+
+    def alter_table(self, table, changes, algorithms=('INPLACE',)):
+        """ALTER TABLE without blocking writes: tries each algorithm with LOCK=NONE (INSTANT takes no LOCK clause)"""
+        for algorithm in algorithms:
+            clause = 'ALGORITHM=INSTANT' if algorithm == 'INSTANT' else f'ALGORITHM={algorithm}, LOCK=NONE'
+            try:
+                self._run_ddl(f'ALTER TABLE {table} {changes}, {clause}')
+                return
+            except Exception as e:
+                if getattr(e, 'errno', None) not in ER_ALTER_OPERATION_NOT_SUPPORTED:
+                    raise
+        if not self.allow_blocking_ddl:
+            raise MigrationError(f'ALTER TABLE {table} {changes} cannot run online; '
+                                 're-run with --allow-blocking-ddl during a maintenance window')
+        print(f"  running blocking DDL on {table}")
+        self._run_ddl(f'ALTER TABLE {table} {changes}')
+
+    def create_table(self, table, definition):
+        if self.table_exists(table):
+            print(f"  table {table} already exists")
+            return
+        self._run_ddl(f'CREATE TABLE {table} ({definition})')
+        print(f"  created table {table}")
+
+    def add_column(self, table, column, definition):
+        if self.column_exists(table, column):
+            print(f"  column {table}.{column} already exists")
+            return
+        self.alter_table(table, f'ADD COLUMN {column} {definition}', algorithms=('INSTANT', 'INPLACE'))
+        print(f"  added column {table}.{column}")
+
+    def add_index(self, table, index, columns, kind='INDEX'):
+        if self.index_exists(table, index):
+            print(f"  index {table}.{index} already exists")
+            return
+        if kind == 'FULLTEXT INDEX':
+            # InnoDB can't build FULLTEXT indexes with LOCK=NONE; writes are blocked, reads are not
+            if not self.allow_blocking_ddl:
+                raise MigrationError(f'FULLTEXT index {table}.{index} blocks writes while it builds; '
+                                     're-run with --allow-blocking-ddl during a maintenance window')
+            self._run_ddl(f'ALTER TABLE {table} ADD FULLTEXT INDEX {index} ({columns}), ALGORITHM=INPLACE, LOCK=SHARED')
+        else:
+            self.alter_table(table, f'ADD {kind} {index} ({columns})')
+        print(f"  added index {table}.{index}")
+
+    # --- batched backfills ---
+
+    def progress(self, task):
+        """Last primary key committed by backfill `task`, or None if it hasn't started"""
+        return self.scalar('SELECT last_id FROM migration_progress WHERE version = %s AND task = %s', (self.version, task))
+
+    def _save_progress(self, cursor, task, last_id):
+        cursor.execute('''INSERT INTO migration_progress (version, task, last_id, updated_at) VALUES (%s, %s, %s, %s)
+                          ON DUPLICATE KEY UPDATE last_id = VALUES(last_id), updated_at = VALUES(updated_at)''',
+                       (self.version, task, last_id, datetime.utcnow()))
+
+    def backfill(self, task, table, statement, batch_size=None, sleep=None, pk='id'):
+        """Run `statement` over `table` in primary-key ranges [start, end), one short transaction per batch.
+
+        `statement` takes the range bounds as two %s parameters. Progress is saved
+        in the same transaction as each batch, so an interrupted backfill resumes
+        after the last committed range. Between batches the runner sleeps for
+        `sleep` seconds or as long as the batch took, whichever is longer, keeping
+        the backfill's share of the database at or below half.
+        """
+        batch_size = batch_size or MIGRATION_BATCH_SIZE
+        sleep = MIGRATION_BATCH_SLEEP if sleep is None else sleep
+        low = self.scalar(f'SELECT MIN({pk}) FROM {table}')
+        high = self.scalar(f'SELECT MAX({pk}) FROM {table}')
+        if low is None:
+            print(f"  {task}: {table} is empty")
+            return
+        done = self.progress(task)
+        start = low if done is None else done + 1
+        if start > high:
+            print(f"  {task}: already complete")
+            return
+        total = high - low + 1
+        updated = 0
+        cursor = self.conn.cursor()
+        while start <= high:
+            end = start + batch_size
+            began = time.monotonic()
+            cursor.execute(statement, (start, end))
+            updated += cursor.rowcount
+            self._save_progress(cursor, task, end - 1)
+            self.conn.commit()
+            elapsed = time.monotonic() - began
+            covered = min(end, high + 1) - low
+            print(f"  {task}: {covered * 100 // total}% ({min(end - 1, high)}/{high}, {updated} rows updated)")
+            start = end
+            time.sleep(max(sleep, elapsed))
+        cursor.close()
+
+
+# --- runner ---
+
+def load_migrations():
+    """[(version, name, path, checksum)] sorted by version"""
+    migrations = []
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, '[0-9]*_*.py'))):
+        filename = os.path.basename(path)
+        version = int(filename.split('_', 1)[0])
+        with open(path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        migrations.append((version, filename[:-3], path, checksum))
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError('Duplicate migration version numbers in migrations/')
+    return migrations
+
+
+def ensure_version_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+                          version INT PRIMARY KEY,
+                          name VARCHAR(255) NOT NULL,
+                          checksum CHAR(64) NOT NULL,
+                          duration_ms INT,
+                          applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                      )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS migration_progress (
+                          version INT NOT NULL,
+                          task VARCHAR(100) NOT NULL,
+                          last_id BIGINT NOT NULL,
+                          updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                          PRIMARY KEY (version, task)
+                      )''')
+    conn.commit()
+    cursor.close()
+
+
+def applied_versions(conn):
+    cursor = conn.cursor()
+    cursor.execute('SELECT version, checksum FROM schema_version')
+    applied = dict(cursor.fetchall())
+    cursor.close()
+    return applied
+
+
+def _record(conn, version, name, checksum, duration_ms):
+    cursor = conn.cursor()
+    cursor.execute('INSERT INTO schema_version (version, name, checksum, duration_ms, applied_at) VALUES (%s, %s, %s, %s, %s)',
+                   (version, name, checksum, duration_ms, datetime.utcnow()))
+    conn.commit()
+    cursor.close()
+
+
+def _acquire_lock(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK('tradelink_migrate', 0)")
+    acquired = cursor.fetchone()[0] == 1
+    cursor.close()
+    if not acquired:
+        raise MigrationError('Another migration run is in progress')
+
+
+def status(conn):
+    applied = applied_versions(conn)
+    for version, name, _, checksum in load_migrations():
+        if version not in applied:
+            state = 'pending'
+        elif applied[version] != checksum:
+            state = 'applied (file changed since)'
+        else:
+            state = 'applied'
+        print(f"{name:<45} {state}")
+
+
+def upgrade(conn, target=None, allow_blocking_ddl=False):
+    _acquire_lock(conn)
+    applied = applied_versions(conn)
+    pending = [m for m in load_migrations() if m[0] not in applied and (target is None or m[0] <= target)]
+    if not pending:
+        print("Database is up to date")
+        return
+    cursor = conn.cursor()
+    cursor.execute(f'SET SESSION lock_wait_timeout = {MIGRATION_LOCK_WAIT_TIMEOUT}')
+    cursor.close()
+    for version, name, path, checksum in pending:
+        print(f"Applying {name}")
+        spec = importlib.util.spec_from_file_location(f'migration_{version}', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        started = time.monotonic()
+        module.upgrade(Migrator(conn, version, allow_blocking_ddl))
+        duration_ms = int((time.monotonic() - started) * 1000)
+        _record(conn, version, name, checksum, duration_ms)
+        print(f"Applied {name} in {duration_ms / 1000:.1f}s")
+
+
+def baseline(conn, target=None):
+    """Mark migrations as applied without running them (for databases created from schema.sql)"""
+    _acquire_lock(conn)
+    applied = applied_versions(conn)
+    for version, name, _, checksum in load_migrations():
+        if version not in applied and (target is None or version <= target):
+            _record(conn, version, name, checksum, None)
+            print(f"Marked {name} as applied")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply versioned schema migrations')
+    parser.add_argument('command', choices=['status', 'up', 'baseline'])
+    parser.add_argument('--target', type=int, help='stop after this version')
+    parser.add_argument('--allow-blocking-ddl', action='store_true',
+                        help='allow statements MySQL cannot run without locking the table')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        ensure_version_tables(conn)
+        if args.command == 'status':
+            status(conn)
+        elif args.command == 'baseline':
+            baseline(conn, args.target)
+        else:
+            upgrade(conn, args.target, args.allow_blocking_ddl)
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        cursor = conn.cursor()
+        cursor.execute("SELECT RELEASE_LOCK('tradelink_migrate')")
+        cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
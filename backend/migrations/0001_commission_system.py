@@ -0,0 +1,33 @@
+"""Commission tracking: commissions and admin_bank_details tables, order commission columns"""
+
+
+def upgrade(m):
+    m.create_table('commissions', '''
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        order_id INT NOT NULL,
+        producer_id INT NOT NULL,
+        admin_id INT NOT NULL,
+        order_amount DECIMAL(10,2) NOT NULL,
+        commission_amount DECIMAL(10,2) NOT NULL,
+        producer_amount DECIMAL(10,2) NOT NULL,
+        commission_percentage DECIMAL(5,2) DEFAULT 10.00,
+        status VARCHAR(20) DEFAULT 'pending',
+        payment_reference VARCHAR(255),
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (order_id) REFERENCES orders(id),
+        FOREIGN KEY (producer_id) REFERENCES users(id),
+        FOREIGN KEY (admin_id) REFERENCES users(id)''')
+    m.create_table('admin_bank_details', '''
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        bank_name VARCHAR(100) NOT NULL,
+        account_name VARCHAR(100) NOT NULL,
+        account_number VARCHAR(50) NOT NULL,
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP''')
+    # Default admin account, only if none has been configured yet
+    m.execute('''INSERT INTO admin_bank_details (bank_name, account_name, account_number)
+                 SELECT 'Opay', 'Aminu Aminu', '8060051309' FROM DUAL
+                 WHERE NOT EXISTS (SELECT 1 FROM admin_bank_details)''')
+    m.add_column('orders', 'commission_amount', 'DECIMAL(10,2) DEFAULT 0.00')
+    m.add_column('orders', 'producer_amount', 'DECIMAL(10,2) DEFAULT 0.00')
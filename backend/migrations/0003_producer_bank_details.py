@@ -0,0 +1,25 @@
+"""Producer bank accounts, plus quick-access bank columns on users"""
+
+
+def upgrade(m):
+    m.create_table('producer_bank_details', '''
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        producer_id INT NOT NULL,
+        bank_name VARCHAR(100) NOT NULL,
+        account_name VARCHAR(100) NOT NULL,
+        account_number VARCHAR(50) NOT NULL,
+        bank_code VARCHAR(20),
+        swift_code VARCHAR(20),
+        routing_number VARCHAR(20),
+        is_active BOOLEAN DEFAULT TRUE,
+        is_verified BOOLEAN DEFAULT FALSE,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (producer_id) REFERENCES users(id) ON DELETE CASCADE,
+        UNIQUE KEY unique_producer_bank (producer_id, account_number)''')
+    for column, definition in [('bank_name', 'VARCHAR(100) NULL'), ('account_name', 'VARCHAR(100) NULL'),
+                               ('account_number', 'VARCHAR(50) NULL'), ('bank_code', 'VARCHAR(20) NULL'),
+                               ('swift_code', 'VARCHAR(20) NULL'), ('routing_number', 'VARCHAR(20) NULL')]:
+        m.add_column('users', column, definition)
+    m.add_index('producer_bank_details', 'idx_producer_bank_details', 'producer_id, is_active')
+    m.add_index('users', 'idx_users_bank_details', 'id, bank_name, account_number')
@@ -0,0 +1,20 @@
+"""Composite indexes for keyset (cursor) pagination on (created_at, id)"""
+
+INDEXES = [
+    ('products', 'idx_products_status_created', 'product_status, created_at, id'),
+    ('products', 'idx_products_producer_created', 'producer_id, created_at, id'),
+    ('orders', 'idx_orders_created', 'created_at, id'),
+    ('orders', 'idx_orders_buyer_created', 'buyer_id, created_at, id'),
+    ('orders', 'idx_orders_product_created', 'product_id, created_at, id'),
+    ('users', 'idx_users_created', 'created_at, id'),
+    ('users', 'idx_users_type_created', 'user_type, created_at, id'),
+    ('commissions', 'idx_commissions_created', 'created_at, id'),
+    ('inquiries', 'idx_inquiries_buyer', 'buyer_id, created_at, id'),
+    ('inquiries', 'idx_inquiries_producer', 'producer_id, created_at, id'),
+    ('messages', 'idx_messages_inquiry_created', 'inquiry_id, created_at'),
+]
+
+
+def upgrade(m):
+    for table, index, columns in INDEXES:
+        m.add_index(table, index, columns)
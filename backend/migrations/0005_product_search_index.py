@@ -0,0 +1,11 @@
+"""Full-text indexes for product search.
+
+InnoDB cannot build FULLTEXT indexes without blocking writes, so this migration
+needs --allow-blocking-ddl and should run in a quiet period.
+"""
+
+
+def upgrade(m):
+    m.add_index('products', 'ft_products_search', 'name, description, category, origin', kind='FULLTEXT INDEX')
+    m.add_index('tags', 'ft_tags_name', 'name', kind='FULLTEXT INDEX')
+    m.add_index('product_tags', 'idx_product_tags_tag', 'tag_id, product_id')
@@ -0,0 +1,83 @@
+"""Daily / monthly sales and commission rollups for the dashboards.
+
+Daily rows are backfilled in order / commission id ranges and monthly rows are
+then derived from them. Writes that land while the backfill runs (before the
+code that maintains the rollups is deployed) can be reconciled afterwards with
+`python rollups.py rebuild --since <date>`.
+"""
+
+
+def upgrade(m):
+    m.create_table('sales_rollups', '''
+        grain VARCHAR(5) NOT NULL,
+        bucket DATE NOT NULL,
+        producer_id INT NOT NULL,
+        currency VARCHAR(10) NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        payment_status VARCHAR(20) NOT NULL,
+        order_count INT NOT NULL DEFAULT 0,
+        total_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+        commission_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+        producer_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+        PRIMARY KEY (producer_id, grain, bucket, currency, status, payment_status),
+        INDEX idx_sales_rollups_bucket (grain, bucket)''')
+    m.create_table('commission_rollups', '''
+        grain VARCHAR(5) NOT NULL,
+        bucket DATE NOT NULL,
+        producer_id INT NOT NULL,
+        currency VARCHAR(10) NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        commission_count INT NOT NULL DEFAULT 0,
+        order_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+        commission_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+        producer_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+        PRIMARY KEY (producer_id, grain, bucket, currency, status),
+        INDEX idx_commission_rollups_bucket (grain, bucket)''')
+
+    # The backfills add to existing rows, so start from empty daily rollups unless resuming
+    if m.progress('sales_rollups_daily') is None:
+        m.execute("DELETE FROM sales_rollups WHERE grain = 'day'")
+    if m.progress('commission_rollups_daily') is None:
+        m.execute("DELETE FROM commission_rollups WHERE grain = 'day'")
+
+    m.backfill('sales_rollups_daily', 'orders', '''
+        INSERT INTO sales_rollups (grain, bucket, producer_id, currency, status, payment_status,
+                                   order_count, total_amount, commission_amount, producer_amount)
+        SELECT 'day', DATE(o.created_at), p.producer_id, COALESCE(o.currency, ''), COALESCE(o.status, ''),
+               COALESCE(o.payment_status, ''), COUNT(*), SUM(o.total_amount),
+               COALESCE(SUM(o.commission_amount), 0), COALESCE(SUM(o.producer_amount), 0)
+        FROM orders o JOIN products p ON o.product_id = p.id
+        WHERE o.id >= %s AND o.id < %s AND o.created_at IS NOT NULL
+        GROUP BY 2, 3, 4, 5, 6
+        ON DUPLICATE KEY UPDATE order_count = order_count + VALUES(order_count),
+                                total_amount = total_amount + VALUES(total_amount),
+                                commission_amount = commission_amount + VALUES(commission_amount),
+                                producer_amount = producer_amount + VALUES(producer_amount)''')
+    m.backfill('commission_rollups_daily', 'commissions', '''
+        INSERT INTO commission_rollups (grain, bucket, producer_id, currency, status,
+                                        commission_count, order_amount, commission_amount, producer_amount)
+        SELECT 'day', DATE(c.created_at), c.producer_id, COALESCE(o.currency, ''), COALESCE(c.status, ''),
+               COUNT(*), SUM(c.order_amount), SUM(c.commission_amount), SUM(c.producer_amount)
+        FROM commissions c JOIN orders o ON c.order_id = o.id
+        WHERE c.id >= %s AND c.id < %s AND c.created_at IS NOT NULL
+        GROUP BY 2, 3, 4, 5
+        ON DUPLICATE KEY UPDATE commission_count = commission_count + VALUES(commission_count),
+                                order_amount = order_amount + VALUES(order_amount),
+                                commission_amount = commission_amount + VALUES(commission_amount),
+                                producer_amount = producer_amount + VALUES(producer_amount)''')
+
+    # Months are small (one row per producer, currency and status per month), so derive them in one go
+    m.execute("DELETE FROM sales_rollups WHERE grain = 'month'")
+    m.execute('''INSERT INTO sales_rollups (grain, bucket, producer_id, currency, status, payment_status,
+                                            order_count, total_amount, commission_amount, producer_amount)
+                 SELECT 'month', DATE_SUB(bucket, INTERVAL DAYOFMONTH(bucket) - 1 DAY), producer_id, currency, status,
+                        payment_status, SUM(order_count), SUM(total_amount), SUM(commission_amount), SUM(producer_amount)
+                 FROM sales_rollups WHERE grain = 'day'
+                 GROUP BY 2, 3, 4, 5, 6''')
+    m.execute("DELETE FROM commission_rollups WHERE grain = 'month'")
+    m.execute('''INSERT INTO commission_rollups (grain, bucket, producer_id, currency, status,
+                                                 commission_count, order_amount, commission_amount, producer_amount)
+                 SELECT 'month', DATE_SUB(bucket, INTERVAL DAYOFMONTH(bucket) - 1 DAY), producer_id, currency, status,
+                        SUM(commission_count), SUM(order_amount), SUM(commission_amount), SUM(producer_amount)
+                 FROM commission_rollups WHERE grain = 'day'
+                 GROUP BY 2, 3, 4, 5''')
@@ -0,0 +1,11 @@
+"""FX rates: value of one unit of a currency in the base currency (FX_BASE_CURRENCY)"""
+
+
+def upgrade(m):
+    m.create_table('fx_rates', '''
+        currency VARCHAR(10) NOT NULL,
+        rate_date DATE NOT NULL,
+        rate DECIMAL(18,8) NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (currency, rate_date)''')
@@ -0,0 +1,41 @@
+"""Batch commission settlement: settlement runs, per-producer payout items, and commissions.settlement_run_id"""
+
+
+def upgrade(m):
+    m.create_table('settlement_runs', '''
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        created_by INT NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'processing',
+        currency VARCHAR(10),
+        cutoff DATETIME,
+        producer_count INT NOT NULL DEFAULT 0,
+        commission_count INT NOT NULL DEFAULT 0,
+        completed_at DATETIME,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (created_by) REFERENCES users(id),
+        INDEX idx_settlement_runs_created (created_at, id)''')
+    m.create_table('settlement_items', '''
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        run_id INT NOT NULL,
+        producer_id INT NOT NULL,
+        currency VARCHAR(10) NOT NULL,
+        commission_count INT NOT NULL,
+        order_amount DECIMAL(16,2) NOT NULL,
+        commission_amount DECIMAL(16,2) NOT NULL,
+        payout_amount DECIMAL(16,2) NOT NULL,
+        bank_details_id INT,
+        bank_name VARCHAR(100),
+        account_name VARCHAR(100),
+        account_number VARCHAR(50),
+        bank_code VARCHAR(20),
+        swift_code VARCHAR(20),
+        routing_number VARCHAR(20),
+        payment_reference VARCHAR(255),
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (run_id) REFERENCES settlement_runs(id),
+        FOREIGN KEY (producer_id) REFERENCES users(id),
+        UNIQUE KEY unique_settlement_item (run_id, producer_id, currency)''')
+    m.add_column('commissions', 'settlement_run_id', 'INT NULL')
+    m.add_index('commissions', 'idx_commissions_settlement', 'settlement_run_id')
+    m.add_index('commissions', 'idx_commissions_status_producer', 'status, producer_id')
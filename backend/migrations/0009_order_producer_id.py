@@ -0,0 +1,12 @@
+"""Denormalized orders.producer_id so producer queries don't have to join products"""
+
+
+def upgrade(m):
+    m.add_column('orders', 'producer_id', 'INT NULL AFTER buyer_id')
+    m.backfill('orders_producer_id', 'orders', '''
+        UPDATE orders o JOIN products p ON o.product_id = p.id
+        SET o.producer_id = p.producer_id
+        WHERE o.id >= %s AND o.id < %s AND o.producer_id IS NULL''')
+    m.add_index('orders', 'idx_orders_producer_created', 'producer_id, created_at, id')
+    m.add_index('orders', 'idx_orders_producer_status', 'producer_id, status')
+    m.add_index('orders', 'idx_orders_producer_payment', 'producer_id, payment_status, created_at')
@@ -0,0 +1,7 @@
+"""Groups the orders created by one cart checkout"""
+
+
+def upgrade(m):
+    m.add_column('orders', 'checkout_id', 'VARCHAR(36) NULL AFTER id')
+    m.add_index('orders', 'idx_orders_checkout', 'checkout_id')
+    m.add_index('cart', 'idx_cart_buyer', 'buyer_id, id')
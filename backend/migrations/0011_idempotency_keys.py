@@ -0,0 +1,15 @@
+"""Idempotency keys: stored responses for retried order and message creation"""
+
+
+def upgrade(m):
+    m.create_table('idempotency_keys', '''
+        user_id INT NOT NULL,
+        scope VARCHAR(50) NOT NULL,
+        idempotency_key VARCHAR(255) NOT NULL,
+        request_hash CHAR(64) NOT NULL,
+        status_code SMALLINT NULL,
+        response MEDIUMTEXT NULL,
+        created_at DATETIME NOT NULL,
+        expires_at DATETIME NOT NULL,
+        PRIMARY KEY (user_id, scope, idempotency_key),
+        INDEX idx_idempotency_keys_expires (expires_at)''')
@@ -0,0 +1,15 @@
+"""Inventory reservations: stock held for pending orders until they are paid, fulfilled or cancelled"""
+
+
+def upgrade(m):
+    m.create_table('inventory_reservations', '''
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        order_id INT NOT NULL,
+        product_id INT NOT NULL,
+        quantity INT NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'held',
+        expires_at DATETIME NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_inventory_reservations_order (order_id, status),
+        INDEX idx_inventory_reservations_expiry (status, expires_at)''')
@@ -0,0 +1,11 @@
+"""Platform settings: commission rates (default, per category, per producer) and the payout admin account"""
+
+
+def upgrade(m):
+    m.create_table('platform_settings', '''
+        setting_key VARCHAR(150) NOT NULL PRIMARY KEY,
+        value VARCHAR(255) NOT NULL,
+        updated_by INT NULL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP''')
+    m.execute('''INSERT IGNORE INTO platform_settings (setting_key, value) VALUES
+                 ('commission_percentage', '10.00'), ('_version', '1')''')
@@ -0,0 +1,40 @@
+"""Per-participant conversation summaries (last message, unread counter) backing the inbox.
+
+One row per inquiry for the buyer and one for the producer, backfilled in
+inquiry id ranges from the existing messages.
+"""
+
+
+def upgrade(m):
+    m.create_table('conversation_summaries', '''
+        user_id INT NOT NULL,
+        inquiry_id INT NOT NULL,
+        other_user_id INT NULL,
+        role VARCHAR(10) NOT NULL,
+        last_message_id INT NULL,
+        last_message VARCHAR(500) NULL,
+        last_message_at DATETIME NULL,
+        last_sender_id INT NULL,
+        last_activity_at DATETIME NOT NULL,
+        unread_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, inquiry_id),
+        INDEX idx_conversation_summaries_inbox (user_id, last_activity_at, inquiry_id),
+        INDEX idx_conversation_summaries_inquiry (inquiry_id)''')
+
+    # Fill inquiries.producer_id for product inquiries so both participants are known
+    m.backfill('inquiries_producer_id', 'inquiries', '''
+        UPDATE inquiries i JOIN products p ON i.product_id = p.id
+        SET i.producer_id = p.producer_id
+        WHERE i.id >= %s AND i.id < %s AND i.producer_id IS NULL''')
+
+    for role, user_column, other_column in (('buyer', 'i.buyer_id', 'i.producer_id'),
+                                            ('producer', 'i.producer_id', 'i.buyer_id')):
+        m.backfill(f'conversation_summaries_{role}', 'inquiries', f'''
+            INSERT IGNORE INTO conversation_summaries (user_id, inquiry_id, other_user_id, role, last_message_id, last_message,
+                                                       last_message_at, last_sender_id, last_activity_at, unread_count)
+            SELECT {user_column}, i.id, {other_column}, '{role}', lm.id, LEFT(lm.message, 500), lm.created_at, lm.sender_id,
+                   COALESCE(lm.created_at, i.created_at, NOW()),
+                   (SELECT COUNT(*) FROM messages m WHERE m.inquiry_id = i.id AND m.sender_id != {user_column} AND m.is_read = FALSE)
+            FROM inquiries i
+            LEFT JOIN messages lm ON lm.id = (SELECT MAX(m.id) FROM messages m WHERE m.inquiry_id = i.id)
+            WHERE i.id >= %s AND i.id < %s AND {user_column} IS NOT NULL''')
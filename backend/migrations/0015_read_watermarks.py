@@ -0,0 +1,16 @@
+"""Per-participant read watermarks (conversation_summaries.last_read_message_id) replacing messages.is_read.
+
+Each participant's watermark starts at the newest message from someone else
+that was already marked read. messages.is_read is no longer written.
+"""
+
+
+def upgrade(m):
+    m.add_column('conversation_summaries', 'last_read_message_id', 'INT NOT NULL DEFAULT 0 AFTER unread_count')
+    m.add_index('messages', 'idx_messages_inquiry_id', 'inquiry_id, id')
+    m.backfill('conversation_read_watermarks', 'inquiries', '''
+        UPDATE conversation_summaries s
+        SET s.last_read_message_id = COALESCE((SELECT MAX(m.id) FROM messages m
+                                               WHERE m.inquiry_id = s.inquiry_id AND m.sender_id != s.user_id
+                                               AND m.is_read = TRUE), 0)
+        WHERE s.inquiry_id >= %s AND s.inquiry_id < %s''')
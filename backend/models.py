@@ -7,4 +7,63 @@ import bcrypt
 # def get_user_by_id(user_id, conn):
 #     cursor = conn.cursor(dictionary=True)
 #     cursor.execute('SELECT * FROM users WHERE id = %s', (user_id,))
-#     return cursor.fetchone() 
\ No newline at end of file
+#     return cursor.fetchone()
+
+# Max ids per IN (...) list; a page larger than this costs one extra query per chunk
+PRODUCT_BATCH_SIZE = 1000
+
+# Related product data that can be attached in bulk: name -> (query, row -> value)
+PRODUCT_RELATIONS = {
+    'images': (
+        'SELECT product_id, image_url FROM product_images WHERE product_id IN ({ids}) ORDER BY product_id, id',
+        lambda row: row['image_url'],
+    ),
+    'tags': (
+        '''SELECT pt.product_id, t.name FROM product_tags pt
+           JOIN tags t ON pt.tag_id = t.id
+           WHERE pt.product_id IN ({ids}) ORDER BY pt.product_id, t.name''',
+        lambda row: row['name'],
+    ),
+    'certifications': (
+        '''SELECT pc.product_id, c.name FROM product_certifications pc
+           JOIN certifications c ON pc.certification_id = c.id
+           WHERE pc.product_id IN ({ids}) ORDER BY pc.product_id, c.name''',
+        lambda row: row['name'],
+    ),
+    'shipping_options': (
+        '''SELECT pso.product_id, so.name FROM product_shipping_options pso
+           JOIN shipping_options so ON pso.shipping_option_id = so.id
+           WHERE pso.product_id IN ({ids}) ORDER BY pso.product_id, so.name''',
+        lambda row: row['name'],
+    ),
+    # products.specifications is a free-text column, so the key/value rows get their own key
+    'product_specifications': (
+        'SELECT product_id, spec_key, spec_value FROM product_specifications WHERE product_id IN ({ids}) ORDER BY product_id, id',
+        lambda row: {'key': row['spec_key'], 'value': row['spec_value']},
+    ),
+}
+
+
+def attach_product_details(cursor, products, include=('images',)):
+    """Attach related rows to a page of products in one query per relation.
+
+    `cursor` must be a dictionary cursor. Returns the products as plain dicts,
+    each with a list under every key in `include` (see PRODUCT_RELATIONS).
+    """
+    products = [dict(product) for product in products]
+    if not products:
+        return products
+    by_id = {}
+    for product in products:
+        for relation in include:
+            product[relation] = []
+        by_id[product['id']] = product
+    ids = list(by_id)
+    for relation in include:
+        query, value = PRODUCT_RELATIONS[relation]
+        for start in range(0, len(ids), PRODUCT_BATCH_SIZE):
+            chunk = ids[start:start + PRODUCT_BATCH_SIZE]
+            cursor.execute(query.format(ids=', '.join(['%s'] * len(chunk))), tuple(chunk))
+            for row in cursor.fetchall():
+                by_id[row['product_id']][relation].append(value(row))
+    return products
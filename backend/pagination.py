@@ -0,0 +1,102 @@
+import base64
+import json
+import os
+from datetime import datetime
+from flask import request, jsonify
+
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '500'))
+
+
+class InvalidCursor(ValueError):
+    """Raised for a malformed or tampered pagination cursor"""
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque cursor for the (created_at, id) position of the last row on a page"""
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+
+
+def encode_offset_cursor(offset):
+    """Opaque cursor for ranked results, which have no stable (created_at, id) position"""
+    raw = json.dumps({'offset': offset}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_offset_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        offset = int(json.loads(raw)['offset'])
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+    if offset < 0:
+        raise InvalidCursor('Invalid cursor')
+    return offset
+
+
+def get_limit():
+    """Read ?limit= from the request, clamped to MAX_PAGE_SIZE"""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidCursor('Invalid limit')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def get_page_args():
+    """Read ?limit= and ?cursor= from the request. Returns (limit, position or None).
+
+    Paging is opt-in for list endpoints: without either parameter the limit is
+    None and the whole list is returned, as it was before cursors existed.
+    """
+    cursor = request.args.get('cursor')
+    if cursor is None and 'limit' not in request.args:
+        return None, None
+    return get_limit(), decode_cursor(cursor) if cursor else None
+
+
+def keyset_condition(created_col, id_col, position):
+    """SQL fragment (and params) selecting rows after `position` in (created_at DESC, id DESC) order"""
+    if position is None:
+        return '', []
+    created_at, row_id = position
+    return (f' AND ({created_col} < %s OR ({created_col} = %s AND {id_col} < %s))',
+            [created_at, created_at, row_id])
+
+
+def keyset_order(created_col, id_col, limit):
+    """ORDER BY / LIMIT clause matching keyset_condition; fetches one extra row to detect a next page"""
+    order = f' ORDER BY {created_col} DESC, {id_col} DESC'
+    if limit is None:
+        return order
+    return order + f' LIMIT {int(limit) + 1}'
+
+
+def split_page(rows, limit, created_key='created_at', id_key='id'):
+    """Trim the look-ahead row and return (rows, next_cursor)"""
+    rows = list(rows)
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[created_key], last[id_key])
+
+
+def page_response(rows, next_cursor):
+    """JSON response with the next page cursor in the X-Next-Cursor header"""
+    response = jsonify(rows)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
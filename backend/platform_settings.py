@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# Seconds between checks of the settings version written by other processes
+SETTINGS_CHECK_INTERVAL = float(os.getenv('SETTINGS_CHECK_INTERVAL', '30'))
+
+VERSION_KEY = '_version'
+COMMISSION_KEY = 'commission_percentage'
+CATEGORY_COMMISSION_PREFIX = 'commission_percentage:category:'
+PRODUCER_COMMISSION_PREFIX = 'commission_percentage:producer:'
+PAYOUT_ADMIN_KEY = 'payout_admin_id'
+
+DEFAULT_COMMISSION_PERCENTAGE = Decimal('10.00')
+
+
+class SettingsError(Exception):
+    """Raised for unknown setting keys or invalid values"""
+
+
+def _percentage(value):
+    try:
+        percentage = Decimal(str(value)).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise SettingsError(f'Invalid percentage: {value}')
+    if not 0 <= percentage <= 100:
+        raise SettingsError('Commission percentage must be between 0 and 100')
+    return percentage
+
+
+def validate(conn, key, value):
+    """Normalised string value for `key`, or raise SettingsError"""
+    if key == COMMISSION_KEY or key.startswith(CATEGORY_COMMISSION_PREFIX):
+        return str(_percentage(value))
+    if key.startswith(PRODUCER_COMMISSION_PREFIX):
+        if not key[len(PRODUCER_COMMISSION_PREFIX):].isdigit():
+            raise SettingsError(f'Invalid producer id in {key}')
+        return str(_percentage(value))
+    if key == PAYOUT_ADMIN_KEY:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM users WHERE id = %s AND user_type = 'admin' AND is_active = TRUE", (value,))
+        row = cursor.fetchone()
+        cursor.close()
+        if not row:
+            raise SettingsError('Payout account must be an active admin user')
+        return str(row[0])
+    raise SettingsError(f'Unknown setting: {key}')
+
+
+class PlatformSettings:
+    """Process-wide copy of platform_settings for the order hot path.
+
+    Reads are served from memory. Every write bumps the '_version' row in the
+    same transaction; other processes notice it at most SETTINGS_CHECK_INTERVAL
+    seconds later and reload the whole (small) table, while the writing
+    process reloads immediately. Without a configured payout account the
+    first active admin is used; that fallback is looked up again on every
+    version check and is never cached while no admin exists.
+    """
+
+    def __init__(self, check_interval=SETTINGS_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._values = {}
+        self._version = None
+        self._checked_at = None
+        self._fallback_admin_id = None
+
+    def _current_version(self, conn):
+        cursor = conn.cursor()
+        cursor.execute('SELECT value FROM platform_settings WHERE setting_key = %s', (VERSION_KEY,))
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] if row else None
+
+    def _load(self, conn):
+        cursor = conn.cursor()
+        cursor.execute('SELECT setting_key, value FROM platform_settings')
+        values = dict(cursor.fetchall())
+        cursor.close()
+        return values
+
+    def _fallback_admin(self, conn):
+        """First active admin, used as the payout account when none is configured"""
+        with self._lock:
+            if self._fallback_admin_id is not None:
+                return self._fallback_admin_id
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM users WHERE user_type = 'admin' AND is_active = TRUE ORDER BY id LIMIT 1")
+        row = cursor.fetchone()
+        cursor.close()
+        if row is None:
+            return None
+        with self._lock:
+            self._fallback_admin_id = row[0]
+        return row[0]
+
+    def _ensure_current(self, conn):
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return self._values
+        version = self._current_version(conn)
+        with self._lock:
+            # Admins are activated and deactivated outside the settings table: resolve the fallback again
+            self._fallback_admin_id = None
+            if self._version is not None and version == self._version:
+                self._checked_at = now
+                return self._values
+        values = self._load(conn)
+        with self._lock:
+            self._values, self._version, self._checked_at = values, values.get(VERSION_KEY), now
+            return values
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._checked_at = None
+            self._fallback_admin_id = None
+
+    def all(self, conn):
+        values = {key: value for key, value in self._ensure_current(conn).items() if key != VERSION_KEY}
+        if PAYOUT_ADMIN_KEY not in values:
+            fallback = self._fallback_admin(conn)
+            if fallback is not None:
+                values[PAYOUT_ADMIN_KEY] = str(fallback)
+        return values
+
+    def commission_percentage(self, conn, producer_id=None, category=None):
+        """Commission rate for an order: producer override, then category override, then the platform default"""
+        values = self._ensure_current(conn)
+        for key in (f'{PRODUCER_COMMISSION_PREFIX}{producer_id}' if producer_id is not None else None,
+                    f'{CATEGORY_COMMISSION_PREFIX}{category}' if category else None,
+                    COMMISSION_KEY):
+            if key and key in values:
+                return Decimal(values[key])
+        return DEFAULT_COMMISSION_PERCENTAGE
+
+    def payout_admin_id(self, conn):
+        value = self._ensure_current(conn).get(PAYOUT_ADMIN_KEY)
+        return int(value) if value else self._fallback_admin(conn)
+
+    def update(self, conn, values, updated_by=None):
+        """Set {key: value} (None removes a key) and bump the version, in one transaction"""
+        now = datetime.utcnow()
+        cursor = conn.cursor()
+        try:
+            upserts, removals = [], []
+            for key, value in values.items():
+                if value is None:
+                    if key == VERSION_KEY:
+                        raise SettingsError(f'Unknown setting: {key}')
+                    removals.append((key,))
+                else:
+                    upserts.append((key, validate(conn, key, value), updated_by, now))
+            if upserts:
+                cursor.executemany('''INSERT INTO platform_settings (setting_key, value, updated_by, updated_at)
+                                      VALUES (%s, %s, %s, %s)
+                                      ON DUPLICATE KEY UPDATE value = VALUES(value), updated_by = VALUES(updated_by),
+                                      updated_at = VALUES(updated_at)''', upserts)
+            if removals:
+                cursor.executemany('DELETE FROM platform_settings WHERE setting_key = %s', removals)
+            cursor.execute('''INSERT INTO platform_settings (setting_key, value, updated_by, updated_at) VALUES (%s, '1', %s, %s)
+                              ON DUPLICATE KEY UPDATE value = CAST(value AS UNSIGNED) + 1, updated_by = VALUES(updated_by),
+                              updated_at = VALUES(updated_at)''', (VERSION_KEY, updated_by, now))
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        conn.commit()
+        self.invalidate()
+
+    def stats(self):
+        with self._lock:
+            return {'version': self._version, 'settings': len(self._values),
+                    'fallback_admin_id': self._fallback_admin_id}
+
+
+platform_settings = PlatformSettings()
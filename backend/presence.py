@@ -0,0 +1,145 @@
+import json
+import os
+import socket
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # only needed for the Redis backend
+    redis = None
+
+# Same broker as the Socket.IO message queue unless set separately; empty keeps presence in-process
+PRESENCE_URL = os.getenv('PRESENCE_URL', os.getenv('SOCKETIO_MESSAGE_QUEUE', ''))
+PRESENCE_PREFIX = os.getenv('PRESENCE_PREFIX', 'tradelink:presence')
+PRESENCE_HEARTBEAT = float(os.getenv('PRESENCE_HEARTBEAT', '15'))
+# Nodes that miss heartbeats for this long are considered dead and their sessions dropped
+PRESENCE_NODE_TTL = float(os.getenv('PRESENCE_NODE_TTL', '45'))
+
+# Drop sessions and decrement their users' counters in one atomic step. A session is only
+# counted down by whoever actually deletes it, so a disconnect racing a dead-node cleanup
+# (or two nodes cleaning up the same dead node) cannot decrement a user twice; counters
+# that reach zero are removed. KEYS: sessions hash, users hash, node sid set. ARGV: sids.
+REMOVE_SESSIONS_SCRIPT = """
+local removed = 0
+for _, sid in ipairs(ARGV) do
+    local raw = redis.call('HGET', KEYS[1], sid)
+    if raw then
+        redis.call('HDEL', KEYS[1], sid)
+        local user_id = cjson.decode(raw)['user_id']
+        if redis.call('HINCRBY', KEYS[2], user_id, -1) <= 0 then
+            redis.call('HDEL', KEYS[2], user_id)
+        end
+        removed = removed + 1
+    end
+    redis.call('SREM', KEYS[3], sid)
+end
+return removed
+"""
+
+
+class InProcessPresence:
+    """Connected sessions of this process only (single worker deployments)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}  # sid -> user
+
+    def add(self, sid, user):
+        with self._lock:
+            self._sessions[sid] = user
+
+    def remove(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def online_users(self):
+        with self._lock:
+            users = {user['user_id']: user for user in self._sessions.values()}
+        return list(users.values())
+
+    def is_online(self, user_id):
+        with self._lock:
+            return any(user['user_id'] == user_id for user in self._sessions.values())
+
+    def heartbeat(self):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'sessions': len(self._sessions)}
+
+
+class RedisPresence:
+    """Connected sessions of every worker and node, kept in a Redis-compatible server.
+
+    Sessions live in one hash (sid -> user JSON) plus a per-user session
+    counter, so "is this user online anywhere" is a single HGET. Each node
+    also records its own sids and a heartbeat timestamp; the heartbeat drops
+    the sessions of nodes that stopped refreshing (crashed workers never run
+    their disconnect handlers).
+    """
+
+    def __init__(self, url, prefix=PRESENCE_PREFIX, node_ttl=PRESENCE_NODE_TTL):
+        if redis is None:
+            raise RuntimeError('The redis package is required for Redis presence (pip install redis)')
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.node_ttl = node_ttl
+        self.node = f'{socket.gethostname()}:{os.getpid()}'
+        self._sessions_key = f'{prefix}:sessions'
+        self._users_key = f'{prefix}:users'
+        self._nodes_key = f'{prefix}:nodes'
+        self._remove_script = self.client.register_script(REMOVE_SESSIONS_SCRIPT)
+
+    def _node_sids_key(self, node):
+        return f'{self.prefix}:node:{node}'
+
+    def add(self, sid, user):
+        pipe = self.client.pipeline()
+        pipe.hset(self._sessions_key, sid, json.dumps(dict(user, node=self.node)))
+        pipe.hincrby(self._users_key, user['user_id'], 1)
+        pipe.sadd(self._node_sids_key(self.node), sid)
+        pipe.zadd(self._nodes_key, {self.node: time.time()})
+        pipe.execute()
+
+    def _remove_sessions(self, sids, node):
+        return self._remove_script(keys=[self._sessions_key, self._users_key, self._node_sids_key(node)], args=sids)
+
+    def remove(self, sid):
+        self._remove_sessions([sid], self.node)
+
+    def online_users(self):
+        users = {}
+        for raw in self.client.hvals(self._sessions_key):
+            user = json.loads(raw)
+            user.pop('node', None)
+            users[user['user_id']] = user
+        return list(users.values())
+
+    def is_online(self, user_id):
+        return int(self.client.hget(self._users_key, user_id) or 0) > 0
+
+    def heartbeat(self):
+        """Refresh this node's heartbeat and drop the sessions of nodes that stopped refreshing"""
+        now = time.time()
+        self.client.zadd(self._nodes_key, {self.node: now})
+        for node in self.client.zrangebyscore(self._nodes_key, 0, now - self.node_ttl):
+            sids = list(self.client.smembers(self._node_sids_key(node)))
+            if sids:
+                self._remove_sessions(sids, node)
+            self.client.zrem(self._nodes_key, node)
+            self.client.delete(self._node_sids_key(node))
+
+    def stats(self):
+        return {'backend': 'redis', 'node': self.node, 'sessions': self.client.hlen(self._sessions_key),
+                'users': self.client.hlen(self._users_key), 'nodes': self.client.zcard(self._nodes_key)}
+
+
+def create_presence(url=PRESENCE_URL):
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisPresence(url)
+    return InProcessPresence()
+
+
+presence = create_presence()
@@ -0,0 +1,156 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response, g
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '2000'))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# Response headers worth replaying from the cache
+CACHED_HEADERS = ('Content-Type', 'X-Next-Cursor', 'X-Total-Count')
+
+
+class ResponseCache:
+    """LRU cache of rendered responses with per-entry TTLs and tag-based invalidation.
+
+    Bounded both by entry count and by total body size. Each entry carries a set
+    of tags (e.g. "catalog", "product:12"); invalidate() drops every entry
+    tagged with any of the given tags.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> entry dict
+        self._tags = {}  # tag -> set of keys
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped on every invalidation so renders that raced a write are not stored
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['expires_at'] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, body, etag, headers, ttl, tags, generation=None):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {
+                'body': body,
+                'etag': etag,
+                'headers': headers,
+                'tags': set(tags),
+                'expires_at': time.monotonic() + ttl,
+            }
+            self._bytes += len(body)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry['body'])
+        for tag in entry['tags']:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_entries': self.max_entries,
+                    'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses,
+                    'invalidations': self.invalidations}
+
+
+response_cache = ResponseCache()
+
+
+def invalidate(*tags):
+    response_cache.invalidate(*tags)
+
+
+def add_cache_tags(*tags):
+    """Tag the response being rendered (no-op when it isn't cached)"""
+    g.setdefault('cache_tags', []).extend(tags)
+
+
+def _cache_key():
+    args = sorted(request.args.items(multi=True))
+    return request.path + '?' + '&'.join(f'{k}={v}' for k, v in args)
+
+
+def _conditional(response, etag):
+    """Attach a strong ETag and turn the response into a 304 if the client already has it"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+def cached_response(ttl=60, tags=()):
+    """Cache a GET view's rendered response.
+
+    `tags` may be a list or a callable taking the view kwargs; a view can add
+    tags discovered while rendering (e.g. a producer id) via g.cache_tags.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not RESPONSE_CACHE_ENABLED or request.method != 'GET':
+                return f(*args, **kwargs)
+            key = _cache_key()
+            entry = response_cache.get(key)
+            if entry is not None:
+                response = make_response(entry['body'])
+                response.headers.update(entry['headers'])
+                return _conditional(response, entry['etag'])
+
+            generation = response_cache.generation
+            g.cache_tags = []
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            etag = hashlib.sha256(body).hexdigest()
+            entry_tags = list(tags(**kwargs) if callable(tags) else tags) + g.cache_tags
+            headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+            response_cache.set(key, body, etag, headers, ttl, entry_tags, generation)
+            return _conditional(response, etag)
+        return decorated
+    return decorator
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Pre-aggregated daily / monthly sales and commission rollups for the dashboards.
+
+sales_rollups and commission_rollups hold one row per (grain, bucket, producer,
+currency, status[, payment_status]). They are kept up to date incrementally by
+the order and commission write paths (see track_orders / track_commissions) and
+can be rebuilt from the base tables at any time:
+
+    python rollups.py rebuild                  # everything
+    python rollups.py rebuild --since 2025-01-01
+"""
+
+import argparse
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+GRAINS = ('day', 'month')
+
+ORDER_SNAPSHOT = '''SELECT o.id, o.created_at, p.producer_id, COALESCE(o.currency, '') as currency,
+                    COALESCE(o.status, '') as status, COALESCE(o.payment_status, '') as payment_status,
+                    o.total_amount, o.commission_amount, o.producer_amount
+                    FROM orders o JOIN products p ON o.product_id = p.id'''
+
+COMMISSION_SNAPSHOT = '''SELECT c.id, c.created_at, c.producer_id, COALESCE(o.currency, '') as currency,
+                         COALESCE(c.status, '') as status, c.order_amount, c.commission_amount, c.producer_amount
+                         FROM commissions c JOIN orders o ON c.order_id = o.id'''
+
+SALES_UPSERT = '''INSERT INTO sales_rollups (grain, bucket, producer_id, currency, status, payment_status,
+                  order_count, total_amount, commission_amount, producer_amount)
+                  VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                  ON DUPLICATE KEY UPDATE order_count = order_count + VALUES(order_count),
+                  total_amount = total_amount + VALUES(total_amount),
+                  commission_amount = commission_amount + VALUES(commission_amount),
+                  producer_amount = producer_amount + VALUES(producer_amount)'''
+
+COMMISSION_UPSERT = '''INSERT INTO commission_rollups (grain, bucket, producer_id, currency, status,
+                       commission_count, order_amount, commission_amount, producer_amount)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                       ON DUPLICATE KEY UPDATE commission_count = commission_count + VALUES(commission_count),
+                       order_amount = order_amount + VALUES(order_amount),
+                       commission_amount = commission_amount + VALUES(commission_amount),
+                       producer_amount = producer_amount + VALUES(producer_amount)'''
+
+
+def bucket_for(grain, created_at):
+    day = created_at.date() if isinstance(created_at, datetime) else created_at
+    return day if grain == 'day' else day.replace(day=1)
+
+
+def _snapshot(conn, query, id_column, ids, lock=True):
+    """Current rollup-relevant values for `ids`; by default locks the rows until the transaction ends"""
+    ids = [int(i) for i in ids if i is not None]
+    if not ids:
+        return []
+    cursor = conn.cursor(dictionary=True)
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"{query} WHERE {id_column} IN ({placeholders}){' FOR UPDATE' if lock else ''}", tuple(ids))
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def snapshot_orders(conn, order_ids, lock=True):
+    return _snapshot(conn, ORDER_SNAPSHOT, 'o.id', order_ids, lock)
+
+
+def snapshot_commissions(conn, commission_ids, lock=True):
+    return _snapshot(conn, COMMISSION_SNAPSHOT, 'c.id', commission_ids, lock)
+
+
+def _deltas(before, after, key_fields, amount_fields):
+    """Sum -before / +after per (grain, bucket, *key_fields); drops keys that net to zero"""
+    deltas = {}
+    for sign, rows in ((-1, before), (1, after)):
+        for row in rows:
+            if row['created_at'] is None:
+                continue
+            for grain in GRAINS:
+                key = (grain, bucket_for(grain, row['created_at'])) + tuple(row[f] for f in key_fields)
+                totals = deltas.setdefault(key, [0] + [Decimal('0')] * len(amount_fields))
+                totals[0] += sign
+                for i, field in enumerate(amount_fields, start=1):
+                    totals[i] += sign * Decimal(row[field] or 0)
+    return [key + tuple(totals) for key, totals in deltas.items() if any(totals)]
+
+
+def apply_order_changes(conn, before, after):
+    """Fold the difference between two snapshot_orders() results into sales_rollups"""
+    rows = _deltas(before, after, ('producer_id', 'currency', 'status', 'payment_status'),
+                   ('total_amount', 'commission_amount', 'producer_amount'))
+    if rows:
+        cursor = conn.cursor()
+        cursor.executemany(SALES_UPSERT, rows)
+        cursor.close()
+
+
+def apply_commission_changes(conn, before, after):
+    """Fold the difference between two snapshot_commissions() results into commission_rollups"""
+    rows = _deltas(before, after, ('producer_id', 'currency', 'status'),
+                   ('order_amount', 'commission_amount', 'producer_amount'))
+    if rows:
+        cursor = conn.cursor()
+        cursor.executemany(COMMISSION_UPSERT, rows)
+        cursor.close()
+
+
+@contextmanager
+def track_orders(conn, order_ids):
+    """Update sales_rollups for whatever the wrapped statements do to `order_ids`.
+
+    Must run inside the same transaction as the writes; the caller commits.
+    """
+    before = snapshot_orders(conn, order_ids)
+    yield
+    apply_order_changes(conn, before, snapshot_orders(conn, order_ids))
+
+
+@contextmanager
+def track_commissions(conn, commission_ids):
+    before = snapshot_commissions(conn, commission_ids)
+    yield
+    apply_commission_changes(conn, before, snapshot_commissions(conn, commission_ids))
+
+
+# Rows inserted by the current transaction are invisible to others, so no locking is needed
+def orders_created(conn, order_ids):
+    apply_order_changes(conn, [], snapshot_orders(conn, order_ids, lock=False))
+
+
+def commissions_created(conn, commission_ids):
+    apply_commission_changes(conn, [], snapshot_commissions(conn, commission_ids, lock=False))
+
+
+# --- rebuild / backfill ---
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def rebuild(conn, since=None):
+    """Recompute rollups from the base tables (from `since` onwards if given) in one transaction"""
+    cursor = conn.cursor()
+    day_filter, day_params = ('', ())
+    month_filter, month_params = ('', ())
+    if since is not None:
+        day_filter, day_params = ' AND bucket >= %s', (since,)
+        month_filter, month_params = ' AND bucket >= %s', (_month_start(since),)
+
+    cursor.execute("DELETE FROM sales_rollups WHERE grain = 'day'" + day_filter, day_params)
+    cursor.execute(f'''INSERT INTO sales_rollups (grain, bucket, producer_id, currency, status, payment_status,
+                       order_count, total_amount, commission_amount, producer_amount)
+                       SELECT 'day', DATE(o.created_at), p.producer_id, COALESCE(o.currency, ''), COALESCE(o.status, ''),
+                       COALESCE(o.payment_status, ''), COUNT(*), SUM(o.total_amount),
+                       COALESCE(SUM(o.commission_amount), 0), COALESCE(SUM(o.producer_amount), 0)
+                       FROM orders o JOIN products p ON o.product_id = p.id
+                       WHERE o.created_at IS NOT NULL{' AND o.created_at >= %s' if since else ''}
+                       GROUP BY 2, 3, 4, 5, 6''', day_params)
+    cursor.execute("DELETE FROM sales_rollups WHERE grain = 'month'" + month_filter, month_params)
+    cursor.execute(f'''INSERT INTO sales_rollups (grain, bucket, producer_id, currency, status, payment_status,
+                       order_count, total_amount, commission_amount, producer_amount)
+                       SELECT 'month', DATE_SUB(bucket, INTERVAL DAYOFMONTH(bucket) - 1 DAY), producer_id, currency, status,
+                       payment_status, SUM(order_count), SUM(total_amount), SUM(commission_amount), SUM(producer_amount)
+                       FROM sales_rollups WHERE grain = 'day'{month_filter}
+                       GROUP BY 2, 3, 4, 5, 6''', month_params)
+
+    cursor.execute("DELETE FROM commission_rollups WHERE grain = 'day'" + day_filter, day_params)
+    cursor.execute(f'''INSERT INTO commission_rollups (grain, bucket, producer_id, currency, status,
+                       commission_count, order_amount, commission_amount, producer_amount)
+                       SELECT 'day', DATE(c.created_at), c.producer_id, COALESCE(o.currency, ''), COALESCE(c.status, ''),
+                       COUNT(*), SUM(c.order_amount), SUM(c.commission_amount), SUM(c.producer_amount)
+                       FROM commissions c JOIN orders o ON c.order_id = o.id
+                       WHERE c.created_at IS NOT NULL{' AND c.created_at >= %s' if since else ''}
+                       GROUP BY 2, 3, 4, 5''', day_params)
+    cursor.execute("DELETE FROM commission_rollups WHERE grain = 'month'" + month_filter, month_params)
+    cursor.execute(f'''INSERT INTO commission_rollups (grain, bucket, producer_id, currency, status,
+                       commission_count, order_amount, commission_amount, producer_amount)
+                       SELECT 'month', DATE_SUB(bucket, INTERVAL DAYOFMONTH(bucket) - 1 DAY), producer_id, currency, status,
+                       SUM(commission_count), SUM(order_amount), SUM(commission_amount), SUM(producer_amount)
+                       FROM commission_rollups WHERE grain = 'day'{month_filter}
+                       GROUP BY 2, 3, 4, 5''', month_params)
+    conn.commit()
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the sales and commission rollup tables')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--since', type=date.fromisoformat, help='only recompute buckets from this date (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    from db import get_db_connection
+    conn = get_db_connection()
+    try:
+        rebuild(conn, args.since)
+        print(f"Rollups rebuilt{' since ' + args.since.isoformat() if args.since else ''}")
+    except Exception as e:
+        conn.rollback()
+        print(f"Rollup rebuild failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,27 @@
-from flask import Blueprint, request, jsonify, send_from_directory
-from db import get_db_connection
+from flask import Blueprint, request, jsonify, send_from_directory, send_file, g
+from db import get_db, get_pool_stats
+from auth import auth_required, invalidate_user
+from models import attach_product_details, PRODUCT_RELATIONS
+from response_cache import response_cache, cached_response, add_cache_tags, invalidate as invalidate_cache
+from facets import facet_index, sql_facet_counts, price_bucket_range, FACET_FIELDS
+from exports import csv_export_response
+import rollups
+import settlements
+import idempotency
+import inventory
+import conversations
+from platform_settings import platform_settings, SettingsError
+from checkout import checkout_cart, CheckoutError
+from sales_analytics import sales_analytics, GRANULARITIES
+from fx import fx_rates, aggregate_by_currency, upsert_rates, parse_rate_date, FX_BASE_CURRENCY, FX_REPORTING_CURRENCY
+import analytics_export
+from pagination import InvalidCursor, get_page_args, keyset_condition, keyset_order, split_page, page_response, get_limit, encode_offset_cursor, decode_offset_cursor
 import bcrypt
 import jwt
+import math
 import os
-from datetime import datetime
-from functools import wraps
-import csv
-from io import StringIO
+import tempfile
+from datetime import datetime, date
 from websocket_service import send_notification_to_user
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
@@ -16,29 +31,62 @@ routes_bp = Blueprint('routes', __name__)
 
 # Helper: Admin-only decorator
 ADMIN_TYPE = 'admin'
-def admin_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split()[1]
-        if not token:
-            return jsonify({'error': 'Token is missing!'}), 401
-        try:
-            data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-            user_id = data['user_id']
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True, buffered=True)
-            cursor.execute('SELECT * FROM users WHERE id = %s', (user_id,))
-            user = cursor.fetchone()
-            cursor.close()
-            conn.close()
-            if not user or user['user_type'] != ADMIN_TYPE:  # type: ignore
-                return jsonify({'error': 'Admin access required'}), 403
-        except Exception as e:
-            return jsonify({'error': 'Token is invalid!'}), 401
-        return f(*args, **kwargs)
-    return decorated
+admin_required = auth_required(roles=[ADMIN_TYPE])
+
+# Columns included in the admin user export (everything except the password hash)
+USER_EXPORT_COLUMNS = ('id, username, email, user_type, first_name, last_name, company_name, phone, address, country, city, '
+                       'state, postal_code, bank_name, account_name, account_number, bank_code, swift_code, routing_number, '
+                       'created_at, updated_at, is_verified, is_active')
+
+@routes_bp.errorhandler(InvalidCursor)
+def handle_invalid_cursor(e):
+    return jsonify({'error': str(e)}), 400
+
+@routes_bp.errorhandler(idempotency.IdempotencyError)
+def handle_idempotency_error(e):
+    return jsonify({'error': str(e)}), e.status_code
+
+# Helper: drop cached catalog pages showing the old stock of these products; call after commit
+def stock_changed(product_ids):
+    if product_ids:
+        invalidate_cache('catalog', *(f'product:{product_id}' for product_id in sorted(set(product_ids))))
+
+# Helper: relations to attach to product listings (?include=tags,certifications,...)
+def get_product_includes():
+    requested = [name.strip() for name in request.args.get('include', '').split(',') if name.strip()]
+    return ['images'] + [name for name in requested if name in PRODUCT_RELATIONS and name != 'images']
+
+# Helper: catalog filters shared by the product listing and search endpoints
+PRODUCT_FILTERS = {
+    'category': 'p.category = %s',
+    'origin': 'p.origin = %s',
+    'currency': 'p.currency = %s',
+    'producer_id': 'p.producer_id = %s',
+    'producer_country': 'u.country = %s',
+    'min_price': 'p.price >= %s',
+    'max_price': 'p.price <= %s',
+}
+
+def get_product_filters():
+    clauses = ''
+    params = []
+    for name, condition in PRODUCT_FILTERS.items():
+        value = request.args.get(name)
+        if value:
+            clauses += ' AND ' + condition
+            params.append(value)
+    price_range = price_bucket_range(request.args.get('price_range'))
+    if price_range:
+        clauses += ' AND p.price >= %s'
+        params.append(price_range[0])
+        if price_range[1] is not None:
+            clauses += ' AND p.price < %s'
+            params.append(price_range[1])
+    return clauses, params
+
+# Helper: facet filters from the query string ({facet: value})
+def get_facet_filters():
+    return {facet: request.args[facet] for facet in FACET_FIELDS if request.args.get(facet)}
 
 # Admin: Get all users with filters and CSV export
 @routes_bp.route('/admin/users', methods=['GET'])
@@ -48,9 +96,7 @@ def admin_get_users():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     export = request.args.get('export') == 'csv'
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True, buffered=True)
-    query = 'SELECT * FROM users WHERE 1=1'
+    query = f'SELECT {USER_EXPORT_COLUMNS if export else "*"} FROM users WHERE 1=1'
     params = []
     if user_type:
         query += ' AND user_type = %s'
@@ -61,18 +107,19 @@ def admin_get_users():
     if end_date:
         query += ' AND created_at <= %s'
         params.append(end_date)
+    if export:
+        return csv_export_response(query + ' ORDER BY id', params, 'users.csv')
+    limit, position = get_page_args()
+    clause, clause_params = keyset_condition('created_at', 'id', position)
+    query += clause + keyset_order('created_at', 'id', limit)
+    params.extend(clause_params)
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True, buffered=True)
     cursor.execute(query, tuple(params))
     users = cursor.fetchall()
     cursor.close()
-    conn.close()
-    if export:
-        si = StringIO()
-        writer = csv.DictWriter(si, fieldnames=users[0].keys())  # type: ignore
-        writer.writeheader()
-        writer.writerows(users)  # type: ignore
-        output = si.getvalue()
-        return output, 200, {'Content-Type': 'text/csv', 'Content-Disposition': 'attachment; filename=users.csv'}
-    return jsonify(users)
+    users, next_cursor = split_page(users, limit)
+    return page_response(users, next_cursor)
 
 # User Registration
 @routes_bp.route('/auth/register', methods=['POST'])
@@ -106,12 +153,11 @@ def register():
     if user_type == 'producer' and not all([bank_name, account_name, account_number]):
         return jsonify({'error': 'Bank details are required for producers'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('SELECT id FROM users WHERE username = %s OR email = %s', (username, email))
     if cursor.fetchone():
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Username or email already exists'}), 409
 
     if not password:
@@ -132,11 +178,12 @@ def register():
                        (user_id, bank_name, account_name, account_number, bank_code, swift_code, routing_number, True, False, datetime.utcnow(), datetime.utcnow()))
     
     conn.commit()
+    if user_type == 'producer':
+        invalidate_cache('producers')
     # Fetch the new user
     cursor.execute('SELECT id, username, email, user_type, first_name, last_name, company_name, phone, address, country, city, postal_code, bank_name, account_name, account_number, bank_code, swift_code, routing_number FROM users WHERE id = %s', (user_id,))
     user = cursor.fetchone()
     cursor.close()
-    conn.close()
     # Emit real-time notification to producer
     notification_data = {
         "type": "user",
@@ -156,12 +203,11 @@ def login():
     password = data.get('password')
     if not all([email, password]):
         return jsonify({'error': 'Missing email or password'}), 400
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('SELECT * FROM users WHERE email = %s', (email,))
     user = cursor.fetchone()
     cursor.close()
-    conn.close()
     if not user or not user.get('password_hash'):
         return jsonify({'error': 'Invalid credentials'}), 401
     if not password:
@@ -176,58 +222,115 @@ def login():
 
 # Get All Products
 @routes_bp.route('/products', methods=['GET'])
+@cached_response(ttl=60, tags=['catalog'])
 def get_products():
-    conn = get_db_connection()
+    limit, position = get_page_args()
+    filters, params = get_product_filters()
+    clause, keyset_params = keyset_condition('p.created_at', 'p.id', position)
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('''SELECT p.*, u.username as producer_username, u.company_name as producer_company, u.first_name as producer_first_name, u.last_name as producer_last_name 
                       FROM products p 
                       JOIN users u ON p.producer_id = u.id 
-                      WHERE p.product_status = 'active' ''')
-    products = cursor.fetchall()
-    # For each product, get its images
-    for i, product in enumerate(products):
-        product = dict(product)  # type: ignore
-        cursor.execute('SELECT image_url FROM product_images WHERE product_id = %s', (product['id'],))  # type: ignore
-        images = [row['image_url'] for row in cursor.fetchall()]  # type: ignore
-        product['images'] = images  # type: ignore
-        products[i] = product  # type: ignore
+                      WHERE p.product_status = 'active' ''' + filters + clause + keyset_order('p.created_at', 'p.id', limit), (*params, *keyset_params))
+    products, next_cursor = split_page(cursor.fetchall(), limit)
+    # Attach images (and any requested relations) for the whole page at once
+    products = attach_product_details(cursor, products, get_product_includes())
     cursor.close()
-    conn.close()
-    return jsonify(products)
+    response = page_response(products, next_cursor)
+    # Total matches come from the in-memory facet index when the filters allow it
+    if not any(request.args.get(name) for name in ('producer_id', 'min_price', 'max_price')):
+        response.headers['X-Total-Count'] = str(facet_index.counts(conn, get_facet_filters())['total'])
+    return response
+
+# Get facet counts for the catalog, narrowed by any facet filters in the query string
+@routes_bp.route('/products/facets', methods=['GET'])
+@cached_response(ttl=60, tags=['catalog'])
+def get_product_facets():
+    conn = get_db()
+    filters = get_facet_filters()
+    min_price = request.args.get('min_price')
+    max_price = request.args.get('max_price')
+    if min_price or max_price:
+        # Arbitrary price ranges aren't bucketed in memory
+        result = sql_facet_counts(conn, filters, min_price or None, max_price or None)
+        result['source'] = 'sql'
+    else:
+        result = facet_index.counts(conn, filters)
+        result['source'] = 'memory'
+    return jsonify(result)
 
 # Get Products for Current Producer
 @routes_bp.route('/producer/products', methods=['GET'])
+@auth_required(roles=['producer'])
 def get_producer_products():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('SELECT * FROM products WHERE producer_id = %s ORDER BY created_at DESC', (user_id,))
     products = cursor.fetchall()
-    # For each product, get its images
-    for i, product in enumerate(products):
-        product = dict(product)  # type: ignore
-        cursor.execute('SELECT image_url FROM product_images WHERE product_id = %s', (product['id'],))  # type: ignore
-        images = [row['image_url'] for row in cursor.fetchall()]  # type: ignore
-        product['images'] = images  # type: ignore
-        products[i] = product  # type: ignore
+    # Attach images (and any requested relations) for the whole page at once
+    products = attach_product_details(cursor, products, get_product_includes())
     cursor.close()
-    conn.close()
     return jsonify(products)
 
+# Search Products (ranked full-text search over name, description, category, origin and tags)
+SEARCH_MAX_RESULTS = 1000
+
+@routes_bp.route('/products/search', methods=['GET'])
+@cached_response(ttl=30, tags=['catalog'])
+def search_products():
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'error': 'Search query is required'}), 400
+    limit = get_limit()
+    cursor_arg = request.args.get('cursor')
+    offset = decode_offset_cursor(cursor_arg) if cursor_arg else 0
+    if offset >= SEARCH_MAX_RESULTS:
+        return page_response([], None)
+    limit = min(limit, SEARCH_MAX_RESULTS - offset)
+    filters, filter_params = get_product_filters()
+
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+    # Candidates come from the products and tags FULLTEXT indexes; tag hits are weighted higher
+    cursor.execute('''SELECT p.*, u.username as producer_username, u.company_name as producer_company, u.first_name as producer_first_name, u.last_name as producer_last_name,
+                      s.relevance
+                      FROM (
+                          SELECT product_id, SUM(score) as relevance FROM (
+                              SELECT id as product_id, MATCH(name, description, category, origin) AGAINST (%s IN NATURAL LANGUAGE MODE) as score
+                              FROM products
+                              WHERE MATCH(name, description, category, origin) AGAINST (%s IN NATURAL LANGUAGE MODE)
+                              UNION ALL
+                              SELECT pt.product_id, MATCH(t.name) AGAINST (%s IN NATURAL LANGUAGE MODE) * 2 as score
+                              FROM tags t
+                              JOIN product_tags pt ON pt.tag_id = t.id
+                              WHERE MATCH(t.name) AGAINST (%s IN NATURAL LANGUAGE MODE)
+                          ) matches
+                          GROUP BY product_id
+                      ) s
+                      JOIN products p ON p.id = s.product_id
+                      JOIN users u ON p.producer_id = u.id
+                      WHERE p.product_status = 'active' ''' + filters + '''
+                      ORDER BY s.relevance DESC, p.id DESC
+                      LIMIT %s OFFSET %s''', (q, q, q, q, *filter_params, limit + 1, offset))
+    products = cursor.fetchall()
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_cursor = encode_offset_cursor(offset + limit)
+    products = attach_product_details(cursor, products, get_product_includes())
+    for product in products:
+        product['relevance'] = float(product['relevance'])
+    cursor.close()
+    return page_response(products, next_cursor)
+
 # Get Product by ID
 @routes_bp.route('/products/<int:product_id>', methods=['GET'])
+@cached_response(ttl=300, tags=lambda product_id: [f'product:{product_id}'])
 def get_product(product_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('''SELECT p.*, u.username as producer_username, u.company_name as producer_company, u.first_name as producer_first_name, u.last_name as producer_last_name 
                       FROM products p 
@@ -236,15 +339,11 @@ def get_product(product_id):
     product = cursor.fetchone()
     if not product:
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Product not found'}), 404
-    # Get all images for this product
-    product = dict(product)  # type: ignore
-    cursor.execute('SELECT image_url FROM product_images WHERE product_id = %s', (product_id,))
-    images = [row['image_url'] for row in cursor.fetchall()]
-    product['images'] = images
+    # Get all images (and any requested relations) for this product
+    product = attach_product_details(cursor, [product], get_product_includes())[0]
     cursor.close()
-    conn.close()
+    add_cache_tags(f"producer:{product['producer_id']}")
     return jsonify(product)
 
 # Create Product
@@ -273,7 +372,7 @@ def create_product():
     images = data.get('images', [])
     if not all([name, price, quantity, producer_id]):
         return jsonify({'error': 'Missing required fields'}), 400
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     # Insert product
     cursor.execute('''INSERT INTO products (name, description, price, currency, price_unit, quantity, category, main_image_url, min_order_quantity, lead_time, origin, specifications, export_compliance, packaging, shelf_life, product_status, producer_id, created_at, updated_at)
@@ -286,7 +385,8 @@ def create_product():
                        (product_id, img_url, idx == 0, datetime.utcnow()))
     conn.commit()
     cursor.close()
-    conn.close()
+    facet_index.product_changed(conn, product_id)
+    invalidate_cache('catalog', f'producer:{producer_id}')
     return jsonify({'message': 'Product created successfully'}), 201
 
 # Update Product
@@ -303,39 +403,32 @@ def update_product(product_id):
         return jsonify({'error': 'No fields to update'}), 400
     values.append(datetime.utcnow())
     values.append(product_id)
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute(f'''UPDATE products SET {', '.join(fields)}, updated_at = %s WHERE id = %s''', tuple(values))
     conn.commit()
     cursor.close()
-    conn.close()
+    facet_index.product_changed(conn, product_id)
+    invalidate_cache('catalog', f'product:{product_id}')
     return jsonify({'message': 'Product updated successfully'})
 
 # Delete Product
 @routes_bp.route('/products/<int:product_id>', methods=['DELETE'])
 def delete_product(product_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM products WHERE id = %s', (product_id,))
     conn.commit()
     cursor.close()
-    conn.close()
+    facet_index.product_deleted(product_id)
+    invalidate_cache('catalog', f'product:{product_id}')
     return jsonify({'message': 'Product deleted successfully'})
 
 # --- Orders ---
 @routes_bp.route('/orders', methods=['POST'])
+@auth_required()
 def create_order():
-    # Get user from JWT token
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data_jwt = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        buyer_id = data_jwt['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    buyer_id = g.user_id
 
     data = request.json
     product_id = data.get('product_id')
@@ -352,41 +445,48 @@ def create_order():
     payment_timestamp = data.get('payment_timestamp')
     currency = data.get('currency', 'NGN')
 
+    # Retries carrying the same Idempotency-Key get the original response
+    idempotency_key = idempotency.from_request('create_order', buyer_id, data)
+    if idempotency_key:
+        stored = idempotency_key.cached()
+        if stored:
+            return idempotency.replay_response(stored)
+
     if not all([product_id, quantity, unit_price, total_amount, shipping_address]):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
-    # Calculate commission (10% of total amount)
-    commission_percentage = 10.0
-    commission_amount = (total_amount * commission_percentage) / 100
-    producer_amount = total_amount - commission_amount
-
-    # Get producer_id from product
-    cursor.execute('SELECT producer_id FROM products WHERE id = %s', (product_id,))
+    # Get producer_id and category from product
+    cursor.execute('SELECT producer_id, category FROM products WHERE id = %s', (product_id,))
     product_result = cursor.fetchone()
     if not product_result:
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Product not found'}), 404
 
-    producer_id = product_result[0]
+    producer_id, category = product_result
+
+    # Commission rate and payout admin come from the cached platform settings
+    commission_percentage = float(platform_settings.commission_percentage(conn, producer_id, category))
+    commission_amount = (total_amount * commission_percentage) / 100
+    producer_amount = total_amount - commission_amount
 
-    # Get admin user (assuming admin has user_type = 'admin')
-    cursor.execute('SELECT id FROM users WHERE user_type = "admin" LIMIT 1')
-    admin_result = cursor.fetchone()
-    if not admin_result:
+    admin_id = platform_settings.payout_admin_id(conn)
+    if not admin_id:
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Admin user not found'}), 404
 
-    admin_id = admin_result[0]
+    if idempotency_key:
+        stored = idempotency_key.claim(conn)
+        if stored:
+            cursor.close()
+            return idempotency.replay_response(stored)
 
     # Insert order with commission amounts and currency
-    cursor.execute('''INSERT INTO orders (buyer_id, product_id, quantity, unit_price, total_amount, currency, shipping_address, shipping_method, payment_method, special_instructions, status, payment_status, payment_transaction_id, payment_timestamp, commission_amount, producer_amount, created_at, updated_at)
-                      VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
-                   (buyer_id, product_id, quantity, unit_price, total_amount, currency, shipping_address, shipping_method, payment_method, special_instructions, status, payment_status, payment_transaction_id, payment_timestamp, commission_amount, producer_amount, datetime.utcnow(), datetime.utcnow()))
+    cursor.execute('''INSERT INTO orders (buyer_id, producer_id, product_id, quantity, unit_price, total_amount, currency, shipping_address, shipping_method, payment_method, special_instructions, status, payment_status, payment_transaction_id, payment_timestamp, commission_amount, producer_amount, created_at, updated_at)
+                      VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                   (buyer_id, producer_id, product_id, quantity, unit_price, total_amount, currency, shipping_address, shipping_method, payment_method, special_instructions, status, payment_status, payment_transaction_id, payment_timestamp, commission_amount, producer_amount, datetime.utcnow(), datetime.utcnow()))
 
     order_id = cursor.lastrowid
 
@@ -394,10 +494,26 @@ def create_order():
     cursor.execute('''INSERT INTO commissions (order_id, producer_id, admin_id, order_amount, commission_amount, producer_amount, commission_percentage, status, created_at, updated_at)
                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
                    (order_id, producer_id, admin_id, total_amount, commission_amount, producer_amount, commission_percentage, 'pending', datetime.utcnow(), datetime.utcnow()))
+    commission_id = cursor.lastrowid
+
+    # Take the stock last: the product row stays locked until commit
+    try:
+        inventory.reserve(conn, [{'order_id': order_id, 'product_id': product_id, 'quantity': quantity}])
+    except inventory.OutOfStock as e:
+        conn.rollback()
+        cursor.close()
+        return jsonify({'error': str(e), 'product_id': e.product_id, 'available': e.available}), 409
 
+    rollups.orders_created(conn, [order_id])
+    rollups.commissions_created(conn, [commission_id])
+    response = {'message': 'Order created successfully', 'order_id': order_id, 'commission_amount': commission_amount, 'producer_amount': producer_amount}
+    if idempotency_key:
+        idempotency_key.save(conn, 201, response)
     conn.commit()
     cursor.close()
-    conn.close()
+    stock_changed([product_id])
+    if idempotency_key:
+        idempotency_key.remember()
     # Emit real-time notification to producer
     notification_data = {
         "type": "order",
@@ -407,43 +523,98 @@ def create_order():
         "timestamp": datetime.utcnow().isoformat()
     }
     send_notification_to_user(producer_id, notification_data)
-    return jsonify({'message': 'Order created successfully', 'order_id': order_id, 'commission_amount': commission_amount, 'producer_amount': producer_amount}), 201
+    return jsonify(response), 201
+
+# Checkout: turn the buyer's cart into orders in one transaction
+@routes_bp.route('/orders/checkout', methods=['POST'])
+@auth_required()
+def checkout_orders():
+    buyer_id = g.user_id
+    data = request.json or {}
+    if not data.get('shipping_address'):
+        return jsonify({'error': 'Missing required fields'}), 400
+    details = dict(data, payment_method=data.get('payment_method', 'bank_transfer'))
+    items = data.get('items') or []
+    cart_ids = data.get('cart_ids')
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': 'items must be a list of objects'}), 400
+    if cart_ids is not None and (not isinstance(cart_ids, list) or
+                                 not all(isinstance(i, int) and not isinstance(i, bool) for i in cart_ids)):
+        return jsonify({'error': 'cart_ids must be a list of integers'}), 400
+    # Optional [{cart_id, unit_price}] as shown to the buyer; a price change rejects the checkout
+    expected_prices = {}
+    for item in items:
+        cart_id, unit_price = item.get('cart_id'), item.get('unit_price')
+        if cart_id is None or unit_price is None:
+            continue
+        if (not isinstance(cart_id, int) or isinstance(cart_id, bool) or
+                not isinstance(unit_price, (int, float)) or isinstance(unit_price, bool) or not math.isfinite(unit_price)):
+            return jsonify({'error': 'items must have an integer cart_id and a numeric unit_price'}), 400
+        expected_prices[cart_id] = unit_price
+
+    conn = get_db()
+    try:
+        checkout_id, orders = checkout_cart(conn, buyer_id, details, expected_prices, cart_ids)
+    except CheckoutError as e:
+        return jsonify({'error': str(e), 'items': e.details}), e.status_code
+    stock_changed(order['product_id'] for order in orders)
+
+    # One notification per producer, however many of their products were in the cart
+    by_producer = {}
+    for order in orders:
+        by_producer.setdefault(order['producer_id'], []).append(order['id'])
+    timestamp = datetime.utcnow().isoformat()
+    for producer_id, order_ids in by_producer.items():
+        send_notification_to_user(producer_id, {
+            "type": "order",
+            "title": "New Order Received",
+            "message": (f"You have received a new order (Order #{order_ids[0]})" if len(order_ids) == 1
+                        else f"You have received {len(order_ids)} new orders"),
+            "order_id": order_ids[0],
+            "order_ids": order_ids,
+            "checkout_id": checkout_id,
+            "timestamp": timestamp
+        })
+
+    totals = {}
+    for order in orders:
+        totals[order['currency']] = totals.get(order['currency'], 0) + order['total_amount']
+    return jsonify({
+        'message': 'Checkout completed successfully',
+        'checkout_id': checkout_id,
+        'orders': [{'order_id': order['id'], 'product_id': order['product_id'], 'producer_id': order['producer_id'],
+                    'quantity': order['quantity'], 'unit_price': float(order['unit_price']),
+                    'total_amount': float(order['total_amount']), 'currency': order['currency'],
+                    'commission_amount': float(order['commission_amount']), 'producer_amount': float(order['producer_amount'])}
+                   for order in orders],
+        'totals': {currency: float(total) for currency, total in sorted(totals.items())}
+    }), 201
 
 @routes_bp.route('/orders', methods=['GET'])
+@auth_required()
 def get_orders():
-    # Get user from JWT token
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data_jwt = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        buyer_id = data_jwt['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    buyer_id = g.user_id
+    limit, position = get_page_args()
+    clause, params = keyset_condition('o.created_at', 'o.id', position)
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('''SELECT o.*, p.name as product_name, p.main_image_url as product_image, u.first_name, u.last_name, u.company_name as producer_company
                       FROM orders o 
                       JOIN products p ON o.product_id = p.id 
                       JOIN users u ON p.producer_id = u.id 
-                      WHERE o.buyer_id = %s 
-                      ORDER BY o.created_at DESC''', (buyer_id,))
-    orders = cursor.fetchall()
+                      WHERE o.buyer_id = %s''' + clause + keyset_order('o.created_at', 'o.id', limit), (buyer_id, *params))
+    orders, next_cursor = split_page(cursor.fetchall(), limit)
     cursor.close()
-    conn.close()
-    return jsonify(orders)
+    return page_response(orders, next_cursor)
 
 @routes_bp.route('/orders/<int:order_id>', methods=['GET'])
 def get_order(order_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('SELECT * FROM orders WHERE id = %s', (order_id,))
     order = cursor.fetchone()
     cursor.close()
-    conn.close()
     if not order:
         return jsonify({'error': 'Order not found'}), 404
     return jsonify(order)
@@ -459,24 +630,40 @@ def update_order(order_id):
             values.append(data[key])
     if not fields:
         return jsonify({'error': 'No fields to update'}), 400
+    if 'quantity' in data and (not isinstance(data['quantity'], int) or isinstance(data['quantity'], bool)
+                               or data['quantity'] < 1):
+        return jsonify({'error': 'quantity must be a positive integer'}), 400
     values.append(datetime.utcnow())
     values.append(order_id)
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute(f'''UPDATE orders SET {', '.join(fields)}, updated_at = %s WHERE id = %s''', tuple(values))
+    with rollups.track_orders(conn, [order_id]):
+        cursor.execute(f'''UPDATE orders SET {', '.join(fields)}, updated_at = %s WHERE id = %s''', tuple(values))
+    # Quantity changes and un-cancelling take stock again; cancelling returns it
+    try:
+        changed = inventory.order_updated(conn, order_id)
+    except inventory.OutOfStock as e:
+        conn.rollback()
+        cursor.close()
+        return jsonify({'error': str(e), 'product_id': e.product_id, 'available': e.available}), 409
     conn.commit()
     cursor.close()
-    conn.close()
+    stock_changed(changed)
     return jsonify({'message': 'Order updated successfully'})
 
 @routes_bp.route('/orders/<int:order_id>', methods=['DELETE'])
 def delete_order(order_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM orders WHERE id = %s', (order_id,))
+    cursor.execute('SELECT product_id FROM orders WHERE id = %s', (order_id,))
+    order = cursor.fetchone()
+    released = inventory.release(conn, [order_id])
+    with rollups.track_orders(conn, [order_id]):
+        cursor.execute('DELETE FROM orders WHERE id = %s', (order_id,))
     conn.commit()
     cursor.close()
-    conn.close()
+    if released and order:
+        stock_changed([order[0]])
     return jsonify({'message': 'Order deleted successfully'})
 
 # --- Cart ---
@@ -488,33 +675,30 @@ def add_to_cart():
     quantity = data.get('quantity', 1)
     if not all([buyer_id, product_id]):
         return jsonify({'error': 'Missing required fields'}), 400
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''INSERT INTO cart (buyer_id, product_id, quantity, created_at) VALUES (%s, %s, %s, %s)''',
                    (buyer_id, product_id, quantity, datetime.utcnow()))
     conn.commit()
     cursor.close()
-    conn.close()
     return jsonify({'message': 'Added to cart'}), 201
 
 @routes_bp.route('/cart/<int:buyer_id>', methods=['GET'])
 def get_cart(buyer_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('SELECT * FROM cart WHERE buyer_id = %s', (buyer_id,))
     items = cursor.fetchall()
     cursor.close()
-    conn.close()
     return jsonify(items)
 
 @routes_bp.route('/cart/<int:item_id>', methods=['DELETE'])
 def remove_from_cart(item_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM cart WHERE id = %s', (item_id,))
     conn.commit()
     cursor.close()
-    conn.close()
     return jsonify({'message': 'Removed from cart'})
 
 # --- Wishlist ---
@@ -525,33 +709,30 @@ def add_to_wishlist():
     product_id = data.get('product_id')
     if not all([buyer_id, product_id]):
         return jsonify({'error': 'Missing required fields'}), 400
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''INSERT INTO wishlist (buyer_id, product_id, created_at) VALUES (%s, %s, %s)''',
                    (buyer_id, product_id, datetime.utcnow()))
     conn.commit()
     cursor.close()
-    conn.close()
     return jsonify({'message': 'Added to wishlist'}), 201
 
 @routes_bp.route('/wishlist/<int:buyer_id>', methods=['GET'])
 def get_wishlist(buyer_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('SELECT * FROM wishlist WHERE buyer_id = %s', (buyer_id,))
     items = cursor.fetchall()
     cursor.close()
-    conn.close()
     return jsonify(items)
 
 @routes_bp.route('/wishlist/<int:item_id>', methods=['DELETE'])
 def remove_from_wishlist(item_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM wishlist WHERE id = %s', (item_id,))
     conn.commit()
     cursor.close()
-    conn.close()
     return jsonify({'message': 'Removed from wishlist'})
 
 # --- Inquiries ---
@@ -568,7 +749,7 @@ def create_inquiry():
     if not buyer_id or not message or (not product_id and not producer_id):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # If product_id is provided, get producer_id from product
@@ -577,46 +758,44 @@ def create_inquiry():
         prod = cursor.fetchone()
         if not prod:
             cursor.close()
-            conn.close()
             return jsonify({'error': 'Product not found'}), 404
         producer_id = prod[0]
 
-    cursor.execute('''INSERT INTO inquiries (product_id, buyer_id, message, quantity_requested, status, created_at, updated_at)
-                      VALUES (%s, %s, %s, %s, %s, %s, %s)''',
-                   (product_id, buyer_id, message, quantity_requested, status, datetime.utcnow(), datetime.utcnow()))
+    now = datetime.utcnow()
+    cursor.execute('''INSERT INTO inquiries (product_id, producer_id, buyer_id, message, quantity_requested, status, created_at, updated_at)
+                      VALUES (%s, %s, %s, %s, %s, %s, %s, %s)''',
+                   (product_id, producer_id, buyer_id, message, quantity_requested, status, now, now))
+    conversations.conversation_created(conn, cursor.lastrowid, buyer_id, producer_id, now)
     conn.commit()
     cursor.close()
-    conn.close()
     return jsonify({'message': 'Inquiry created successfully'}), 201
 
 @routes_bp.route('/inquiries/<int:product_id>', methods=['GET'])
 def get_inquiries_for_product(product_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('SELECT * FROM inquiries WHERE product_id = %s', (product_id,))
     inquiries = cursor.fetchall()
     cursor.close()
-    conn.close()
     return jsonify(inquiries)
 
 @routes_bp.route('/inquiries/buyer/<int:buyer_id>', methods=['GET'])
 def get_inquiries_for_buyer(buyer_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('SELECT * FROM inquiries WHERE buyer_id = %s', (buyer_id,))
     inquiries = cursor.fetchall()
     cursor.close()
-    conn.close()
     return jsonify(inquiries)
 
 @routes_bp.route('/inquiries/<int:inquiry_id>', methods=['DELETE'])
 def delete_inquiry(inquiry_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
+    conversations.conversation_deleted(conn, inquiry_id)
     cursor.execute('DELETE FROM inquiries WHERE id = %s', (inquiry_id,))
     conn.commit()
     cursor.close()
-    conn.close()
     return jsonify({'message': 'Inquiry deleted successfully'})
 
 @routes_bp.route('/upload', methods=['POST'])
@@ -645,9 +824,13 @@ def admin_get_products():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     export = request.args.get('export') == 'csv'
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    query = '''SELECT p.*, u.username as producer_username, u.company_name as producer_company, u.email as producer_email FROM products p JOIN users u ON p.producer_id = u.id WHERE 1=1'''
+    if export:
+        # Images are folded into one column so the export stays a single streamed query
+        query = '''SELECT p.*, u.username as producer_username, u.company_name as producer_company, u.email as producer_email,
+                   (SELECT GROUP_CONCAT(pi.image_url ORDER BY pi.id SEPARATOR '|') FROM product_images pi WHERE pi.product_id = p.id) as images
+                   FROM products p JOIN users u ON p.producer_id = u.id WHERE 1=1'''
+    else:
+        query = '''SELECT p.*, u.username as producer_username, u.company_name as producer_company, u.email as producer_email FROM products p JOIN users u ON p.producer_id = u.id WHERE 1=1'''
     params = []
     if producer_id:
         query += ' AND p.producer_id = %s'
@@ -658,23 +841,15 @@ def admin_get_products():
     if end_date:
         query += ' AND p.created_at <= %s'
         params.append(end_date)
+    if export:
+        return csv_export_response(query + ' ORDER BY p.id', params, 'products.csv',
+                                   session_sql=['SET SESSION group_concat_max_len = 65535'])
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
     cursor.execute(query, tuple(params))
     products = cursor.fetchall()
-    for i, product in enumerate(products):
-        product = dict(product)  # type: ignore
-        cursor.execute('SELECT image_url FROM product_images WHERE product_id = %s', (product['id'],))  # type: ignore
-        images = [row['image_url'] for row in cursor.fetchall()]  # type: ignore
-        product['images'] = images  # type: ignore
-        products[i] = product  # type: ignore
+    products = attach_product_details(cursor, products, get_product_includes())
     cursor.close()
-    conn.close()
-    if export:
-        si = StringIO()
-        writer = csv.DictWriter(si, fieldnames=products[0].keys() if products else [])
-        writer.writeheader()
-        writer.writerows(products)
-        output = si.getvalue()
-        return output, 200, {'Content-Type': 'text/csv', 'Content-Disposition': 'attachment; filename=products.csv'}
     return jsonify(products)
 
 # Admin: Get all orders with filters and CSV export
@@ -685,8 +860,6 @@ def admin_get_orders():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     export = request.args.get('export') == 'csv'
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
     query = '''SELECT o.*, u.username as buyer_username, u.email as buyer_email, p.name as product_name FROM orders o JOIN users u ON o.buyer_id = u.id JOIN products p ON o.product_id = p.id WHERE 1=1'''
     params = []
     if buyer_id:
@@ -698,30 +871,45 @@ def admin_get_orders():
     if end_date:
         query += ' AND o.created_at <= %s'
         params.append(end_date)
+    if export:
+        return csv_export_response(query + ' ORDER BY o.id', params, 'orders.csv')
+    limit, position = get_page_args()
+    clause, clause_params = keyset_condition('o.created_at', 'o.id', position)
+    query += clause + keyset_order('o.created_at', 'o.id', limit)
+    params.extend(clause_params)
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
     cursor.execute(query, tuple(params))
     orders = cursor.fetchall()
     cursor.close()
-    conn.close()
-    if export:
-        si = StringIO()
-        writer = csv.DictWriter(si, fieldnames=orders[0].keys() if orders else [])
-        writer.writeheader()
-        writer.writerows(orders)
-        output = si.getvalue()
-        return output, 200, {'Content-Type': 'text/csv', 'Content-Disposition': 'attachment; filename=orders.csv'}
-    return jsonify(orders)
+    orders, next_cursor = split_page(orders, limit)
+    return page_response(orders, next_cursor)
 
 # Admin: Get financial summary
 @routes_bp.route('/admin/financials', methods=['GET'])
 @admin_required
 def admin_financials():
-    conn = get_db_connection()
+    reporting_currency = request.args.get('reporting_currency', FX_REPORTING_CURRENCY)
+    conn = get_db()
+    # Only currencies with FX rates (or the base currency) can be converted into
+    if reporting_currency not in fx_rates.currencies(conn):
+        return jsonify({'error': f'Unsupported reporting currency: {reporting_currency}'}), 400
     cursor = conn.cursor(dictionary=True)
-    cursor.execute('SELECT COUNT(*) as total_orders, SUM(total_amount) as total_sales, SUM(CASE WHEN payment_status = "pending" THEN total_amount ELSE 0 END) as pending_payments FROM orders')
-    summary = cursor.fetchone()
+    # Totals per day and currency, so each day is converted at its own FX rate
+    cursor.execute('''SELECT bucket, currency, SUM(order_count) as total_orders, SUM(total_amount) as total_sales,
+                      SUM(CASE WHEN payment_status = "pending" THEN total_amount ELSE 0 END) as pending_payments
+                      FROM sales_rollups WHERE grain = 'day' GROUP BY bucket, currency''')
+    report = aggregate_by_currency(conn, cursor.fetchall(), ['total_sales', 'pending_payments'], ['total_orders'],
+                                   reporting_currency)
     cursor.close()
-    conn.close()
-    return jsonify(summary)
+    return jsonify({
+        'total_orders': sum(row['total_orders'] for row in report['by_currency']),
+        'total_sales': report['totals']['total_sales'],
+        'pending_payments': report['totals']['pending_payments'],
+        'reporting_currency': reporting_currency,
+        'by_currency': report['by_currency'],
+        'unconverted_currencies': report['unconverted']
+    })
 
 # Admin: Approve or deactivate user
 @routes_bp.route('/admin/approve_user', methods=['POST'])
@@ -732,12 +920,17 @@ def admin_approve_user():
     is_active = data.get('is_active', True)
     if not user_id:
         return jsonify({'error': 'Missing user_id'}), 400
-    conn = get_db_connection()
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'user_id must be an integer'}), 400
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('UPDATE users SET is_active = %s WHERE id = %s', (is_active, user_id))
     conn.commit()
     cursor.close()
-    conn.close()
+    invalidate_user(user_id)
+    invalidate_cache('catalog', 'producers', f'producer:{user_id}')
     return jsonify({'message': 'User status updated'})
 
 # Admin: Create User
@@ -761,12 +954,11 @@ def admin_create_user():
     if not all([username, email, password, user_type, first_name, last_name]):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('SELECT id FROM users WHERE username = %s OR email = %s', (username, email))
     if cursor.fetchone():
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Username or email already exists'}), 409
 
     if not password:
@@ -778,11 +970,12 @@ def admin_create_user():
                    (username, email, password_hash, user_type, first_name, last_name, company_name, phone, address, country, city, postal_code, datetime.utcnow(), datetime.utcnow(), False, True))
     user_id = cursor.lastrowid
     conn.commit()
+    if user_type == 'producer':
+        invalidate_cache('producers')
     # Fetch the new user
     cursor.execute('SELECT id, username, email, user_type, first_name, last_name, company_name, phone, address, country, city, postal_code FROM users WHERE id = %s', (user_id,))
     user = cursor.fetchone()
     cursor.close()
-    conn.close()
     # Emit real-time notification to producer
     notification_data = {
         "type": "user",
@@ -795,29 +988,18 @@ def admin_create_user():
     return jsonify({'message': 'User created successfully', 'user': user}), 201
 
 @routes_bp.route('/categories', methods=['GET'])
+@cached_response(ttl=300, tags=['catalog'])
 def get_categories():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT DISTINCT category FROM products WHERE category IS NOT NULL AND category != ""')
-    categories = [row[0] for row in cursor.fetchall()]
-    cursor.close()
-    conn.close()
+    # Served from the in-memory facet index (categories of active products)
+    categories = facet_index.values(get_db(), 'category')
     return jsonify(categories)
 
 @routes_bp.route('/profile', methods=['GET', 'PUT'])
+@auth_required()
 def update_profile():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     if request.method == 'GET':
@@ -833,7 +1015,6 @@ def update_profile():
             user['bank_details'] = bank_details
         
         cursor.close()
-        conn.close()
         return jsonify({'success': True, 'user': user})
     
     # PUT method for updating profile
@@ -925,26 +1106,21 @@ def update_profile():
     
     cursor.execute(f"UPDATE users SET {', '.join(fields)} WHERE id = %s", tuple(values))
     conn.commit()
+    invalidate_user(user_id)
+    if country:
+        facet_index.producer_country_changed(user_id, country)
+    # Producer names and companies are embedded in catalog responses
+    invalidate_cache('catalog', 'producers', f'producer:{user_id}')
     cursor.execute('SELECT id, username, email, user_type, first_name, last_name, phone, address, company_name, bank_name, account_name, account_number, bank_code, swift_code, routing_number FROM users WHERE id = %s', (user_id,))
     user = cursor.fetchone()
     cursor.close()
-    conn.close()
     return jsonify({'success': True, 'message': 'Profile updated', 'user': user})
 
 # Change Password Endpoint
 @routes_bp.route('/auth/change-password', methods=['POST'])
+@auth_required()
 def change_password():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
     req = request.json or {}
     current_password = req.get('current_password')
@@ -956,7 +1132,7 @@ def change_password():
     if len(new_password) < 6:
         return jsonify({'error': 'New password must be at least 6 characters long'}), 400
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     # Get current user and verify current password
@@ -965,13 +1141,11 @@ def change_password():
     
     if not user:
         cursor.close()
-        conn.close()
         return jsonify({'error': 'User not found'}), 404
     
     # Verify current password
     if not bcrypt.checkpw(current_password.encode('utf-8'), user['password_hash'].encode('utf-8')):
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Current password is incorrect'}), 401
     
     # Hash new password and update
@@ -979,27 +1153,21 @@ def change_password():
     cursor.execute('UPDATE users SET password_hash = %s, updated_at = %s WHERE id = %s', 
                    (new_password_hash, datetime.utcnow(), user_id))
     conn.commit()
+    invalidate_user(user_id)
     
     cursor.close()
-    conn.close()
     
     return jsonify({'success': True, 'message': 'Password changed successfully'})
 
 # Get Orders for Current Producer
 @routes_bp.route('/producer/orders', methods=['GET'])
+@auth_required(roles=['producer'])
 def get_producer_orders():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
+    limit, position = get_page_args()
+    clause, params = keyset_condition('o.created_at', 'o.id', position)
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('''SELECT o.*, u.username as buyer_username, u.first_name as buyer_first_name, u.last_name as buyer_last_name, 
                       u.company_name as buyer_company, p.name as product_name, p.main_image_url as product_image,
@@ -1007,28 +1175,18 @@ def get_producer_orders():
                       FROM orders o 
                       JOIN users u ON o.buyer_id = u.id 
                       JOIN products p ON o.product_id = p.id 
-                      WHERE p.producer_id = %s 
-                      ORDER BY o.created_at DESC''', (user_id,))
-    orders = cursor.fetchall()
+                      WHERE o.producer_id = %s''' + clause + keyset_order('o.created_at', 'o.id', limit), (user_id, *params))
+    orders, next_cursor = split_page(cursor.fetchall(), limit)
     cursor.close()
-    conn.close()
-    return jsonify(orders)
+    return page_response(orders, next_cursor)
 
 # Get Producer Dashboard Stats
 @routes_bp.route('/producer/dashboard', methods=['GET'])
+@auth_required(roles=['producer'])
 def get_producer_dashboard():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     # Get total products
@@ -1036,12 +1194,11 @@ def get_producer_dashboard():
     total_products = cursor.fetchone()['total_products']
     
     # Get total orders and earnings
-    cursor.execute('''SELECT COUNT(*) as total_orders, 
-                      SUM(o.total_amount) as total_earnings,
-                      SUM(CASE WHEN o.status = "pending" THEN 1 ELSE 0 END) as pending_orders
-                      FROM orders o 
-                      JOIN products p ON o.product_id = p.id 
-                      WHERE p.producer_id = %s''', (user_id,))
+    cursor.execute('''SELECT CAST(COALESCE(SUM(order_count), 0) AS SIGNED) as total_orders, 
+                      SUM(total_amount) as total_earnings,
+                      CAST(COALESCE(SUM(CASE WHEN status = "pending" THEN order_count ELSE 0 END), 0) AS SIGNED) as pending_orders
+                      FROM sales_rollups 
+                      WHERE producer_id = %s AND grain = 'month' ''', (user_id,))
     order_stats = cursor.fetchone()
     
     # Get recent orders
@@ -1050,13 +1207,12 @@ def get_producer_dashboard():
                       FROM orders o 
                       JOIN users u ON o.buyer_id = u.id 
                       JOIN products p ON o.product_id = p.id 
-                      WHERE p.producer_id = %s 
+                      WHERE o.producer_id = %s 
                       ORDER BY o.created_at DESC 
                       LIMIT 5''', (user_id,))
     recent_orders = cursor.fetchall()
     
     cursor.close()
-    conn.close()
     
     return jsonify({
         'stats': {
@@ -1070,70 +1226,62 @@ def get_producer_dashboard():
 
 # Get Producer Financials
 @routes_bp.route('/producer/financials', methods=['GET'])
+@auth_required(roles=['producer'])
 def get_producer_financials():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
+    reporting_currency = request.args.get('reporting_currency', FX_REPORTING_CURRENCY)
     
-    conn = get_db_connection()
+    conn = get_db()
+    if reporting_currency not in fx_rates.currencies(conn):
+        return jsonify({'error': f'Unsupported reporting currency: {reporting_currency}'}), 400
     cursor = conn.cursor(dictionary=True)
     
-    # Get financial summary
-    cursor.execute('''SELECT 
-                      COUNT(*) as total_orders,
-                      SUM(o.total_amount) as total_revenue,
-                      AVG(o.total_amount) as average_order_value,
-                      SUM(CASE WHEN o.status = "completed" THEN o.total_amount ELSE 0 END) as completed_revenue,
-                      SUM(CASE WHEN o.status = "pending" THEN o.total_amount ELSE 0 END) as pending_revenue
-                      FROM orders o 
-                      JOIN products p ON o.product_id = p.id 
-                      WHERE p.producer_id = %s''', (user_id,))
-    summary = cursor.fetchone()
-    
-    # Get transactions (orders) for the producer
+    # Get financial summary per day and currency, converted to the reporting currency
+    cursor.execute('''SELECT bucket, currency,
+                      SUM(order_count) as total_orders,
+                      SUM(total_amount) as total_revenue,
+                      SUM(CASE WHEN status = "completed" THEN total_amount ELSE 0 END) as completed_revenue,
+                      SUM(CASE WHEN status = "pending" THEN total_amount ELSE 0 END) as pending_revenue
+                      FROM sales_rollups 
+                      WHERE producer_id = %s AND grain = 'day'
+                      GROUP BY bucket, currency''', (user_id,))
+    report = aggregate_by_currency(conn, cursor.fetchall(), ['total_revenue', 'completed_revenue', 'pending_revenue'],
+                                   ['total_orders'], reporting_currency)
+    totals = report['totals']
+    total_orders = sum(row['total_orders'] for row in report['by_currency'])
+    
+    # Get a page of transactions (orders) for the producer
+    limit, position = get_page_args()
+    clause, params = keyset_condition('o.created_at', 'o.id', position)
     cursor.execute('''SELECT o.*, u.username as buyer_username, u.first_name as buyer_first_name, u.last_name as buyer_last_name,
                       u.company_name as buyer_company, p.name as product_name
                       FROM orders o 
                       JOIN users u ON o.buyer_id = u.id 
                       JOIN products p ON o.product_id = p.id 
-                      WHERE p.producer_id = %s 
-                      ORDER BY o.created_at DESC''', (user_id,))
-    transactions = cursor.fetchall()
+                      WHERE o.producer_id = %s''' + clause + keyset_order('o.created_at', 'o.id', limit), (user_id, *params))
+    transactions, next_cursor = split_page(cursor.fetchall(), limit)
     
     cursor.close()
-    conn.close()
     
-    return jsonify({
+    return page_response({
         'summary': {
-            'totalOrders': summary['total_orders'] or 0,
-            'totalRevenue': float(summary['total_revenue'] or 0),
-            'averageOrderValue': float(summary['average_order_value'] or 0),
-            'completedRevenue': float(summary['completed_revenue'] or 0),
-            'pendingRevenue': float(summary['pending_revenue'] or 0)
+            'totalOrders': total_orders,
+            'totalRevenue': totals['total_revenue'],
+            'averageOrderValue': round(totals['total_revenue'] / total_orders, 2) if total_orders else 0,
+            'completedRevenue': totals['completed_revenue'],
+            'pendingRevenue': totals['pending_revenue'],
+            'reportingCurrency': reporting_currency,
+            'byCurrency': report['by_currency'],
+            'unconvertedCurrencies': report['unconverted']
         },
         'transactions': transactions
-    })
+    }, next_cursor)
 
 # Update Order Status (Producer)
 @routes_bp.route('/producer/orders/<int:order_id>/status', methods=['PUT'])
+@auth_required(roles=['producer'])
 def update_producer_order_status(order_id):
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
     request_data = request.json
     new_status = request_data.get('status')
@@ -1141,42 +1289,39 @@ def update_producer_order_status(order_id):
     if not new_status:
         return jsonify({'error': 'Status is required'}), 400
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     # Verify the order belongs to this producer
-    cursor.execute('''SELECT o.id FROM orders o 
-                      JOIN products p ON o.product_id = p.id 
-                      WHERE o.id = %s AND p.producer_id = %s''', (order_id, user_id))
+    cursor.execute('SELECT id FROM orders WHERE id = %s AND producer_id = %s', (order_id, user_id))
     order = cursor.fetchone()
     
     if not order:
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Order not found or access denied'}), 404
     
     # Update order status
-    cursor.execute('UPDATE orders SET status = %s, updated_at = %s WHERE id = %s', 
-                   (new_status, datetime.utcnow(), order_id))
+    with rollups.track_orders(conn, [order_id]):
+        cursor.execute('UPDATE orders SET status = %s, updated_at = %s WHERE id = %s', 
+                       (new_status, datetime.utcnow(), order_id))
+    # Cancelling returns the order's stock, un-cancelling takes it again; fulfilment keeps it past the hold expiry
+    try:
+        changed = inventory.order_updated(conn, order_id)
+    except inventory.OutOfStock as e:
+        conn.rollback()
+        cursor.close()
+        return jsonify({'error': str(e), 'product_id': e.product_id, 'available': e.available}), 409
     conn.commit()
     cursor.close()
-    conn.close()
+    stock_changed(changed)
     
     return jsonify({'message': 'Order status updated successfully'})
 
 # Update Payment Status (Producer)
 @routes_bp.route('/producer/orders/<int:order_id>/payment-status', methods=['PUT'])
+@auth_required(roles=['producer'])
 def update_producer_payment_status(order_id):
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
     request_data = request.json
     new_payment_status = request_data.get('payment_status')
@@ -1184,27 +1329,31 @@ def update_producer_payment_status(order_id):
     if not new_payment_status:
         return jsonify({'error': 'Payment status is required'}), 400
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     # Verify the order belongs to this producer
-    cursor.execute('''SELECT o.id FROM orders o 
-                      JOIN products p ON o.product_id = p.id 
-                      WHERE o.id = %s AND p.producer_id = %s''', (order_id, user_id))
+    cursor.execute('SELECT id FROM orders WHERE id = %s AND producer_id = %s', (order_id, user_id))
     order = cursor.fetchone()
     
     if not order:
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Order not found or access denied'}), 404
     
     # Update payment status
-    cursor.execute('UPDATE orders SET payment_status = %s, updated_at = %s WHERE id = %s', 
-                   (new_payment_status, datetime.utcnow(), order_id))
+    with rollups.track_orders(conn, [order_id]):
+        cursor.execute('UPDATE orders SET payment_status = %s, updated_at = %s WHERE id = %s', 
+                       (new_payment_status, datetime.utcnow(), order_id))
+    try:
+        changed = inventory.order_updated(conn, order_id)
+    except inventory.OutOfStock as e:
+        conn.rollback()
+        cursor.close()
+        return jsonify({'error': str(e), 'product_id': e.product_id, 'available': e.available}), 409
     conn.commit()
     
     cursor.close()
-    conn.close()
+    stock_changed(changed)
     
     return jsonify({'message': 'Payment status updated successfully'})
 
@@ -1226,19 +1375,20 @@ def get_bank_details():
 @routes_bp.route('/admin/bank-details', methods=['GET'])
 @admin_required
 def get_admin_bank_details():
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('SELECT * FROM admin_bank_details WHERE is_active = TRUE ORDER BY created_at DESC LIMIT 1')
     bank_details = cursor.fetchone()
     cursor.close()
-    conn.close()
     return jsonify(bank_details)
 
 # Get Commissions (Admin)
 @routes_bp.route('/admin/commissions', methods=['GET'])
 @admin_required
 def get_admin_commissions():
-    conn = get_db_connection()
+    limit, position = get_page_args()
+    clause, params = keyset_condition('c.created_at', 'c.id', position)
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('''SELECT c.*, o.payment_transaction_id, o.payment_method, 
                       p.name as product_name, u.first_name, u.last_name, u.company_name as producer_company
@@ -1246,28 +1396,30 @@ def get_admin_commissions():
                       JOIN orders o ON c.order_id = o.id 
                       JOIN products p ON o.product_id = p.id 
                       JOIN users u ON c.producer_id = u.id 
-                      ORDER BY c.created_at DESC''')
-    commissions = cursor.fetchall()
+                      WHERE 1=1''' + clause + keyset_order('c.created_at', 'c.id', limit), tuple(params))
+    commissions, next_cursor = split_page(cursor.fetchall(), limit)
     cursor.close()
-    conn.close()
-    return jsonify(commissions)
+    return page_response(commissions, next_cursor)
 
 # Get Commission Summary (Admin)
 @routes_bp.route('/admin/commission-summary', methods=['GET'])
 @admin_required
 def get_commission_summary():
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     # Get total commissions
     cursor.execute('''SELECT 
-                      COUNT(*) as total_commissions,
+                      CAST(COALESCE(SUM(commission_count), 0) AS SIGNED) as total_commissions,
                       SUM(commission_amount) as total_commission_amount,
                       SUM(CASE WHEN status = "pending" THEN commission_amount ELSE 0 END) as pending_commission_amount,
-                      SUM(CASE WHEN status = "paid" THEN commission_amount ELSE 0 END) as paid_commission_amount,
-                      AVG(commission_amount) as average_commission
-                      FROM commissions''')
+                      SUM(CASE WHEN status = "paid" THEN commission_amount ELSE 0 END) as paid_commission_amount
+                      FROM commission_rollups WHERE grain = 'month' ''')
     summary = cursor.fetchone()
+    if summary['total_commissions']:
+        summary['average_commission'] = summary['total_commission_amount'] / summary['total_commissions']
+    else:
+        summary['average_commission'] = None
     
     # Get recent commissions
     cursor.execute('''SELECT c.*, o.payment_transaction_id, p.name as product_name, 
@@ -1280,7 +1432,6 @@ def get_commission_summary():
     recent_commissions = cursor.fetchall()
     
     cursor.close()
-    conn.close()
     
     return jsonify({
         'summary': {
@@ -1303,33 +1454,109 @@ def update_commission_status(commission_id):
     
     if not new_status:
         return jsonify({'error': 'Status is required'}), 400
+    if new_status not in settlements.COMMISSION_STATUSES:
+        return jsonify({'error': f"Status must be one of: {', '.join(settlements.COMMISSION_STATUSES)}"}), 400
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('UPDATE commissions SET status = %s, payment_reference = %s, updated_at = %s WHERE id = %s', 
-                   (new_status, payment_reference, datetime.utcnow(), commission_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    try:
+        updated = settlements.update_commission_status(get_db(), commission_id, new_status, payment_reference)
+    except settlements.SettlementError as e:
+        return jsonify({'error': str(e)}), 409
+    if not updated:
+        return jsonify({'error': 'Commission not found'}), 404
     
     return jsonify({'message': 'Commission status updated successfully'})
 
+# Admin: Create a settlement run for pending commissions (grouped by producer and currency)
+@routes_bp.route('/admin/settlements', methods=['POST'])
+@admin_required
+def create_settlement_run():
+    data = request.json or {}
+    producer_ids = data.get('producer_ids')
+    if producer_ids is not None and (not isinstance(producer_ids, list) or not all(isinstance(i, int) for i in producer_ids)):
+        return jsonify({'error': 'producer_ids must be a list of ids'}), 400
+    cutoff = data.get('cutoff')
+    if cutoff:
+        try:
+            cutoff = datetime.fromisoformat(cutoff)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'cutoff must be an ISO date or datetime (YYYY-MM-DD[THH:MM:SS])'}), 400
+    conn = get_db()
+    run_id, skipped = settlements.create_run(conn, g.user_id, data.get('currency'), cutoff, producer_ids)
+    if run_id is None:
+        return jsonify({'error': 'No pending commissions to settle', 'skipped_producers': skipped}), 400
+    return jsonify({'message': 'Settlement run created', 'run': settlements.get_run(conn, run_id),
+                    'skipped_producers': skipped}), 201
+
+# Admin: List settlement runs
+@routes_bp.route('/admin/settlements', methods=['GET'])
+@admin_required
+def get_settlement_runs():
+    limit, position = get_page_args()
+    clause, params = keyset_condition('created_at', 'id', position)
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute('SELECT * FROM settlement_runs WHERE 1=1' + clause + keyset_order('created_at', 'id', limit), tuple(params))
+    runs, next_cursor = split_page(cursor.fetchall(), limit)
+    cursor.close()
+    return page_response(runs, next_cursor)
+
+# Admin: Get a settlement run with its payout items
+@routes_bp.route('/admin/settlements/<int:run_id>', methods=['GET'])
+@admin_required
+def get_settlement_run(run_id):
+    run = settlements.get_run(get_db(), run_id)
+    if not run:
+        return jsonify({'error': 'Settlement run not found'}), 404
+    return jsonify(run)
+
+# Admin: Download the payout file for a settlement run
+@routes_bp.route('/admin/settlements/<int:run_id>/payout-file', methods=['GET'])
+@admin_required
+def get_settlement_payout_file(run_id):
+    run = settlements.get_run(get_db(), run_id)
+    if not run:
+        return jsonify({'error': 'Settlement run not found'}), 404
+    return settlements.payout_csv(run), 200, {'Content-Type': 'text/csv', 'Content-Disposition': f'attachment; filename=payout_run_{run_id}.csv'}
+
+# Admin: Mark a settlement run as paid out
+@routes_bp.route('/admin/settlements/<int:run_id>/complete', methods=['POST'])
+@admin_required
+def complete_settlement_run(run_id):
+    try:
+        producer_ids = settlements.complete_run(get_db(), run_id)
+    except settlements.SettlementError as e:
+        return jsonify({'error': str(e)}), 409
+    if producer_ids is None:
+        return jsonify({'error': 'Settlement run not found'}), 404
+    for producer_id in producer_ids:
+        send_notification_to_user(producer_id, {
+            "type": "payout",
+            "title": "Payout Sent",
+            "message": f"Your earnings from settlement run #{run_id} have been paid out",
+            "settlement_run_id": run_id,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+    return jsonify({'message': 'Settlement run completed successfully'})
+
+# Admin: Cancel a settlement run, returning its commissions to pending
+@routes_bp.route('/admin/settlements/<int:run_id>/cancel', methods=['POST'])
+@admin_required
+def cancel_settlement_run(run_id):
+    try:
+        cancelled = settlements.cancel_run(get_db(), run_id)
+    except settlements.SettlementError as e:
+        return jsonify({'error': str(e)}), 409
+    if not cancelled:
+        return jsonify({'error': 'Settlement run not found'}), 404
+    return jsonify({'message': 'Settlement run cancelled successfully'})
+
 # Get Producer Commissions
 @routes_bp.route('/producer/commissions', methods=['GET'])
+@auth_required(roles=['producer'])
 def get_producer_commissions():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        producer_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    producer_id = g.user_id
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('''SELECT c.*, o.payment_transaction_id, o.payment_method, p.name as product_name
                       FROM commissions c 
@@ -1339,24 +1566,15 @@ def get_producer_commissions():
                       ORDER BY c.created_at DESC''', (producer_id,))
     commissions = cursor.fetchall()
     cursor.close()
-    conn.close()
     return jsonify(commissions)
 
 # Get Producer Payments
 @routes_bp.route('/producer/payments', methods=['GET'])
+@auth_required(roles=['producer'])
 def get_producer_payments():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     # Get payments (completed orders) for the producer
@@ -1365,12 +1583,11 @@ def get_producer_payments():
                       FROM orders o 
                       JOIN users u ON o.buyer_id = u.id 
                       JOIN products p ON o.product_id = p.id 
-                      WHERE p.producer_id = %s AND o.payment_status = "completed"
+                      WHERE o.producer_id = %s AND o.payment_status = "completed"
                       ORDER BY o.created_at DESC''', (user_id,))
     payments = cursor.fetchall()
     
     cursor.close()
-    conn.close()
     
     return jsonify(payments)
 
@@ -1378,41 +1595,33 @@ def get_producer_payments():
 
 # Get conversations for a user
 @routes_bp.route('/conversations', methods=['GET'])
+@auth_required()
 def get_conversations():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
+    limit, position = get_page_args()
+    clause, params = keyset_condition('s.last_activity_at', 's.inquiry_id', position)
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
 
-    # Get conversations where user is either buyer or producer, including those without a product
+    # The user's inbox rows from conversation_summaries (kept up to date on every message and read),
+    # ordered by latest activity (last message, or inquiry creation when there are no messages yet).
     cursor.execute('''
-        SELECT DISTINCT i.id as inquiry_id, i.product_id, i.buyer_id, 
-               COALESCE(p.producer_id, i.producer_id) as producer_id,
+        SELECT s.inquiry_id, i.product_id, i.buyer_id,
+               IF(s.role = 'buyer', s.other_user_id, s.user_id) as producer_id,
                p.name as product_name, p.main_image_url as product_image,
                buyer.username as buyer_username, buyer.first_name as buyer_first_name, buyer.last_name as buyer_last_name, buyer.company_name as buyer_company,
                producer.username as producer_username, producer.first_name as producer_first_name, producer.last_name as producer_last_name, producer.company_name as producer_company,
-               i.created_at as inquiry_created_at,
-               (SELECT COUNT(*) FROM messages m WHERE m.inquiry_id = i.id AND m.sender_id != %s AND m.is_read = FALSE) as unread_count,
-               (SELECT m.message FROM messages m WHERE m.inquiry_id = i.id ORDER BY m.created_at DESC LIMIT 1) as last_message,
-               (SELECT m.created_at FROM messages m WHERE m.inquiry_id = i.id ORDER BY m.created_at DESC LIMIT 1) as last_message_time
-        FROM inquiries i
+               i.created_at as inquiry_created_at, s.unread_count, s.last_message, s.last_message_at as last_message_time,
+               s.last_activity_at as sort_time
+        FROM conversation_summaries s
+        JOIN inquiries i ON s.inquiry_id = i.id
         LEFT JOIN products p ON i.product_id = p.id
         JOIN users buyer ON i.buyer_id = buyer.id
-        LEFT JOIN users producer ON (p.producer_id = producer.id OR i.producer_id = producer.id)
-        WHERE i.buyer_id = %s OR (p.producer_id = %s OR i.producer_id = %s)
-        ORDER BY last_message_time DESC
-    ''', (user_id, user_id, user_id, user_id))
+        LEFT JOIN users producer ON producer.id = IF(s.role = 'buyer', s.other_user_id, s.user_id)
+        WHERE s.user_id = %s''' + clause + keyset_order('s.last_activity_at', 's.inquiry_id', limit), (user_id, *params))
 
-    conversations = cursor.fetchall()
+    conversations, next_cursor = split_page(cursor.fetchall(), limit, 'sort_time', 'inquiry_id')
 
     # Process conversations to add user info
     for conv in conversations:
@@ -1434,25 +1643,16 @@ def get_conversations():
             }
 
     cursor.close()
-    conn.close()
 
-    return jsonify(conversations)
+    return page_response(conversations, next_cursor)
 
 # Get messages for a specific inquiry
 @routes_bp.route('/conversations/<int:inquiry_id>/messages', methods=['GET'])
+@auth_required()
 def get_messages(inquiry_id):
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
 
     # Try to find inquiry with or without product
@@ -1471,54 +1671,47 @@ def get_messages(inquiry_id):
         (inquiry['product_id'] is None and inquiry.get('producer_id') == user_id)
     ):
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Inquiry not found or access denied'}), 404
 
-    # Get messages
-    cursor.execute('''
-        SELECT m.*, u.username, u.first_name, u.last_name, u.user_type
-        FROM messages m
-        JOIN users u ON m.sender_id = u.id
-        WHERE m.inquiry_id = %s
-        ORDER BY m.created_at ASC
-    ''', (inquiry_id,))
-
-    messages = cursor.fetchall()
-
-    # Mark messages as read for the current user
-    cursor.execute('''
-        UPDATE messages 
-        SET is_read = TRUE 
-        WHERE inquiry_id = %s AND sender_id != %s
-    ''', (inquiry_id, user_id))
-
-    conn.commit()
     cursor.close()
-    conn.close()
 
-    return jsonify(messages)
+    # Whole thread unless paging is asked for: ?limit= alone gives the latest page,
+    # ?before=<id> scrolls back, ?after=<id> catches up after a reconnect
+    before = request.args.get('before', type=int)
+    after = request.args.get('after', type=int)
+    if before is not None and after is not None:
+        return jsonify({'error': 'Use either before or after, not both'}), 400
+    paged = any(name in request.args for name in ('limit', 'before', 'after'))
+    messages, has_more = conversations.message_page(conn, inquiry_id, get_limit() if paged else None, before, after)
+
+    # Viewing the newest messages reads them: move the user's watermark instead of rewriting the messages
+    if before is None and messages:
+        conversations.mark_read(conn, inquiry_id, user_id, messages[-1]['id'] if after is not None and has_more else None)
+        conn.commit()
+
+    response = jsonify(conversations.apply_read_state(messages, conversations.read_watermarks(conn, inquiry_id)))
+    response.headers['X-Has-More'] = 'true' if has_more else 'false'
+    return response
 
 # Send a message (also handled by WebSocket, but this is for REST API compatibility)
 @routes_bp.route('/conversations/<int:inquiry_id>/messages', methods=['POST'])
+@auth_required()
 def send_message(inquiry_id):
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
     request_data = request.json
     message_text = request_data.get('message')
     
     if not message_text:
         return jsonify({'error': 'Message is required'}), 400
+
+    idempotency_key = idempotency.from_request('send_message', user_id, {'inquiry_id': inquiry_id, 'message': message_text})
+    if idempotency_key:
+        stored = idempotency_key.cached()
+        if stored:
+            return idempotency.replay_response(stored)
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     # Verify user has access to this inquiry
@@ -1532,16 +1725,23 @@ def send_message(inquiry_id):
     inquiry = cursor.fetchone()
     if not inquiry:
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Inquiry not found or access denied'}), 404
+
+    if idempotency_key:
+        stored = idempotency_key.claim(conn)
+        if stored:
+            cursor.close()
+            return idempotency.replay_response(stored)
     
     # Insert message
+    now = datetime.utcnow()
     cursor.execute('''
         INSERT INTO messages (inquiry_id, sender_id, message, is_read, created_at)
         VALUES (%s, %s, %s, %s, %s)
-    ''', (inquiry_id, user_id, message_text, False, datetime.utcnow()))
+    ''', (inquiry_id, user_id, message_text, False, now))
     
     message_id = cursor.lastrowid
+    conversations.message_sent(conn, inquiry_id, user_id, message_id, message_text, now)
     
     # Get the inserted message with user info
     cursor.execute('''
@@ -1552,60 +1752,31 @@ def send_message(inquiry_id):
     ''', (message_id,))
     
     message = cursor.fetchone()
+    if idempotency_key:
+        idempotency_key.save(conn, 201, message)
     
     conn.commit()
     cursor.close()
-    conn.close()
+    if idempotency_key:
+        idempotency_key.remember()
     
     return jsonify(message), 201
 
 # Get unread message count for a user
 @routes_bp.route('/messages/unread-count', methods=['GET'])
+@auth_required()
 def get_unread_count():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    user_id = g.user_id
     
-    cursor.execute('''
-        SELECT COUNT(*) as unread_count
-        FROM messages m
-        JOIN inquiries i ON m.inquiry_id = i.id
-        JOIN products p ON i.product_id = p.id
-        WHERE m.sender_id != %s AND m.is_read = FALSE 
-        AND (i.buyer_id = %s OR p.producer_id = %s)
-    ''', (user_id, user_id, user_id))
-    
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    
-    return jsonify({'unread_count': result['unread_count']})
+    return jsonify({'unread_count': conversations.unread_total(get_db(), user_id)})
 
 # Mark messages as read for a specific inquiry
 @routes_bp.route('/conversations/<int:inquiry_id>/mark-read', methods=['POST'])
+@auth_required()
 def mark_messages_read(inquiry_id):
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
 
     # Try to find inquiry with or without product
@@ -1624,38 +1795,25 @@ def mark_messages_read(inquiry_id):
         (inquiry['product_id'] is None and inquiry.get('producer_id') == user_id)
     ):
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Inquiry not found or access denied'}), 404
 
-    # Mark messages as read
-    cursor.execute('''
-        UPDATE messages 
-        SET is_read = TRUE 
-        WHERE inquiry_id = %s AND sender_id != %s
-    ''', (inquiry_id, user_id))
+    # Mark messages as read, optionally only up to a given message
+    message_id = (request.get_json(silent=True) or {}).get('message_id')
+    last_read_message_id = conversations.mark_read(conn, inquiry_id, user_id, message_id)
 
     conn.commit()
     cursor.close()
-    conn.close()
 
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'last_read_message_id': last_read_message_id})
 
 # Producer Bank Details Management
 @routes_bp.route('/producer/bank-details', methods=['GET'])
+@auth_required(roles=['producer'])
 def get_producer_bank_details():
     """Get bank details for the current producer"""
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     # Get bank details from users table
@@ -1670,7 +1828,6 @@ def get_producer_bank_details():
     detailed_bank_details = cursor.fetchall()
     
     cursor.close()
-    conn.close()
     
     return jsonify({
         'user_bank_details': user_bank_details,
@@ -1678,18 +1835,10 @@ def get_producer_bank_details():
     })
 
 @routes_bp.route('/producer/bank-details', methods=['POST'])
+@auth_required(roles=['producer'])
 def add_producer_bank_details():
     """Add new bank details for the current producer"""
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
     request_data = request.json or {}
     bank_name = request_data.get('bank_name')
@@ -1702,7 +1851,7 @@ def add_producer_bank_details():
     if not all([bank_name, account_name, account_number]):
         return jsonify({'error': 'Bank name, account name, and account number are required'}), 400
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     try:
@@ -1723,29 +1872,19 @@ def add_producer_bank_details():
         new_bank_details = cursor.fetchone()
         
         cursor.close()
-        conn.close()
         
         return jsonify({'message': 'Bank details added successfully', 'bank_details': new_bank_details}), 201
         
     except Exception as e:
         conn.rollback()
         cursor.close()
-        conn.close()
         return jsonify({'error': f'Failed to add bank details: {str(e)}'}), 500
 
 @routes_bp.route('/producer/bank-details/<int:bank_id>', methods=['PUT'])
+@auth_required(roles=['producer'])
 def update_producer_bank_details(bank_id):
     """Update bank details for the current producer"""
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
     request_data = request.json or {}
     bank_name = request_data.get('bank_name')
@@ -1758,7 +1897,7 @@ def update_producer_bank_details(bank_id):
     if not all([bank_name, account_name, account_number]):
         return jsonify({'error': 'Bank name, account name, and account number are required'}), 400
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     try:
@@ -1768,7 +1907,6 @@ def update_producer_bank_details(bank_id):
         
         if not existing_bank:
             cursor.close()
-            conn.close()
             return jsonify({'error': 'Bank details not found or access denied'}), 404
         
         # Update the bank details
@@ -1789,31 +1927,21 @@ def update_producer_bank_details(bank_id):
         updated_bank_details = cursor.fetchone()
         
         cursor.close()
-        conn.close()
         
         return jsonify({'message': 'Bank details updated successfully', 'bank_details': updated_bank_details})
         
     except Exception as e:
         conn.rollback()
         cursor.close()
-        conn.close()
         return jsonify({'error': f'Failed to update bank details: {str(e)}'}), 500
 
 @routes_bp.route('/producer/bank-details/<int:bank_id>', methods=['DELETE'])
+@auth_required(roles=['producer'])
 def delete_producer_bank_details(bank_id):
     """Delete bank details for the current producer"""
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     try:
@@ -1823,7 +1951,6 @@ def delete_producer_bank_details(bank_id):
         
         if not existing_bank:
             cursor.close()
-            conn.close()
             return jsonify({'error': 'Bank details not found or access denied'}), 404
         
         # Delete the bank details
@@ -1836,31 +1963,21 @@ def delete_producer_bank_details(bank_id):
         
         conn.commit()
         cursor.close()
-        conn.close()
         
         return jsonify({'message': 'Bank details deleted successfully'})
         
     except Exception as e:
         conn.rollback()
         cursor.close()
-        conn.close()
         return jsonify({'error': f'Failed to delete bank details: {str(e)}'}), 500
 
 @routes_bp.route('/producer/bank-details/<int:bank_id>/set-primary', methods=['POST'])
+@auth_required(roles=['producer'])
 def set_primary_bank_details(bank_id):
     """Set a bank account as primary for the current producer"""
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     try:
@@ -1870,7 +1987,6 @@ def set_primary_bank_details(bank_id):
         
         if not existing_bank:
             cursor.close()
-            conn.close()
             return jsonify({'error': 'Bank details not found or access denied'}), 404
         
         # Set all other bank accounts as inactive
@@ -1890,21 +2006,19 @@ def set_primary_bank_details(bank_id):
         
         conn.commit()
         cursor.close()
-        conn.close()
         
         return jsonify({'message': 'Primary bank account updated successfully'})
         
     except Exception as e:
         conn.rollback()
         cursor.close()
-        conn.close()
         return jsonify({'error': f'Failed to update primary bank account: {str(e)}'}), 500
 
 # Get producer bank details for buyers (public endpoint)
 @routes_bp.route('/producer/<int:producer_id>/bank-details', methods=['GET'])
 def get_producer_public_bank_details(producer_id):
     """Get public bank details for a specific producer (for buyers)"""
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     
     # Get the primary bank details for the producer
@@ -1913,7 +2027,6 @@ def get_producer_public_bank_details(producer_id):
     bank_details = cursor.fetchone()
     
     cursor.close()
-    conn.close()
     
     if not bank_details:
         return jsonify({'error': 'Producer not found or no bank details available'}), 404
@@ -1928,21 +2041,124 @@ def get_online_users():
     online_users = get_online_users()
     return jsonify(online_users) 
 
+# Get database connection pool stats (Admin only)
+@routes_bp.route('/admin/db-pool', methods=['GET'])
+@admin_required
+def get_db_pool_stats():
+    return jsonify(get_pool_stats())
+
+# Get response cache stats (Admin only)
+@routes_bp.route('/admin/response-cache', methods=['GET'])
+@admin_required
+def get_response_cache_stats():
+    return jsonify(response_cache.stats())
+
+# Admin: FX rates (value of one unit of each currency in the base currency)
+@routes_bp.route('/admin/fx-rates', methods=['GET'])
+@admin_required
+def get_fx_rates():
+    try:
+        rate_date = parse_rate_date(request.args.get('date'))
+    except ValueError:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+    rates = fx_rates.rates_on(get_db(), rate_date)
+    return jsonify({'base_currency': FX_BASE_CURRENCY, 'date': rate_date.isoformat(),
+                    'rates': {currency: float(rate) for currency, rate in sorted(rates.items()) if rate is not None}})
+
+@routes_bp.route('/admin/fx-rates', methods=['PUT'])
+@admin_required
+def put_fx_rates():
+    data = request.json or {}
+    rates = data.get('rates')
+    if not isinstance(rates, dict) or not rates:
+        return jsonify({'error': 'rates must be an object of currency: rate'}), 400
+    try:
+        rate_date = parse_rate_date(data.get('rate_date'))
+        rates = {str(currency).upper(): float(rate) for currency, rate in rates.items()}
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid rate_date or rate'}), 400
+    if any(rate <= 0 for rate in rates.values()):
+        return jsonify({'error': 'Rates must be positive'}), 400
+    upsert_rates(get_db(), rate_date, rates)
+    return jsonify({'message': 'FX rates updated successfully', 'date': rate_date.isoformat(), 'count': len(rates)})
+
+# Admin: Platform settings (commission rates, payout admin account)
+@routes_bp.route('/admin/settings', methods=['GET'])
+@admin_required
+def get_platform_settings():
+    return jsonify({'settings': platform_settings.all(get_db())})
+
+@routes_bp.route('/admin/settings', methods=['PUT'])
+@admin_required
+def put_platform_settings():
+    data = request.json or {}
+    settings = data.get('settings')
+    if not isinstance(settings, dict) or not settings:
+        return jsonify({'error': 'settings must be an object of key: value (null removes a key)'}), 400
+    conn = get_db()
+    try:
+        platform_settings.update(conn, settings, g.user_id)
+    except SettingsError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'message': 'Settings updated successfully', 'settings': platform_settings.all(conn)})
+
+# Sales time series (revenue, orders, commission) per day / week / month
+@routes_bp.route('/analytics/sales', methods=['GET'])
+@auth_required(roles=['producer', ADMIN_TYPE])
+def get_sales_analytics():
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': 'granularity must be day, week or month'}), 400
+    try:
+        start = date.fromisoformat(request.args['start_date']) if request.args.get('start_date') else None
+        end = date.fromisoformat(request.args['end_date']) if request.args.get('end_date') else None
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    # Producers only ever see their own sales; admins may pick a producer or see the whole platform
+    if g.current_user['user_type'] == ADMIN_TYPE:
+        producer_id = request.args.get('producer_id', type=int)
+    else:
+        producer_id = g.user_id
+    currency = request.args.get('currency') or None
+    conn = get_db()
+    # Every distinct scope is cached, so only accept currencies that can actually have data
+    if currency is not None and currency not in sales_analytics.currencies(conn):
+        return jsonify({'error': f'Unknown currency: {currency}'}), 400
+    series = sales_analytics.sales(conn, producer_id, currency, granularity, start, end)
+    return jsonify({'granularity': granularity, 'producer_id': producer_id, 'currency': currency, 'series': series})
+
+# Admin: Columnar analytics export (Parquet / Arrow IPC) of orders or commissions
+@routes_bp.route('/admin/analytics-export/<dataset>', methods=['GET'])
+@admin_required
+def admin_analytics_export(dataset):
+    if dataset not in analytics_export.DATASETS:
+        return jsonify({'error': 'Unknown dataset'}), 404
+    fmt = request.args.get('format', 'parquet')
+    if fmt not in analytics_export.FORMATS:
+        return jsonify({'error': 'format must be parquet or arrow'}), 400
+    if analytics_export.pa is None:
+        return jsonify({'error': 'Columnar export requires pyarrow'}), 501
+    suffix = analytics_export.FORMATS[fmt]
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        analytics_export.write_dataset(get_db(), dataset, path, fmt,
+                                       request.args.get('start_date'), request.args.get('end_date'))
+    except Exception as e:
+        os.remove(path)
+        return jsonify({'error': str(e)}), 500
+    mimetype = 'application/vnd.apache.parquet' if fmt == 'parquet' else 'application/vnd.apache.arrow.file'
+    response = send_file(path, mimetype=mimetype, as_attachment=True, download_name=dataset + suffix)
+    response.call_on_close(lambda: os.remove(path))
+    return response
+
 # Get Producer Order by ID
 @routes_bp.route('/producer/orders/<int:order_id>', methods=['GET'])
+@auth_required(roles=['producer'])
 def get_producer_order(order_id):
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split()[1]
-    if not token:
-        return jsonify({'error': 'Token is missing!'}), 401
-    try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-    except Exception as e:
-        return jsonify({'error': 'Token is invalid!'}), 401
+    user_id = g.user_id
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     # Check that the order belongs to this producer
     cursor.execute('''SELECT o.*, p.name as product_name, p.main_image_url as product_image, \
@@ -1951,21 +2167,20 @@ def get_producer_order(order_id):
                       FROM orders o 
                       JOIN products p ON o.product_id = p.id 
                       JOIN users u ON o.buyer_id = u.id 
-                      WHERE o.id = %s AND p.producer_id = %s''', (order_id, user_id))
+                      WHERE o.id = %s AND o.producer_id = %s''', (order_id, user_id))
     order = cursor.fetchone()
     cursor.close()
-    conn.close()
     if not order:
         return jsonify({'error': 'Order not found or access denied'}), 404
     return jsonify(order)
 
 # Public: Get all producers
 @routes_bp.route('/producers', methods=['GET'])
+@cached_response(ttl=300, tags=['producers'])
 def get_all_producers():
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
     cursor.execute('''SELECT id, username, first_name, last_name, company_name, email, phone, city, country FROM users WHERE user_type = 'producer' AND is_active = TRUE''')
     producers = cursor.fetchall()
     cursor.close()
-    conn.close()
     return jsonify(producers)
\ No newline at end of file
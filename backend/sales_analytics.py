@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+import numpy as np
+from fx import fx_rates
+
+ANALYTICS_MAX_AGE = float(os.getenv('ANALYTICS_MAX_AGE', '300'))
+ANALYTICS_REFRESH_INTERVAL = float(os.getenv('ANALYTICS_REFRESH_INTERVAL', '5'))
+ANALYTICS_MAX_PERIODS = int(os.getenv('ANALYTICS_MAX_PERIODS', '1000'))
+ANALYTICS_CACHE_ENTRIES = int(os.getenv('ANALYTICS_CACHE_ENTRIES', '500'))
+ANALYTICS_MAX_SCOPES = int(os.getenv('ANALYTICS_MAX_SCOPES', '500'))
+
+GRANULARITIES = ('day', 'week', 'month')
+METRICS = ('orders', 'revenue', 'commission', 'producer_amount', 'commission_paid')
+
+# Daily totals per currency from the rollup tables; paid commissions come from commission_rollups
+DAILY_QUERY = '''SELECT bucket, currency, SUM(order_count), SUM(total_amount), SUM(commission_amount), SUM(producer_amount), 0
+                 FROM sales_rollups WHERE grain = 'day' AND bucket >= %s{scope}
+                 GROUP BY bucket, currency
+                 UNION ALL
+                 SELECT bucket, currency, 0, 0, 0, 0, SUM(commission_amount)
+                 FROM commission_rollups WHERE grain = 'day' AND status = 'paid' AND bucket >= %s{scope}
+                 GROUP BY bucket, currency'''
+
+
+def bucket_days(days, granularity):
+    """Map a datetime64[D] array onto the first day of its day / ISO week / month bucket"""
+    if granularity == 'week':
+        # Day 0 (1970-01-01) was a Thursday; shift so weeks start on Monday
+        offset = (days.astype('int64') + 3) % 7
+        return days - offset.astype('timedelta64[D]')
+    if granularity == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    return days
+
+
+def _combine(days, values):
+    """Sum rows sharing a day; returns (sorted unique days, summed values)"""
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    summed = np.zeros((len(unique_days), values.shape[1]))
+    np.add.at(summed, inverse, values)
+    return unique_days, summed
+
+
+class _Series:
+    """Daily metric arrays for one scope (producer or platform, optional currency)"""
+
+    def __init__(self):
+        self.currencies = {}  # currency -> (days datetime64[D], values float64 [n, len(METRICS)])
+        self.loaded_at = None
+        self.refreshed_at = None
+        self.version = 0
+
+
+class SalesAnalytics:
+    """Time-series sales metrics built from the daily rollups.
+
+    Daily arrays are cached per scope and extended incrementally: a refresh
+    only re-reads rollup rows from the last loaded day onwards. Scopes are
+    fully reloaded after ANALYTICS_MAX_AGE seconds to pick up edits to older
+    orders. Bucketed results are cached per (scope, range, granularity) until
+    the scope's data changes. Both caches are LRUs (ANALYTICS_MAX_SCOPES and
+    ANALYTICS_CACHE_ENTRIES), since scopes come from request parameters.
+    """
+
+    def __init__(self, max_age=ANALYTICS_MAX_AGE, refresh_interval=ANALYTICS_REFRESH_INTERVAL):
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._series = OrderedDict()  # (producer_id, currency) -> _Series
+        self._results = OrderedDict()  # (scope, start, end, granularity) -> (version, result)
+
+    def _fetch(self, conn, scope, since):
+        producer_id, currency = scope
+        clauses, params = '', [since]
+        if producer_id is not None:
+            clauses += ' AND producer_id = %s'
+            params.append(producer_id)
+        if currency is not None:
+            clauses += ' AND currency = %s'
+            params.append(currency)
+        cursor = conn.cursor()
+        cursor.execute(DAILY_QUERY.format(scope=clauses), tuple(params + params))
+        rows = cursor.fetchall()
+        cursor.close()
+
+        fetched = {}
+        if not rows:
+            return fetched
+        currencies = np.array([row[1] for row in rows], dtype=object)
+        days = np.array([row[0] for row in rows], dtype='datetime64[D]')
+        values = np.array([row[2:] for row in rows], dtype=float)
+        for code in np.unique(currencies):
+            mask = currencies == code
+            fetched[code] = _combine(days[mask], values[mask])
+        return fetched
+
+    def _refresh(self, conn, scope):
+        now = time.monotonic()
+        with self._lock:
+            series = self._series.get(scope)
+            if series is not None:
+                self._series.move_to_end(scope)
+            if series is None or now - series.loaded_at > self.max_age:
+                series = None
+            elif now - series.refreshed_at < self.refresh_interval:
+                return series
+        if series is None:
+            fresh = _Series()
+            fresh.currencies = self._fetch(conn, scope, date.min)
+            fresh.loaded_at = fresh.refreshed_at = now
+            with self._lock:
+                old = self._series.get(scope)
+                fresh.version = old.version + 1 if old else 1
+                self._series[scope] = fresh
+                self._series.move_to_end(scope)
+                while len(self._series) > ANALYTICS_MAX_SCOPES:
+                    evicted, _ = self._series.popitem(last=False)
+                    for key in [key for key in self._results if key[0] == evicted]:
+                        del self._results[key]
+            return fresh
+
+        # Re-read only from the last loaded day (which may have been partial) onwards
+        last_days = [days[-1] for days, _ in series.currencies.values() if len(days)]
+        since = min(last_days).item() if last_days else date.min
+        tail = self._fetch(conn, scope, since)
+        cutoff = np.datetime64(since, 'D')
+        with self._lock:
+            changed = False
+            for code in set(series.currencies) | set(tail):
+                days, values = series.currencies.get(code, (np.array([], dtype='datetime64[D]'), np.zeros((0, len(METRICS)))))
+                keep = days < cutoff
+                new_days, new_values = tail.get(code, (days[:0], values[:0]))
+                if not (np.array_equal(days[~keep], new_days) and np.array_equal(values[~keep], new_values)):
+                    changed = True
+                series.currencies[code] = (np.concatenate([days[keep], new_days]), np.concatenate([values[keep], new_values]))
+            if changed:
+                series.version += 1
+            series.refreshed_at = now
+        return series
+
+    def sales(self, conn, producer_id=None, currency=None, granularity='day', start=None, end=None):
+        """{currency: [{period, orders, revenue, ...}]} bucketed by `granularity`, oldest first"""
+        scope = (producer_id, currency)
+        series = self._refresh(conn, scope)
+        key = (scope, start, end, granularity)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached and cached[0] == series.version:
+                self._results.move_to_end(key)
+                return cached[1]
+            snapshot = dict(series.currencies)
+            version = series.version
+
+        result = {}
+        for code, (days, values) in sorted(snapshot.items()):
+            mask = np.ones(len(days), dtype=bool)
+            if start is not None:
+                mask &= days >= np.datetime64(start, 'D')
+            if end is not None:
+                mask &= days <= np.datetime64(end, 'D')
+            if not mask.any():
+                continue
+            periods, inverse = np.unique(bucket_days(days[mask], granularity), return_inverse=True)
+            totals = np.zeros((len(periods), len(METRICS)))
+            np.add.at(totals, inverse, values[mask])
+            periods, totals = periods[-ANALYTICS_MAX_PERIODS:], totals[-ANALYTICS_MAX_PERIODS:]
+            result[code] = [
+                {'period': str(period), 'orders': int(row[0]), 'revenue': round(row[1], 2),
+                 'commission': round(row[2], 2), 'producer_amount': round(row[3], 2),
+                 'commission_paid': round(row[4], 2)}
+                for period, row in zip(periods, totals.tolist())
+            ]
+        with self._lock:
+            self._results[key] = (version, result)
+            self._results.move_to_end(key)
+            while len(self._results) > ANALYTICS_CACHE_ENTRIES:
+                self._results.popitem(last=False)
+        return result
+
+    def currencies(self, conn):
+        """Currencies that can be asked for: those with platform sales plus those with FX rates"""
+        return set(self._refresh(conn, (None, None)).currencies) | fx_rates.currencies(conn)
+
+    def stats(self):
+        with self._lock:
+            return {'scopes': len(self._series), 'results': len(self._results)}
+
+
+sales_analytics = SalesAnalytics()
@@ -31,6 +31,8 @@ CREATE TABLE users (
 );
 
 CREATE INDEX idx_users_bank_details ON users(id, bank_name, account_number);
+CREATE INDEX idx_users_created ON users(created_at, id);
+CREATE INDEX idx_users_type_created ON users(user_type, created_at, id);
 
 CREATE TABLE certifications (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -48,6 +50,7 @@ CREATE TABLE tags (
     id INT AUTO_INCREMENT PRIMARY KEY,
     name VARCHAR(50) NOT NULL UNIQUE
 );
+CREATE FULLTEXT INDEX ft_tags_name ON tags(name);
 
 CREATE TABLE products (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -72,6 +75,9 @@ CREATE TABLE products (
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (producer_id) REFERENCES users(id)
 );
+CREATE INDEX idx_products_status_created ON products(product_status, created_at, id);
+CREATE INDEX idx_products_producer_created ON products(producer_id, created_at, id);
+CREATE FULLTEXT INDEX ft_products_search ON products(name, description, category, origin);
 
 CREATE TABLE product_images (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -113,6 +119,7 @@ CREATE TABLE product_tags (
     FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
     FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
 );
+CREATE INDEX idx_product_tags_tag ON product_tags(tag_id, product_id);
 
 CREATE TABLE producer_bank_details (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -146,6 +153,8 @@ CREATE TABLE inquiries (
     FOREIGN KEY (buyer_id) REFERENCES users(id),
     FOREIGN KEY (producer_id) REFERENCES users(id)
 );
+CREATE INDEX idx_inquiries_buyer ON inquiries(buyer_id, created_at, id);
+CREATE INDEX idx_inquiries_producer ON inquiries(producer_id, created_at, id);
 
 CREATE TABLE messages (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -159,6 +168,25 @@ CREATE TABLE messages (
     FOREIGN KEY (inquiry_id) REFERENCES inquiries(id),
     FOREIGN KEY (sender_id) REFERENCES users(id)
 );
+CREATE INDEX idx_messages_inquiry_created ON messages(inquiry_id, created_at);
+CREATE INDEX idx_messages_inquiry_id ON messages(inquiry_id, id);
+
+CREATE TABLE conversation_summaries (
+    user_id INT NOT NULL,
+    inquiry_id INT NOT NULL,
+    other_user_id INT NULL,
+    role VARCHAR(10) NOT NULL,
+    last_message_id INT NULL,
+    last_message VARCHAR(500) NULL,
+    last_message_at DATETIME NULL,
+    last_sender_id INT NULL,
+    last_activity_at DATETIME NOT NULL,
+    unread_count INT NOT NULL DEFAULT 0,
+    last_read_message_id INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, inquiry_id),
+    INDEX idx_conversation_summaries_inbox (user_id, last_activity_at, inquiry_id),
+    INDEX idx_conversation_summaries_inquiry (inquiry_id)
+);
 
 CREATE TABLE message_attachments (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -173,7 +201,9 @@ CREATE TABLE message_attachments (
 
 CREATE TABLE orders (
     id INT AUTO_INCREMENT PRIMARY KEY,
+    checkout_id VARCHAR(36) NULL,
     buyer_id INT NOT NULL,
+    producer_id INT NULL,
     product_id INT NOT NULL,
     quantity INT NOT NULL,
     unit_price DECIMAL(10,2) NOT NULL,
@@ -194,6 +224,13 @@ CREATE TABLE orders (
     FOREIGN KEY (buyer_id) REFERENCES users(id),
     FOREIGN KEY (product_id) REFERENCES products(id)
 );
+CREATE INDEX idx_orders_created ON orders(created_at, id);
+CREATE INDEX idx_orders_buyer_created ON orders(buyer_id, created_at, id);
+CREATE INDEX idx_orders_product_created ON orders(product_id, created_at, id);
+CREATE INDEX idx_orders_producer_created ON orders(producer_id, created_at, id);
+CREATE INDEX idx_orders_producer_status ON orders(producer_id, status);
+CREATE INDEX idx_orders_producer_payment ON orders(producer_id, payment_status, created_at);
+CREATE INDEX idx_orders_checkout ON orders(checkout_id);
 
 CREATE TABLE commissions (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -206,12 +243,128 @@ CREATE TABLE commissions (
     commission_percentage DECIMAL(5,2) DEFAULT 10.00,
     status VARCHAR(20) DEFAULT 'pending',
     payment_reference VARCHAR(255),
+    settlement_run_id INT NULL,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (order_id) REFERENCES orders(id),
     FOREIGN KEY (producer_id) REFERENCES users(id),
     FOREIGN KEY (admin_id) REFERENCES users(id)
 );
+CREATE INDEX idx_commissions_created ON commissions(created_at, id);
+CREATE INDEX idx_commissions_settlement ON commissions(settlement_run_id);
+CREATE INDEX idx_commissions_status_producer ON commissions(status, producer_id);
+
+-- Batch commission settlement runs and their per-producer payout items
+CREATE TABLE settlement_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    created_by INT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'processing',
+    currency VARCHAR(10),
+    cutoff DATETIME,
+    producer_count INT NOT NULL DEFAULT 0,
+    commission_count INT NOT NULL DEFAULT 0,
+    completed_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (created_by) REFERENCES users(id),
+    INDEX idx_settlement_runs_created (created_at, id)
+);
+
+CREATE TABLE settlement_items (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    run_id INT NOT NULL,
+    producer_id INT NOT NULL,
+    currency VARCHAR(10) NOT NULL,
+    commission_count INT NOT NULL,
+    order_amount DECIMAL(16,2) NOT NULL,
+    commission_amount DECIMAL(16,2) NOT NULL,
+    payout_amount DECIMAL(16,2) NOT NULL,
+    bank_details_id INT,
+    bank_name VARCHAR(100),
+    account_name VARCHAR(100),
+    account_number VARCHAR(50),
+    bank_code VARCHAR(20),
+    swift_code VARCHAR(20),
+    routing_number VARCHAR(20),
+    payment_reference VARCHAR(255),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (run_id) REFERENCES settlement_runs(id),
+    FOREIGN KEY (producer_id) REFERENCES users(id),
+    UNIQUE KEY unique_settlement_item (run_id, producer_id, currency)
+);
+
+-- Pre-aggregated dashboard totals, maintained by rollups.py
+CREATE TABLE sales_rollups (
+    grain VARCHAR(5) NOT NULL,
+    bucket DATE NOT NULL,
+    producer_id INT NOT NULL,
+    currency VARCHAR(10) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    payment_status VARCHAR(20) NOT NULL,
+    order_count INT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+    commission_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+    producer_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (producer_id, grain, bucket, currency, status, payment_status),
+    INDEX idx_sales_rollups_bucket (grain, bucket)
+);
+
+CREATE TABLE commission_rollups (
+    grain VARCHAR(5) NOT NULL,
+    bucket DATE NOT NULL,
+    producer_id INT NOT NULL,
+    currency VARCHAR(10) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    commission_count INT NOT NULL DEFAULT 0,
+    order_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+    commission_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+    producer_amount DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (producer_id, grain, bucket, currency, status),
+    INDEX idx_commission_rollups_bucket (grain, bucket)
+);
+
+-- FX rates: value of one unit of a currency in the base currency (FX_BASE_CURRENCY)
+CREATE TABLE fx_rates (
+    currency VARCHAR(10) NOT NULL,
+    rate_date DATE NOT NULL,
+    rate DECIMAL(18,8) NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (currency, rate_date)
+);
+
+CREATE TABLE inventory_reservations (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    order_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'held',
+    expires_at DATETIME NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_inventory_reservations_order (order_id, status),
+    INDEX idx_inventory_reservations_expiry (status, expires_at)
+);
+
+CREATE TABLE platform_settings (
+    setting_key VARCHAR(150) NOT NULL PRIMARY KEY,
+    value VARCHAR(255) NOT NULL,
+    updated_by INT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+CREATE TABLE idempotency_keys (
+    user_id INT NOT NULL,
+    scope VARCHAR(50) NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status_code SMALLINT NULL,
+    response MEDIUMTEXT NULL,
+    created_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (user_id, scope, idempotency_key),
+    INDEX idx_idempotency_keys_expires (expires_at)
+);
 
 CREATE TABLE admin_bank_details (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -231,6 +384,7 @@ CREATE TABLE cart (
     FOREIGN KEY (buyer_id) REFERENCES users(id),
     FOREIGN KEY (product_id) REFERENCES products(id)
 );
+CREATE INDEX idx_cart_buyer ON cart(buyer_id, id);
 
 CREATE TABLE wishlist (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -241,6 +395,9 @@ CREATE TABLE wishlist (
     FOREIGN KEY (product_id) REFERENCES products(id)
 );
 
+-- Default platform settings
+INSERT IGNORE INTO platform_settings (setting_key, value) VALUES ('commission_percentage', '10.00'), ('_version', '1');
+
 -- Insert default admin bank details
 INSERT INTO admin_bank_details (bank_name, account_name, account_number) 
 VALUES ('Opay', 'Aminu Aminu', '8060051309')
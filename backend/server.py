@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Production entry point for the API and Socket.IO server.
+
+With SOCKETIO_ASYNC_MODE=eventlet (or gevent) every socket is a green thread
+instead of an OS thread, so one process holds tens of thousands of
+connections. The standard library must be monkey-patched before anything
+else imports socket, threading or time, which is why this module patches
+first and only then imports the app. Database calls then go through the
+pure-Python MySQL driver (see MYSQL_USE_PURE in db.py) and yield instead of
+blocking the event loop.
+
+    SOCKETIO_ASYNC_MODE=eventlet python server.py
+"""
+
+import os
+
+ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from app import app  # noqa: E402
+from websocket_service import socketio  # noqa: E402
+
+HOST = os.getenv('HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', '5000'))
+
+
+if __name__ == '__main__':
+    print(f"Starting TradeLink server on {HOST}:{PORT} (async mode: {socketio.async_mode})")
+    # The threading mode runs on Werkzeug's development server
+    socketio.run(app, host=HOST, port=PORT, allow_unsafe_werkzeug=ASYNC_MODE == 'threading')
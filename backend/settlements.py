@@ -0,0 +1,213 @@
+import csv
+from datetime import datetime
+from decimal import Decimal
+from io import StringIO
+import rollups
+
+PAYOUT_COLUMNS = ['reference', 'producer_id', 'producer_name', 'company_name', 'currency', 'amount', 'commission_count',
+                  'bank_name', 'account_name', 'account_number', 'bank_code', 'swift_code', 'routing_number']
+
+BANK_FIELDS = ('bank_name', 'account_name', 'account_number', 'bank_code', 'swift_code', 'routing_number')
+
+COMMISSION_STATUSES = ('pending', 'processing', 'paid', 'failed')
+
+
+class SettlementError(Exception):
+    """Raised when a settlement run is not in a state that allows the requested action"""
+
+
+def _active_bank_details(conn, producer_ids):
+    """Latest active producer_bank_details row per producer"""
+    if not producer_ids:
+        return {}
+    cursor = conn.cursor(dictionary=True)
+    placeholders = ', '.join(['%s'] * len(producer_ids))
+    cursor.execute(f'''SELECT b.* FROM producer_bank_details b
+                       JOIN (SELECT producer_id, MAX(id) as id FROM producer_bank_details
+                             WHERE is_active = TRUE AND producer_id IN ({placeholders})
+                             GROUP BY producer_id) latest ON b.id = latest.id''', tuple(producer_ids))
+    rows = cursor.fetchall()
+    cursor.close()
+    return {row['producer_id']: row for row in rows}
+
+
+def _run_commission_ids(conn, run_id):
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM commissions WHERE settlement_run_id = %s FOR UPDATE', (run_id,))
+    ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return ids
+
+
+def _lock_run(conn, run_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute('SELECT * FROM settlement_runs WHERE id = %s FOR UPDATE', (run_id,))
+    run = cursor.fetchone()
+    cursor.close()
+    return run
+
+
+def create_run(conn, admin_id, currency=None, cutoff=None, producer_ids=None):
+    """Settle every pending commission (optionally filtered) in one transaction.
+
+    Commissions are grouped by (producer, currency) into settlement_items, each
+    carrying a snapshot of the producer's active bank details, and moved to
+    status 'processing'. Producers without active bank details are skipped and
+    their commissions stay pending. Returns (run_id or None, skipped producer ids).
+    """
+    query = '''SELECT c.id FROM commissions c JOIN orders o ON c.order_id = o.id
+               WHERE c.status = 'pending' AND c.settlement_run_id IS NULL'''
+    params = []
+    if currency:
+        query += ' AND o.currency = %s'
+        params.append(currency)
+    if cutoff:
+        query += ' AND c.created_at <= %s'
+        params.append(cutoff)
+    if producer_ids:
+        query += f" AND c.producer_id IN ({', '.join(['%s'] * len(producer_ids))})"
+        params.extend(producer_ids)
+    cursor = conn.cursor()
+    cursor.execute(query + ' FOR UPDATE', tuple(params))
+    commission_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+
+    before = rollups.snapshot_commissions(conn, commission_ids)
+    bank_details = _active_bank_details(conn, sorted({row['producer_id'] for row in before}))
+    skipped = sorted({row['producer_id'] for row in before if row['producer_id'] not in bank_details})
+    included = [row for row in before if row['producer_id'] in bank_details]
+    if not included:
+        conn.rollback()
+        return None, skipped
+
+    groups = {}
+    for row in included:
+        group = groups.setdefault((row['producer_id'], row['currency']), {
+            'commission_count': 0, 'order_amount': Decimal(0), 'commission_amount': Decimal(0), 'payout_amount': Decimal(0)})
+        group['commission_count'] += 1
+        group['order_amount'] += row['order_amount'] or 0
+        group['commission_amount'] += row['commission_amount'] or 0
+        group['payout_amount'] += row['producer_amount'] or 0
+
+    now = datetime.utcnow()
+    cursor = conn.cursor()
+    cursor.execute('''INSERT INTO settlement_runs (created_by, status, currency, cutoff, producer_count, commission_count, created_at, updated_at)
+                      VALUES (%s, %s, %s, %s, %s, %s, %s, %s)''',
+                   (admin_id, 'processing', currency, cutoff, len({key[0] for key in groups}), len(included), now, now))
+    run_id = cursor.lastrowid
+    cursor.executemany('''INSERT INTO settlement_items (run_id, producer_id, currency, commission_count, order_amount, commission_amount,
+                          payout_amount, bank_details_id, bank_name, account_name, account_number, bank_code, swift_code, routing_number,
+                          payment_reference, created_at)
+                          VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                       [(run_id, producer_id, currency_code, group['commission_count'], group['order_amount'],
+                         group['commission_amount'], group['payout_amount'], bank_details[producer_id]['id'],
+                         *(bank_details[producer_id][field] for field in BANK_FIELDS),
+                         f'TL-SETTLE-{run_id}-{producer_id}-{currency_code or "NA"}', now)
+                        for (producer_id, currency_code), group in sorted(groups.items())])
+    cursor.executemany('UPDATE commissions SET status = %s, settlement_run_id = %s, updated_at = %s WHERE id = %s',
+                       [('processing', run_id, now, row['id']) for row in included])
+    cursor.close()
+    rollups.apply_commission_changes(conn, included, [dict(row, status='processing') for row in included])
+    conn.commit()
+    return run_id, skipped
+
+
+def complete_run(conn, run_id):
+    """Mark a processing run as paid out; commissions become 'paid' with their item's payment reference"""
+    run = _lock_run(conn, run_id)
+    if run is None:
+        return None
+    if run['status'] != 'processing':
+        conn.rollback()
+        raise SettlementError(f"Settlement run is {run['status']}")
+    before = rollups.snapshot_commissions(conn, _run_commission_ids(conn, run_id))
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute('SELECT producer_id, currency, payment_reference FROM settlement_items WHERE run_id = %s', (run_id,))
+    references = {(row['producer_id'], row['currency']): row['payment_reference'] for row in cursor.fetchall()}
+    cursor.close()
+
+    now = datetime.utcnow()
+    cursor = conn.cursor()
+    cursor.executemany('UPDATE commissions SET status = %s, payment_reference = %s, updated_at = %s WHERE id = %s',
+                       [('paid', references.get((row['producer_id'], row['currency'])), now, row['id']) for row in before])
+    cursor.execute('UPDATE settlement_runs SET status = %s, completed_at = %s, updated_at = %s WHERE id = %s',
+                   ('completed', now, now, run_id))
+    cursor.close()
+    rollups.apply_commission_changes(conn, before, [dict(row, status='paid') for row in before])
+    conn.commit()
+    return sorted({row['producer_id'] for row in before})
+
+
+def cancel_run(conn, run_id):
+    """Abandon a processing run and return its commissions to 'pending'"""
+    run = _lock_run(conn, run_id)
+    if run is None:
+        return None
+    if run['status'] != 'processing':
+        conn.rollback()
+        raise SettlementError(f"Settlement run is {run['status']}")
+    before = rollups.snapshot_commissions(conn, _run_commission_ids(conn, run_id))
+    now = datetime.utcnow()
+    cursor = conn.cursor()
+    cursor.executemany('UPDATE commissions SET status = %s, settlement_run_id = NULL, updated_at = %s WHERE id = %s',
+                       [('pending', now, row['id']) for row in before])
+    cursor.execute('UPDATE settlement_runs SET status = %s, updated_at = %s WHERE id = %s', ('cancelled', now, run_id))
+    cursor.close()
+    rollups.apply_commission_changes(conn, before, [dict(row, status='pending') for row in before])
+    conn.commit()
+    return True
+
+
+def update_commission_status(conn, commission_id, status, payment_reference=None):
+    """Set one commission's status by hand; returns False if it does not exist.
+
+    Commissions in a processing run belong to that run: completing or
+    cancelling it rewrites their status and payment reference, so they are
+    refused with SettlementError. The run row is locked before the commission,
+    in the same order as complete_run / cancel_run.
+    """
+    cursor = conn.cursor()
+    cursor.execute('SELECT settlement_run_id FROM commissions WHERE id = %s', (commission_id,))
+    row = cursor.fetchone()
+    run = _lock_run(conn, row[0]) if row and row[0] is not None else None
+    cursor.execute('SELECT settlement_run_id FROM commissions WHERE id = %s FOR UPDATE', (commission_id,))
+    locked = cursor.fetchone()
+    cursor.close()
+    if locked is None:
+        conn.rollback()
+        return False
+    # A run created between the two reads is still processing
+    if locked[0] is not None and (run is None or run['id'] != locked[0] or run['status'] == 'processing'):
+        conn.rollback()
+        raise SettlementError(f'Commission is part of processing settlement run {locked[0]}')
+    with rollups.track_commissions(conn, [commission_id]):
+        cursor = conn.cursor()
+        cursor.execute('UPDATE commissions SET status = %s, payment_reference = %s, updated_at = %s WHERE id = %s',
+                       (status, payment_reference, datetime.utcnow(), commission_id))
+        cursor.close()
+    conn.commit()
+    return True
+
+
+def get_run(conn, run_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute('SELECT * FROM settlement_runs WHERE id = %s', (run_id,))
+    run = cursor.fetchone()
+    if run:
+        cursor.execute('''SELECT i.*, u.first_name, u.last_name, u.company_name FROM settlement_items i
+                          JOIN users u ON i.producer_id = u.id WHERE i.run_id = %s ORDER BY i.producer_id, i.currency''', (run_id,))
+        run['items'] = cursor.fetchall()
+    cursor.close()
+    return run
+
+
+def payout_csv(run):
+    """Payout instructions for a run (as returned by get_run), one line per producer and currency"""
+    si = StringIO()
+    writer = csv.writer(si)
+    writer.writerow(PAYOUT_COLUMNS)
+    for item in run['items']:
+        writer.writerow([item['payment_reference'], item['producer_id'],
+                         f"{item['first_name']} {item['last_name']}", item['company_name'], item['currency'],
+                         item['payout_amount'], item['commission_count'], *(item[field] for field in BANK_FIELDS)])
+    return si.getvalue()
@@ -0,0 +1,104 @@
+import os
+import re
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeMySQLError(Exception):
+    """Carries a MySQL error number, like mysql.connector.Error"""
+
+    def __init__(self, errno, msg=''):
+        super().__init__(msg or f'MySQL error {errno}')
+        self.errno = errno
+
+
+class FakeCursor:
+    def __init__(self, conn, dictionary=False):
+        self.conn = conn
+        self.dictionary = dictionary
+        self.rows = []
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, query, params=()):
+        params = tuple(params or ())
+        self.conn.statements.append((' '.join(query.split()), params))
+        for pattern, handler in self.conn.handlers:
+            if pattern.search(query):
+                result = handler(*params)
+                break
+        else:
+            result = None
+        if isinstance(result, int):
+            self.rows, self.rowcount = [], result
+        else:
+            self.rows = list(result or [])
+            self.rowcount = len(self.rows)
+
+    def executemany(self, query, seq_params):
+        total = 0
+        for params in seq_params:
+            self.execute(query, params)
+            total += max(self.rowcount, 0)
+        self.rowcount = total
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Stand-in for a MySQL connection.
+
+    Statements are answered by handlers registered with on(pattern, handler):
+    the first handler whose regex matches the SQL is called with the statement
+    parameters and returns result rows, or an int rowcount for writes. Every
+    statement is recorded in `statements`, and commits / rollbacks are counted.
+    """
+
+    def __init__(self):
+        self.handlers = []
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def on(self, pattern, handler):
+        self.handlers.append((re.compile(pattern, re.IGNORECASE | re.DOTALL), handler))
+
+    def cursor(self, dictionary=False, buffered=None):
+        return FakeCursor(self, dictionary)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def executed(self, pattern):
+        """Parameters of every recorded statement matching `pattern`"""
+        regex = re.compile(pattern, re.IGNORECASE)
+        return [params for query, params in self.statements if regex.search(query)]
+
+
+@pytest.fixture
+def conn():
+    return FakeConnection()
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
@@ -0,0 +1,73 @@
+import jwt
+import pytest
+
+import auth
+from tests.conftest import FakeMySQLError
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    auth._token_cache.clear()
+    auth._user_cache.clear()
+
+
+@pytest.fixture
+def client(app, conn, monkeypatch):
+    monkeypatch.setattr(auth, 'get_db', lambda: conn)
+
+    @app.route('/me')
+    @auth.auth_required()
+    def me():
+        return {'user_id': auth.g.user_id}
+
+    @app.route('/admin')
+    @auth.auth_required(roles='admin')
+    def admin():
+        return {}
+
+    return app.test_client()
+
+
+def token(payload):
+    return {'Authorization': 'Bearer ' + jwt.encode(payload, auth.SECRET_KEY, algorithm='HS256')}
+
+
+def user(user_type='buyer', is_active=1):
+    return lambda *ids: [{'id': ids[0], 'username': 'u', 'email': 'u@example.com', 'user_type': user_type,
+                          'first_name': 'U', 'last_name': 'V', 'company_name': None, 'is_active': is_active}]
+
+
+def test_valid_token_sets_the_user(client, conn):
+    conn.on('FROM users', user())
+    response = client.get('/me', headers=token({'user_id': 7}))
+    assert response.status_code == 200
+    assert response.get_json() == {'user_id': 7}
+
+
+@pytest.mark.parametrize('headers', [{}, {'Authorization': 'Bearer not-a-jwt'}, token({'username': 'u'}),
+                                     token({'user_id': 'seven'}), token({'user_id': [7]})])
+def test_bad_tokens_are_401(client, conn, headers):
+    assert client.get('/me', headers=headers).status_code == 401
+    assert conn.statements == []
+
+
+def test_unknown_user_is_401(client, conn):
+    conn.on('FROM users', lambda *ids: [])
+    assert client.get('/me', headers=token({'user_id': 7})).status_code == 401
+
+
+def test_deactivated_and_wrong_role_are_403(client, conn):
+    conn.on('FROM users', user(is_active=0))
+    assert client.get('/me', headers=token({'user_id': 7})).status_code == 403
+    auth.invalidate_user(7)
+    conn.handlers.clear()
+    conn.on('FROM users', user())
+    assert client.get('/admin', headers=token({'user_id': 7})).get_json() == {'error': 'Admin access required'}
+
+
+def test_database_errors_are_not_reported_as_bad_tokens(client, conn):
+    def outage(*ids):
+        raise FakeMySQLError(2013, 'Lost connection to MySQL server during query')
+
+    conn.on('FROM users', outage)
+    assert client.get('/me', headers=token({'user_id': 7})).status_code == 500
@@ -0,0 +1,63 @@
+import pytest
+
+import checkout
+from checkout import CheckoutError
+from tests.conftest import FakeMySQLError
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(checkout, 'CHECKOUT_RETRY_DELAY', 0)
+
+
+def test_products_are_locked_after_the_cart_in_id_order(conn):
+    conn.on(r'FROM cart', lambda buyer_id: [{'cart_id': 1, 'product_id': 9, 'quantity': 1},
+                                            {'cart_id': 2, 'product_id': 3, 'quantity': 2}])
+    conn.on(r'FROM products', lambda *ids: [{'product_id': product_id, 'price': 5} for product_id in ids])
+    lines = checkout._lock_cart(conn, 7)
+    assert [query.split(' FROM ')[1].split()[0] for query, _ in conn.statements] == ['cart', 'products']
+    assert conn.executed('FROM products') == [(3, 9)]
+    assert [(line['cart_id'], line['product_id'], line['price']) for line in lines] == [(1, 9, 5), (2, 3, 5)]
+
+
+def test_lines_of_deleted_products_are_dropped(conn):
+    conn.on(r'FROM cart', lambda buyer_id: [{'cart_id': 1, 'product_id': 9, 'quantity': 1}])
+    conn.on(r'FROM products', lambda *ids: [])
+    assert checkout._lock_cart(conn, 7) == []
+
+
+@pytest.mark.parametrize('errno', [1213, 1205])
+def test_lock_conflicts_are_retried(conn, monkeypatch, errno):
+    attempts = []
+
+    def flaky(*args):
+        attempts.append(args)
+        if len(attempts) < 3:
+            raise FakeMySQLError(errno)
+        return 'checkout', []
+
+    monkeypatch.setattr(checkout, '_checkout', flaky)
+    assert checkout.checkout_cart(conn, 7, {}) == ('checkout', [])
+    assert len(attempts) == 3
+    assert conn.rollbacks == 2
+
+
+def test_persistent_deadlocks_give_up_with_409(conn, monkeypatch):
+    def deadlock(*args):
+        raise FakeMySQLError(1213)
+
+    monkeypatch.setattr(checkout, '_checkout', deadlock)
+    with pytest.raises(CheckoutError) as error:
+        checkout.checkout_cart(conn, 7, {})
+    assert error.value.status_code == 409
+    assert conn.rollbacks == checkout.CHECKOUT_RETRIES
+
+
+def test_other_database_errors_are_not_retried(conn, monkeypatch):
+    def broken(*args):
+        raise FakeMySQLError(1146)
+
+    monkeypatch.setattr(checkout, '_checkout', broken)
+    with pytest.raises(FakeMySQLError):
+        checkout.checkout_cart(conn, 7, {})
+    assert conn.rollbacks == 0
@@ -0,0 +1,42 @@
+from db import ConnectionPool
+
+
+class RawConnection:
+    unread_result = False
+    in_transaction = False
+
+    def __init__(self):
+        self.shut_down = False
+        self.closed = False
+
+    def ping(self, reconnect=False):
+        pass
+
+    def is_connected(self):
+        return not (self.closed or self.shut_down)
+
+    def shutdown(self):
+        self.shut_down = True
+
+    def close(self):
+        self.closed = True
+
+
+def test_closed_connections_go_back_to_the_pool():
+    pool = ConnectionPool(connect=RawConnection, size=2, max_overflow=0)
+    conn = pool.get_connection()
+    conn.close()
+    stats = pool.stats()
+    assert (stats['open'], stats['idle'], stats['checked_out']) == (1, 1, 0)
+
+
+def test_abandoned_connections_are_shut_down_and_free_their_slot():
+    pool = ConnectionPool(connect=RawConnection, size=1, max_overflow=0, timeout=0)
+    conn = pool.get_connection()
+    raw = conn._raw
+    conn.abandon()
+    conn.abandon()
+    assert raw.shut_down and not raw.closed
+    stats = pool.stats()
+    assert (stats['open'], stats['idle'], stats['checked_out'], stats['abandoned']) == (0, 0, 0, 1)
+    pool.get_connection().close()
@@ -0,0 +1,74 @@
+import gzip
+
+import pytest
+
+import exports
+
+
+class ExportConnection:
+    """Hands out one unbuffered-looking cursor over `rows` and records how it was let go"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.statements = []
+        self.closed = False
+        self.abandoned = False
+
+    def cursor(self, buffered=None):
+        return ExportCursor(self)
+
+    def close(self):
+        self.closed = True
+
+    def abandon(self):
+        self.abandoned = True
+
+
+class ExportCursor:
+    column_names = ('id', 'name')
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=()):
+        self.conn.statements.append(query)
+
+    def fetchmany(self, size):
+        rows, self.conn.rows = self.conn.rows[:size], self.conn.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def export_conn(monkeypatch):
+    conn = ExportConnection([(i, f'row {i}') for i in range(5)])
+    monkeypatch.setattr(exports, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(exports, 'EXPORT_BATCH_SIZE', 2)
+    return conn
+
+
+def test_streams_every_row_in_batches(export_conn):
+    chunks = list(exports.stream_query_csv('SELECT id, name FROM t'))
+    assert len(chunks) == 3
+    assert b''.join(chunks).decode().splitlines() == ['id,name'] + [f'{i},row {i}' for i in range(5)]
+    assert export_conn.closed and not export_conn.abandoned
+
+
+def test_gzip_stream_decompresses_to_the_csv(export_conn):
+    data = gzip.decompress(b''.join(exports.stream_query_csv('SELECT id, name FROM t', compress=True)))
+    assert data.decode().splitlines()[-1] == '4,row 4'
+    assert export_conn.closed
+
+
+def test_client_disconnect_abandons_the_connection(export_conn):
+    stream = exports.stream_query_csv('SELECT id, name FROM t')
+    next(stream)
+    stream.close()
+    assert export_conn.abandoned and not export_conn.closed
+
+
+def test_session_sql_runs_before_the_query(export_conn):
+    list(exports.stream_query_csv('SELECT id, name FROM t', session_sql=['SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED']))
+    assert export_conn.statements[1:] == ['SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED', 'SELECT id, name FROM t']
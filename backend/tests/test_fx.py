@@ -0,0 +1,72 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+import fx
+from fx import FX_BASE_CURRENCY, FxRates, aggregate_by_currency
+
+RATES = [('USD', date(2025, 1, 1), '1500'), ('USD', date(2025, 2, 1), '1600'), ('EUR', date(2025, 1, 15), '1700')]
+
+
+@pytest.fixture
+def rates(conn):
+    loads = []
+    conn.on(r'FROM fx_rates', lambda *params: loads.append(1) or RATES)
+    rates = FxRates(ttl=60)
+    rates.loads = loads
+    return rates
+
+
+def test_base_currency_is_one_without_a_query(rates, conn):
+    assert rates.rate(conn, FX_BASE_CURRENCY, date(2025, 1, 1)) == Decimal(1)
+    assert conn.statements == []
+
+
+def test_rate_is_the_latest_on_or_before_the_day(rates, conn):
+    assert rates.rate(conn, 'USD', date(2025, 1, 31)) == Decimal('1500')
+    assert rates.rate(conn, 'USD', date(2025, 2, 1)) == Decimal('1600')
+    assert rates.rate(conn, 'USD', datetime(2025, 6, 1, 12)) == Decimal('1600')
+
+
+def test_days_before_the_first_rate_use_the_earliest(rates, conn):
+    assert rates.rate(conn, 'EUR', date(2024, 12, 1)) == Decimal('1700')
+
+
+def test_unknown_currency_has_no_rate(rates, conn):
+    assert rates.rate(conn, 'GBP', date(2025, 1, 1)) is None
+
+
+def test_rates_are_loaded_once_per_ttl(rates, conn):
+    for day in (1, 2, 3):
+        rates.rate(conn, 'USD', date(2025, 1, day))
+    assert len(rates.loads) == 1
+    rates.invalidate()
+    rates.rate(conn, 'USD', date(2025, 1, 1))
+    assert len(rates.loads) == 2
+
+
+def test_convert_goes_through_the_base_currency(rates, conn):
+    assert rates.convert(conn, Decimal('10'), 'USD', 'EUR', date(2025, 2, 1)) == Decimal('16000') / Decimal('1700')
+    assert rates.convert(conn, Decimal('3000'), FX_BASE_CURRENCY, 'USD', date(2025, 1, 5)) == Decimal('2')
+    assert rates.convert(conn, Decimal('5'), 'GBP', 'GBP', date(2025, 1, 5)) == Decimal('5')
+    assert rates.convert(conn, Decimal('5'), 'GBP', 'USD', date(2025, 1, 5)) is None
+
+
+def test_rates_on_includes_the_base_currency(rates, conn):
+    assert rates.rates_on(conn, date(2025, 1, 20)) == {'USD': Decimal('1500'), 'EUR': Decimal('1700'),
+                                                       FX_BASE_CURRENCY: Decimal(1)}
+
+
+def test_aggregate_by_currency_converts_each_day_at_its_rate(rates, conn, monkeypatch):
+    monkeypatch.setattr(fx, 'fx_rates', rates)
+    rows = [{'bucket': date(2025, 1, 10), 'currency': 'USD', 'total': Decimal('1'), 'orders': 1},
+            {'bucket': date(2025, 2, 10), 'currency': 'USD', 'total': Decimal('1'), 'orders': 2},
+            {'bucket': date(2025, 2, 10), 'currency': None, 'total': Decimal('100'), 'orders': 1},
+            {'bucket': date(2025, 2, 10), 'currency': 'GBP', 'total': Decimal('7'), 'orders': 1}]
+    report = aggregate_by_currency(conn, rows, ['total'], ['orders'], FX_BASE_CURRENCY)
+    assert report['totals'] == {'total': 3200.0}
+    assert report['unconverted'] == ['GBP']
+    by_currency = {row['currency']: row for row in report['by_currency']}
+    assert by_currency['USD'] == {'currency': 'USD', 'total': 2.0, 'orders': 3}
+    assert by_currency[FX_BASE_CURRENCY]['total'] == 100.0
@@ -0,0 +1,120 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import idempotency
+from idempotency import IdempotencyError, IdempotencyKey, request_hash
+from tests.conftest import FakeMySQLError
+
+PAYLOAD = {'product_id': 3, 'quantity': 2}
+
+
+@pytest.fixture(autouse=True)
+def empty_response_cache():
+    idempotency._responses.clear()
+    yield
+    idempotency._responses.clear()
+
+
+def _duplicate(*params):
+    raise FakeMySQLError(idempotency.ER_DUP_ENTRY, 'Duplicate entry')
+
+
+def _stored(payload=PAYLOAD, status_code=201, response='{"order_id": 7}', expires_in=3600):
+    return {'request_hash': request_hash(payload), 'status_code': status_code, 'response': response,
+            'expires_at': datetime.utcnow() + timedelta(seconds=expires_in)}
+
+
+def test_request_hash_ignores_key_order():
+    assert request_hash({'a': 1, 'b': 2}) == request_hash({'b': 2, 'a': 1})
+    assert request_hash({'a': 1}) != request_hash({'a': 2})
+
+
+def test_overlong_key_is_rejected():
+    with pytest.raises(IdempotencyError) as error:
+        IdempotencyKey(1, 'orders', 'k' * (idempotency.MAX_KEY_LENGTH + 1), PAYLOAD)
+    assert error.value.status_code == 400
+
+
+def test_first_claim_inserts_the_key(conn):
+    assert IdempotencyKey(1, 'orders', 'abc', PAYLOAD).claim(conn) is None
+    (params,) = conn.executed('INSERT INTO idempotency_keys')
+    assert params[:4] == (1, 'orders', 'abc', request_hash(PAYLOAD))
+
+
+def test_duplicate_claim_replays_the_stored_response(conn):
+    conn.on(r'^\s*INSERT INTO idempotency_keys', _duplicate)
+    conn.on(r'FOR UPDATE', lambda *params: [_stored()])
+    key = IdempotencyKey(1, 'orders', 'abc', PAYLOAD)
+    assert key.claim(conn) == (201, '{"order_id": 7}')
+    # The replay is now served from memory
+    assert IdempotencyKey(1, 'orders', 'abc', PAYLOAD).cached() == (201, '{"order_id": 7}')
+
+
+def test_key_reused_for_a_different_request_is_rejected(conn):
+    conn.on(r'^\s*INSERT INTO idempotency_keys', _duplicate)
+    conn.on(r'FOR UPDATE', lambda *params: [_stored(payload={'product_id': 4})])
+    with pytest.raises(IdempotencyError) as error:
+        IdempotencyKey(1, 'orders', 'abc', PAYLOAD).claim(conn)
+    assert error.value.status_code == 422
+
+
+def test_key_of_an_unfinished_request_is_a_conflict(conn):
+    conn.on(r'^\s*INSERT INTO idempotency_keys', _duplicate)
+    conn.on(r'FOR UPDATE', lambda *params: [_stored(status_code=None, response=None)])
+    with pytest.raises(IdempotencyError) as error:
+        IdempotencyKey(1, 'orders', 'abc', PAYLOAD).claim(conn)
+    assert error.value.status_code == 409
+
+
+def test_expired_key_is_claimed_again(conn):
+    conn.on(r'^\s*INSERT INTO idempotency_keys', _duplicate)
+    conn.on(r'FOR UPDATE', lambda *params: [_stored(expires_in=-1)])
+    assert IdempotencyKey(1, 'orders', 'abc', PAYLOAD).claim(conn) is None
+    assert len(conn.executed('REPLACE INTO idempotency_keys')) == 1
+
+
+def test_other_database_errors_propagate(conn):
+    def deadlock(*params):
+        raise FakeMySQLError(1213, 'Deadlock')
+    conn.on(r'INSERT INTO idempotency_keys', deadlock)
+    with pytest.raises(FakeMySQLError):
+        IdempotencyKey(1, 'orders', 'abc', PAYLOAD).claim(conn)
+
+
+def test_save_then_remember_caches_the_response(app, conn):
+    key = IdempotencyKey(1, 'orders', 'abc', PAYLOAD)
+    with app.app_context():
+        key.save(conn, 201, {'order_id': 7})
+    (params,) = conn.executed('UPDATE idempotency_keys')
+    assert params[0] == 201 and json.loads(params[1]) == {'order_id': 7}
+    assert key.cached() is None
+    key.remember()
+    status_code, text = IdempotencyKey(1, 'orders', 'abc', PAYLOAD).cached()
+    assert status_code == 201 and json.loads(text) == {'order_id': 7}
+
+
+def test_cached_response_is_scoped_per_user(app, conn):
+    key = IdempotencyKey(1, 'orders', 'abc', PAYLOAD)
+    with app.app_context():
+        key.save(conn, 201, {'order_id': 7})
+    key.remember()
+    assert IdempotencyKey(2, 'orders', 'abc', PAYLOAD).cached() is None
+    assert IdempotencyKey(1, 'messages', 'abc', PAYLOAD).cached() is None
+
+
+def test_from_request_reads_the_header(app):
+    with app.test_request_context('/orders', headers={'Idempotency-Key': ' abc '}):
+        key = idempotency.from_request('orders', 1, PAYLOAD)
+        assert key.key == 'abc'
+    with app.test_request_context('/orders'):
+        assert idempotency.from_request('orders', 1, PAYLOAD) is None
+
+
+def test_replay_response_is_marked(app):
+    with app.app_context():
+        response = idempotency.replay_response((201, '{"order_id": 7}'))
+    assert response.status_code == 201
+    assert response.headers['Idempotent-Replayed'] == 'true'
+    assert response.get_json() == {'order_id': 7}
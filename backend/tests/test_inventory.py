@@ -0,0 +1,189 @@
+import pytest
+
+import inventory
+from inventory import OutOfStock
+
+
+class Store:
+    """In-memory products / orders / inventory_reservations behind the fake MySQL connection"""
+
+    def __init__(self, conn, stock):
+        self.stock = dict(stock)
+        self.orders = {}
+        self.reservations = []
+        conn.on(r'UPDATE products SET quantity = quantity - %s WHERE id = %s AND quantity >= %s', self.take)
+        conn.on(r'UPDATE products SET quantity = quantity \+ %s WHERE id = %s', self.give)
+        conn.on(r'SELECT quantity FROM products', lambda product_id: [(self.stock[product_id],)] if product_id in self.stock else [])
+        conn.on(r'INSERT INTO inventory_reservations', self.insert)
+        conn.on(r'FROM inventory_reservations\s+WHERE order_id IN', self.outstanding)
+        conn.on(r'FROM inventory_reservations WHERE order_id = %s', self.latest)
+        conn.on(r'UPDATE inventory_reservations SET status = %s, updated_at = %s WHERE id = %s', self.set_status)
+        conn.on(r"UPDATE inventory_reservations SET status = 'committed'", self.commit_held)
+        conn.on(r'UPDATE inventory_reservations SET quantity = %s', self.resize)
+        conn.on(r'FROM orders WHERE id = %s', lambda order_id: [self.orders[order_id]] if order_id in self.orders else [])
+
+    def take(self, quantity, product_id, minimum):
+        if self.stock.get(product_id, 0) < minimum:
+            return 0
+        self.stock[product_id] -= quantity
+        return 1
+
+    def give(self, quantity, product_id):
+        self.stock[product_id] += quantity
+        return 1
+
+    def insert(self, order_id, product_id, quantity, status, expires_at, created_at, updated_at):
+        self.reservations.append({'id': len(self.reservations) + 1, 'order_id': order_id, 'product_id': product_id,
+                                  'quantity': quantity, 'status': status, 'expires_at': expires_at})
+        return 1
+
+    def _with_status(self, order_ids, statuses):
+        return [dict(r) for r in self.reservations if r['order_id'] in order_ids and r['status'] in statuses]
+
+    def outstanding(self, *order_ids):
+        return self._with_status(order_ids, ('held', 'committed'))
+
+    def latest(self, order_id):
+        rows = [dict(r) for r in self.reservations if r['order_id'] == order_id]
+        return rows[-1:]
+
+    def _find(self, reservation_id):
+        return next(r for r in self.reservations if r['id'] == reservation_id)
+
+    def set_status(self, status, updated_at, reservation_id):
+        self._find(reservation_id)['status'] = status
+        return 1
+
+    def commit_held(self, updated_at, *order_ids):
+        rows = self._with_status(order_ids, ('held',))
+        for row in rows:
+            self._find(row['id'])['status'] = 'committed'
+        return len(rows)
+
+    def resize(self, quantity, updated_at, reservation_id):
+        self._find(reservation_id)['quantity'] = quantity
+        return 1
+
+    def place(self, conn, order_id, product_id, quantity, status='pending', payment_status='pending'):
+        self.orders[order_id] = {'product_id': product_id, 'quantity': quantity, 'status': status,
+                                 'payment_status': payment_status}
+        inventory.reserve(conn, [{'order_id': order_id, 'product_id': product_id, 'quantity': quantity}])
+
+
+@pytest.fixture
+def store(conn):
+    return Store(conn, {1: 10, 2: 3})
+
+
+def test_decrement_takes_stock(conn, store):
+    inventory.decrement(conn, {1: 4, 2: 3})
+    assert store.stock == {1: 6, 2: 0}
+
+
+def test_decrement_locks_products_in_id_order(conn, store):
+    inventory.decrement(conn, {2: 1, 1: 1})
+    assert [params[1] for params in conn.executed('quantity = quantity -')] == [1, 2]
+
+
+def test_decrement_is_a_single_conditional_update_per_product(conn, store):
+    inventory.decrement(conn, {1: 2})
+    assert conn.executed('SELECT') == []
+    assert conn.executed('UPDATE products') == [(2, 1, 2)]
+
+
+def test_decrement_reports_what_is_left(conn, store):
+    with pytest.raises(OutOfStock) as error:
+        inventory.decrement(conn, {1: 1, 2: 4})
+    assert (error.value.product_id, error.value.requested, error.value.available) == (2, 4, 3)
+    assert store.stock[2] == 3
+
+
+def test_decrement_of_a_missing_product(conn, store):
+    with pytest.raises(OutOfStock) as error:
+        inventory.decrement(conn, {99: 1})
+    assert error.value.available == 0
+
+
+def test_reserve_sums_lines_per_product_and_holds_each_order(conn, store):
+    inventory.reserve(conn, [{'order_id': 1, 'product_id': 1, 'quantity': 2},
+                             {'order_id': 2, 'product_id': 1, 'quantity': 3}])
+    assert store.stock[1] == 5
+    assert conn.executed('UPDATE products') == [(5, 1, 5)]
+    assert [(r['order_id'], r['quantity'], r['status']) for r in store.reservations] == [(1, 2, 'held'), (2, 3, 'held')]
+
+
+def test_release_returns_held_stock_once(conn, store):
+    store.place(conn, 1, 1, 4)
+    assert inventory.release(conn, [1]) == 1
+    assert inventory.release(conn, [1]) == 0
+    assert store.stock[1] == 10
+    assert store.reservations[0]['status'] == 'released'
+
+
+def test_releasing_a_confirmed_order_returns_its_stock(conn, store):
+    store.place(conn, 1, 1, 4)
+    inventory.confirm(conn, [1])
+    assert inventory.release(conn, [1]) == 1
+    assert store.stock[1] == 10
+    assert store.reservations[0]['status'] == 'released'
+
+
+def test_cancelling_a_paid_order_returns_its_stock(conn, store):
+    store.place(conn, 1, 1, 4)
+    store.orders[1]['payment_status'] = 'paid'
+    inventory.order_updated(conn, 1)
+    assert store.stock[1] == 6
+    store.orders[1]['status'] = 'cancelled'
+    inventory.order_updated(conn, 1)
+    assert store.stock[1] == 10
+    assert store.reservations[-1]['status'] == 'released'
+
+
+def test_quantity_increase_takes_only_the_difference(conn, store):
+    store.place(conn, 1, 1, 4)
+    store.orders[1]['quantity'] = 6
+    assert inventory.order_updated(conn, 1) == [1]
+    assert store.stock[1] == 4
+    assert store.reservations[-1]['quantity'] == 6
+
+
+def test_quantity_decrease_returns_the_difference(conn, store):
+    store.place(conn, 1, 1, 4)
+    store.orders[1]['quantity'] = 1
+    assert inventory.order_updated(conn, 1) == [1]
+    assert store.stock[1] == 9
+    assert store.reservations[-1]['quantity'] == 1
+
+
+def test_quantity_increase_beyond_stock_fails(conn, store):
+    store.place(conn, 1, 2, 2)
+    store.orders[1]['quantity'] = 5
+    with pytest.raises(OutOfStock):
+        inventory.order_updated(conn, 1)
+    assert store.reservations[-1]['quantity'] == 2
+
+
+def test_cancel_then_uncancel_takes_the_stock_again(conn, store):
+    store.place(conn, 1, 1, 4)
+    store.orders[1]['status'] = 'cancelled'
+    assert inventory.order_updated(conn, 1) == [1]
+    assert store.stock[1] == 10
+    assert inventory.order_updated(conn, 1) == []
+    store.orders[1]['status'] = 'processing'
+    assert inventory.order_updated(conn, 1) == [1]
+    assert store.stock[1] == 6
+    assert [r['status'] for r in store.reservations] == ['released', 'committed']
+
+
+def test_paid_orders_are_confirmed(conn, store):
+    store.place(conn, 1, 1, 4)
+    store.orders[1]['payment_status'] = 'paid'
+    assert inventory.order_updated(conn, 1) == []
+    assert store.reservations[-1]['status'] == 'committed'
+
+
+def test_orders_without_a_reservation_are_left_alone(conn, store):
+    store.orders[1] = {'product_id': 1, 'quantity': 3, 'status': 'cancelled', 'payment_status': 'pending'}
+    assert inventory.order_updated(conn, 1) == []
+    assert store.stock[1] == 10
+    assert conn.executed('^UPDATE') == []
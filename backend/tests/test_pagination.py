@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import pagination
+from pagination import (InvalidCursor, decode_cursor, decode_offset_cursor, encode_cursor, encode_offset_cursor,
+                        get_page_args, keyset_condition, keyset_order, split_page)
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2025, 3, 1, 12, 30, 5)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(datetime(2025, 3, 1), 7)
+    assert '=' not in cursor and '+' not in cursor and '/' not in cursor
+
+
+@pytest.mark.parametrize('cursor', ['', 'not-a-cursor', encode_offset_cursor(5)])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_offset_cursor_round_trip_and_rejects_negative():
+    assert decode_offset_cursor(encode_offset_cursor(300)) == 300
+    with pytest.raises(InvalidCursor):
+        decode_offset_cursor(encode_offset_cursor(-1))
+
+
+def test_keyset_condition_without_position_is_empty():
+    assert keyset_condition('o.created_at', 'o.id', None) == ('', [])
+
+
+def test_keyset_condition_continues_after_position():
+    created_at = datetime(2025, 3, 1)
+    clause, params = keyset_condition('o.created_at', 'o.id', (created_at, 9))
+    assert clause == ' AND (o.created_at < %s OR (o.created_at = %s AND o.id < %s))'
+    assert params == [created_at, created_at, 9]
+
+
+def test_keyset_order_fetches_one_extra_row():
+    assert keyset_order('created_at', 'id', 20) == ' ORDER BY created_at DESC, id DESC LIMIT 21'
+
+
+def test_keyset_order_without_limit_is_unbounded():
+    assert keyset_order('created_at', 'id', None) == ' ORDER BY created_at DESC, id DESC'
+
+
+def _rows(count):
+    return [{'id': count - i, 'created_at': datetime(2025, 1, 1) + timedelta(days=i)} for i in range(count)]
+
+
+def test_split_page_returns_cursor_of_last_kept_row():
+    rows, cursor = split_page(_rows(4), 3)
+    assert [row['id'] for row in rows] == [4, 3, 2]
+    assert decode_cursor(cursor) == (datetime(2025, 1, 3), 2)
+
+
+def test_split_page_last_page_has_no_cursor():
+    rows, cursor = split_page(_rows(3), 3)
+    assert len(rows) == 3 and cursor is None
+
+
+def test_split_page_without_limit_keeps_everything():
+    rows, cursor = split_page(_rows(250), None)
+    assert len(rows) == 250 and cursor is None
+
+
+def test_page_args_unbounded_when_not_requested(app):
+    with app.test_request_context('/orders'):
+        assert get_page_args() == (None, None)
+
+
+def test_page_args_default_limit_when_following_a_cursor(app):
+    cursor = encode_cursor(datetime(2025, 3, 1), 5)
+    with app.test_request_context(f'/orders?cursor={cursor}'):
+        assert get_page_args() == (pagination.DEFAULT_PAGE_SIZE, (datetime(2025, 3, 1), 5))
+
+
+@pytest.mark.parametrize('limit, expected', [('0', 1), ('25', 25), ('100000', pagination.MAX_PAGE_SIZE)])
+def test_page_args_clamps_limit(app, limit, expected):
+    with app.test_request_context(f'/orders?limit={limit}'):
+        assert get_page_args() == (expected, None)
+
+
+def test_page_args_rejects_bad_limit(app):
+    with app.test_request_context('/orders?limit=abc'):
+        with pytest.raises(InvalidCursor):
+            get_page_args()
+
+
+def test_page_response_sets_next_cursor_header(app):
+    with app.app_context():
+        response = pagination.page_response([{'id': 1}], 'abc')
+        assert response.headers['X-Next-Cursor'] == 'abc'
+        assert 'X-Next-Cursor' not in pagination.page_response([], None).headers
@@ -0,0 +1,78 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import rollups
+from rollups import _deltas, bucket_for
+
+ORDER_KEYS = ('producer_id', 'currency', 'status', 'payment_status')
+ORDER_AMOUNTS = ('total_amount', 'commission_amount', 'producer_amount')
+
+
+def _order(status='pending', payment_status='pending', total='100.00', created_at=datetime(2025, 3, 14, 9, 30)):
+    total = Decimal(total)
+    return {'id': 1, 'created_at': created_at, 'producer_id': 5, 'currency': 'NGN', 'status': status,
+            'payment_status': payment_status, 'total_amount': total, 'commission_amount': total / 10,
+            'producer_amount': total - total / 10}
+
+
+def _by_key(rows):
+    return {row[:6]: row[6:] for row in rows}
+
+
+def test_bucket_for():
+    assert bucket_for('day', datetime(2025, 3, 14, 23, 59)) == date(2025, 3, 14)
+    assert bucket_for('month', datetime(2025, 3, 14, 23, 59)) == date(2025, 3, 1)
+    assert bucket_for('month', date(2025, 12, 31)) == date(2025, 12, 1)
+
+
+def test_new_order_adds_to_day_and_month():
+    rows = _by_key(_deltas([], [_order()], ORDER_KEYS, ORDER_AMOUNTS))
+    assert rows == {
+        ('day', date(2025, 3, 14), 5, 'NGN', 'pending', 'pending'): (1, Decimal('100.00'), Decimal('10.000'), Decimal('90.000')),
+        ('month', date(2025, 3, 1), 5, 'NGN', 'pending', 'pending'): (1, Decimal('100.00'), Decimal('10.000'), Decimal('90.000')),
+    }
+
+
+def test_status_change_moves_the_order_between_keys():
+    rows = _by_key(_deltas([_order()], [_order(status='completed')], ORDER_KEYS, ORDER_AMOUNTS))
+    assert rows[('day', date(2025, 3, 14), 5, 'NGN', 'pending', 'pending')][0] == -1
+    assert rows[('day', date(2025, 3, 14), 5, 'NGN', 'completed', 'pending')][0] == 1
+    assert rows[('month', date(2025, 3, 1), 5, 'NGN', 'pending', 'pending')][1] == Decimal('-100.00')
+    assert len(rows) == 4
+
+
+def test_amount_change_keeps_the_count():
+    rows = _by_key(_deltas([_order()], [_order(total='150.00')], ORDER_KEYS, ORDER_AMOUNTS))
+    day = rows[('day', date(2025, 3, 14), 5, 'NGN', 'pending', 'pending')]
+    assert day[0] == 0 and day[1] == Decimal('50.00')
+
+
+def test_unchanged_rows_net_to_nothing():
+    assert _deltas([_order()], [_order()], ORDER_KEYS, ORDER_AMOUNTS) == []
+
+
+def test_deleted_order_is_subtracted():
+    rows = _by_key(_deltas([_order()], [], ORDER_KEYS, ORDER_AMOUNTS))
+    assert rows[('day', date(2025, 3, 14), 5, 'NGN', 'pending', 'pending')][:2] == (-1, Decimal('-100.00'))
+
+
+def test_rows_without_created_at_are_skipped():
+    assert _deltas([], [_order(created_at=None)], ORDER_KEYS, ORDER_AMOUNTS) == []
+
+
+def test_missing_amounts_count_as_zero():
+    order = dict(_order(), commission_amount=None, producer_amount=None)
+    rows = _by_key(_deltas([], [order], ORDER_KEYS, ORDER_AMOUNTS))
+    assert rows[('day', date(2025, 3, 14), 5, 'NGN', 'pending', 'pending')][2:] == (Decimal('0'), Decimal('0'))
+
+
+def test_apply_order_changes_upserts_the_deltas(conn):
+    rollups.apply_order_changes(conn, [], [_order()])
+    upserts = conn.executed('INSERT INTO sales_rollups')
+    assert len(upserts) == 2
+    assert {params[0] for params in upserts} == {'day', 'month'}
+
+
+def test_apply_order_changes_writes_nothing_without_a_difference(conn):
+    rollups.apply_order_changes(conn, [_order()], [_order()])
+    assert conn.statements == []
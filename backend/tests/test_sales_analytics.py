@@ -0,0 +1,81 @@
+from datetime import date
+
+import numpy as np
+
+import fx
+import sales_analytics
+from sales_analytics import SalesAnalytics, bucket_days
+
+
+def _days(*values):
+    return np.array(values, dtype='datetime64[D]')
+
+
+def test_day_buckets_are_unchanged():
+    days = _days('2025-03-12', '2025-03-13')
+    assert (bucket_days(days, 'day') == days).all()
+
+
+def test_week_buckets_start_on_monday():
+    # 2025-03-10 is a Monday; 2025-03-16 the Sunday of the same ISO week
+    days = _days('2025-03-09', '2025-03-10', '2025-03-13', '2025-03-16', '2025-03-17')
+    assert bucket_days(days, 'week').tolist() == [date(2025, 3, 3), date(2025, 3, 10), date(2025, 3, 10),
+                                                  date(2025, 3, 10), date(2025, 3, 17)]
+
+
+def test_week_buckets_before_the_epoch():
+    assert bucket_days(_days('1969-12-31'), 'week').tolist() == [date(1969, 12, 29)]
+
+
+def test_month_buckets_start_on_the_first():
+    days = _days('2024-02-29', '2025-01-31', '2025-12-01')
+    assert bucket_days(days, 'month').tolist() == [date(2024, 2, 1), date(2025, 1, 1), date(2025, 12, 1)]
+
+
+def _serve_rollups(conn, rows):
+    # DAILY_QUERY rows: bucket, currency, orders, revenue, commission, producer_amount, commission_paid
+    conn.on(r'FROM sales_rollups', lambda *params: rows)
+    conn.on(r'FROM fx_rates', lambda *params: [('USD', date(2025, 1, 1), '1500')])
+
+
+def test_sales_buckets_rows_per_currency(conn):
+    _serve_rollups(conn, [(date(2025, 3, 10), 'NGN', 2, 200.0, 20.0, 180.0, 0),
+                          (date(2025, 3, 12), 'NGN', 1, 50.0, 5.0, 45.0, 0),
+                          (date(2025, 3, 12), 'NGN', 0, 0, 0, 0, 5.0),
+                          (date(2025, 3, 12), 'USD', 1, 10.0, 1.0, 9.0, 0)])
+    series = SalesAnalytics().sales(conn, granularity='week')
+    assert series['NGN'] == [{'period': '2025-03-10', 'orders': 3, 'revenue': 250.0, 'commission': 25.0,
+                              'producer_amount': 225.0, 'commission_paid': 5.0}]
+    assert series['USD'][0]['revenue'] == 10.0
+
+
+def test_sales_filters_by_date_range(conn):
+    _serve_rollups(conn, [(date(2025, 3, 10), 'NGN', 2, 200.0, 20.0, 180.0, 0),
+                          (date(2025, 3, 12), 'NGN', 1, 50.0, 5.0, 45.0, 0)])
+    series = SalesAnalytics().sales(conn, start=date(2025, 3, 11), end=date(2025, 3, 31))
+    assert [point['period'] for point in series['NGN']] == ['2025-03-12']
+
+
+def test_scopes_are_evicted_least_recently_used(conn, monkeypatch):
+    monkeypatch.setattr(sales_analytics, 'ANALYTICS_MAX_SCOPES', 2)
+    _serve_rollups(conn, [(date(2025, 3, 10), 'NGN', 1, 10.0, 1.0, 9.0, 0)])
+    analytics = SalesAnalytics()
+    for producer_id in (1, 2, 1, 3):
+        analytics.sales(conn, producer_id=producer_id)
+    assert list(analytics._series) == [(1, None), (3, None)]
+    assert {key[0] for key in analytics._results} == {(1, None), (3, None)}
+
+
+def test_results_are_bounded(conn, monkeypatch):
+    monkeypatch.setattr(sales_analytics, 'ANALYTICS_CACHE_ENTRIES', 3)
+    _serve_rollups(conn, [(date(2025, 3, 10), 'NGN', 1, 10.0, 1.0, 9.0, 0)])
+    analytics = SalesAnalytics()
+    for day in range(1, 6):
+        analytics.sales(conn, start=date(2025, 3, day))
+    assert len(analytics._results) == 3
+
+
+def test_currencies_combines_sales_and_fx_rates(conn):
+    _serve_rollups(conn, [(date(2025, 3, 10), 'GHS', 1, 10.0, 1.0, 9.0, 0)])
+    fx.fx_rates.invalidate()
+    assert SalesAnalytics().currencies(conn) == {'GHS', 'USD', fx.FX_BASE_CURRENCY}
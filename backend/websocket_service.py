@@ -1,19 +1,35 @@
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask import request
-import jwt
 import os
-from db import get_db_connection
+from db import get_db
+from auth import decode_token, get_user
+import idempotency
+import conversations
+from presence import presence, PRESENCE_HEARTBEAT
 from datetime import datetime
 import json
 
+# 'threading' for development; 'eventlet' or 'gevent' serve many thousands of
+# sockets on green threads and must be started through server.py
+SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+# Per-packet logging is far too noisy (and slow) for production connection counts
+SOCKETIO_LOGGER = os.getenv('SOCKETIO_LOGGER', 'true' if SOCKETIO_ASYNC_MODE == 'threading' else 'false').lower() in ('1', 'true', 'yes')
+
+# Pub/sub backplane (e.g. redis://localhost:6379/0) so emits reach sockets held by
+# any worker or node; empty keeps rooms and emits inside this process
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE') or None
+SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'tradelink-socketio')
+
 socketio = SocketIO(
     cors_allowed_origins="*",
-    async_mode='threading',  # Use threading mode for better compatibility
-    logger=True,
-    engineio_logger=True
+    async_mode=SOCKETIO_ASYNC_MODE,
+    logger=SOCKETIO_LOGGER,
+    engineio_logger=SOCKETIO_LOGGER,
+    message_queue=SOCKETIO_MESSAGE_QUEUE,
+    channel=SOCKETIO_CHANNEL
 )
 
-# Store connected users
+# Users connected to this process, by socket id; presence holds every process's sessions
 connected_users = {}
 
 def init_socketio(app):
@@ -21,25 +37,30 @@ def init_socketio(app):
     socketio.init_app(
         app, 
         cors_allowed_origins="*",
-        async_mode='threading',  # Use threading mode for better compatibility
-        logger=True,
-        engineio_logger=True
+        async_mode=SOCKETIO_ASYNC_MODE,
+        logger=SOCKETIO_LOGGER,
+        engineio_logger=SOCKETIO_LOGGER,
+        message_queue=SOCKETIO_MESSAGE_QUEUE,
+        channel=SOCKETIO_CHANNEL
     )
+    socketio.start_background_task(presence_heartbeat)
+
+def presence_heartbeat():
+    """Keep this node's presence entry alive and clean up after nodes that died"""
+    while True:
+        try:
+            presence.heartbeat()
+        except Exception as e:
+            print(f"Presence heartbeat failed: {e}")
+        socketio.sleep(PRESENCE_HEARTBEAT)
 
 def get_user_from_token(token):
     """Extract user information from JWT token"""
     try:
-        data = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-here'), algorithms=['HS256'])
-        user_id = data['user_id']
-        
-        # Get user details from database
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT id, username, email, user_type, first_name, last_name, company_name FROM users WHERE id = %s', (user_id,))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
+        data = decode_token(token)
+        user = get_user(data['user_id'])
+        if not user or user['is_active'] == 0:
+            return None
         return user
     except Exception as e:
         print(f"Error decoding token: {e}")
@@ -76,6 +97,10 @@ def handle_connect(auth=None):
             # If admin, join admin room
             if user['user_type'] == 'admin':
                 join_room('admin')
+            try:
+                presence.add(request.sid, connected_users[request.sid])
+            except Exception as e:
+                print(f"Error recording presence: {e}")
             print(f"User {user['username']} connected and joined rooms")
             # Emit connection confirmation
             emit('connection_confirmed', {
@@ -100,6 +125,10 @@ def handle_disconnect():
         user = connected_users[request.sid]
         print(f"User {user['username']} disconnected")
         del connected_users[request.sid]
+        try:
+            presence.remove(request.sid)
+        except Exception as e:
+            print(f"Error removing presence: {e}")
 
 @socketio.on('join_conversation')
 def handle_join_conversation(data):
@@ -134,16 +163,36 @@ def handle_send_message(data):
         return
     
     try:
+        # Clients may resend with the same idempotency_key after a dropped ack;
+        # a replay only repeats the acknowledgement
+        idempotency_key = None
+        if data.get('idempotency_key'):
+            idempotency_key = idempotency.IdempotencyKey(user['user_id'], 'socket_send_message', str(data['idempotency_key']),
+                                                         {'inquiry_id': inquiry_id, 'message': message_text})
+            stored = idempotency_key.cached()
+            if stored:
+                emit('message_sent', dict(json.loads(stored[1]), replayed=True))
+                return
+
         # Save message to database
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
+
+        if idempotency_key:
+            stored = idempotency_key.claim(conn)
+            if stored:
+                cursor.close()
+                emit('message_sent', dict(json.loads(stored[1]), replayed=True))
+                return
         
+        now = datetime.utcnow()
         cursor.execute('''
             INSERT INTO messages (inquiry_id, sender_id, message, is_read, created_at)
             VALUES (%s, %s, %s, %s, %s)
-        ''', (inquiry_id, user['user_id'], message_text, False, datetime.utcnow()))
+        ''', (inquiry_id, user['user_id'], message_text, False, now))
         
         message_id = cursor.lastrowid
+        conversations.message_sent(conn, inquiry_id, user['user_id'], message_id, message_text, now)
         
         # Get the inquiry details
         cursor.execute('''
@@ -158,17 +207,13 @@ def handle_send_message(data):
         ''', (inquiry_id,))
         
         inquiry = cursor.fetchone()
-        
-        # Mark messages as read for the sender
-        cursor.execute('''
-            UPDATE messages 
-            SET is_read = TRUE 
-            WHERE inquiry_id = %s AND sender_id != %s
-        ''', (inquiry_id, user['user_id']))
-        
+
+        if idempotency_key:
+            idempotency_key.save(conn, 200, {'message_id': message_id, 'status': 'sent'})
         conn.commit()
         cursor.close()
-        conn.close()
+        if idempotency_key:
+            idempotency_key.remember()
         
         # Prepare message data
         message_data = {
@@ -180,7 +225,7 @@ def handle_send_message(data):
             'sender_type': user['user_type'],
             'message': message_text,
             'is_read': False,
-            'created_at': datetime.utcnow().isoformat(),
+            'created_at': now.isoformat(),
             'product_name': inquiry['product_name'],
             'buyer_name': f"{inquiry['buyer_first_name']} {inquiry['buyer_last_name']}",
             'producer_name': f"{inquiry['producer_first_name']} {inquiry['producer_last_name']}"
@@ -203,7 +248,9 @@ def handle_send_message(data):
         })
         
         print(f"Message sent by {user['username']} in inquiry {inquiry_id}")
-        
+
+    except idempotency.IdempotencyError as e:
+        emit('error', {'message': str(e)})
     except Exception as e:
         print(f"Error sending message: {e}")
         emit('error', {'message': 'Failed to send message'})
@@ -223,23 +270,16 @@ def handle_mark_read(data):
         return
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Mark all messages in this inquiry as read for this user
-        cursor.execute('''
-            UPDATE messages 
-            SET is_read = TRUE 
-            WHERE inquiry_id = %s AND sender_id != %s
-        ''', (inquiry_id, user['user_id']))
+        conn = get_db()
         
+        # Move this user's read watermark (to message_id, or the latest message)
+        last_read_message_id = conversations.mark_read(conn, inquiry_id, user['user_id'], data.get('message_id'))
         conn.commit()
-        cursor.close()
-        conn.close()
         
         # Emit read status to conversation room
         socketio.emit('messages_read', {
             'inquiry_id': inquiry_id,
+            'last_read_message_id': last_read_message_id,
             'read_by': user['user_id'],
             'read_by_name': f"{user['first_name']} {user['last_name']}"
         }, room=f"conversation_{inquiry_id}")
@@ -293,8 +333,8 @@ def handle_online_status(data):
     socketio.emit('user_status_change', status_data, room=f"role_{user['user_type']}")
 
 def get_online_users():
-    """Get list of currently online users"""
-    return list(connected_users.values())
+    """Get list of currently online users (across all workers when presence is shared)"""
+    return presence.online_users()
 
 def send_notification_to_user(user_id, notification_data):
     """Send notification to specific user"""